@@ -6,6 +6,7 @@ import pygame
 import sys
 import json
 import random
+from trackEngine import Track
 
 # Initialize Pygame
 pygame.init()
@@ -41,6 +42,16 @@ TRACK_TILE_TYPES = {
     'checkpoint2': 5
 }
 
+# The same tiles under the names the shared track engine uses
+ENGINE_TILE_TYPES = {
+    'out_of_bounds': TRACK_TILE_TYPES['out_of_bounds'],
+    'wall': TRACK_TILE_TYPES['wall'],
+    'road': TRACK_TILE_TYPES['road'],
+    'start_finish': TRACK_TILE_TYPES['start_finish_line'],
+    'checkpoint1': TRACK_TILE_TYPES['checkpoint1'],
+    'checkpoint2': TRACK_TILE_TYPES['checkpoint2']
+}
+
 TILE_COLOR_MAPPING = {
     0: BLACK,
     1: GRAY,
@@ -51,6 +62,7 @@ TILE_COLOR_MAPPING = {
 }
 
 # Game State Variables
+track = None
 track_layout = []
 car_grid_x = 0
 car_grid_y = 0
@@ -73,7 +85,7 @@ checkpoint2_group = []
 tiles_crossed_during_move = []
 
 def load_racetrack():
-    global track_layout, checkpoint1_group, checkpoint2_group
+    global track, track_layout, checkpoint1_group, checkpoint2_group
     input_filename = input("Enter track filename to load (without extension): ")
     if not input_filename.endswith('.json'):
         input_filename += '.json'
@@ -82,23 +94,11 @@ def load_racetrack():
             track_layout = json.load(file)
         print(f"Track loaded from {input_filename}")
         
-        # Find checkpoint groups using BFS
-        visited_tiles = [[False for column in range(GRID_COLUMNS)] for row in range(GRID_ROWS)]
+        # Walls and out of bounds tiles block moves, and the first group of each checkpoint counts
+        track = Track(track_layout, tile_types=ENGINE_TILE_TYPES)
+        checkpoint1_group = track.checkpoint1_group
+        checkpoint2_group = track.checkpoint2_group
         
-        # Find Checkpoint 1 group
-        for row in range(GRID_ROWS):
-            for column in range(GRID_COLUMNS):
-                if track_layout[row][column] == TRACK_TILE_TYPES['checkpoint1'] and not visited_tiles[row][column]:
-                    checkpoint1_group = find_connected_checkpoints((column, row), TRACK_TILE_TYPES['checkpoint1'], visited_tiles)
-                    break
-                    
-        # Find Checkpoint 2 group
-        for row in range(GRID_ROWS):
-            for column in range(GRID_COLUMNS):
-                if track_layout[row][column] == TRACK_TILE_TYPES['checkpoint2'] and not visited_tiles[row][column]:
-                    checkpoint2_group = find_connected_checkpoints((column, row), TRACK_TILE_TYPES['checkpoint2'], visited_tiles)
-                    break
-                    
         print(f"Found checkpoint1 group with {len(checkpoint1_group)} tiles")
         print(f"Found checkpoint2 group with {len(checkpoint2_group)} tiles")
         
@@ -106,82 +106,11 @@ def load_racetrack():
         print(f"File {input_filename} not found.")
         sys.exit()
 
-def find_connected_checkpoints(start_position, target_tile_type, visited_flags):
-    search_queue = [start_position]
-    connected_tiles = []
-    while search_queue:
-        current_x, current_y = search_queue.pop(0)
-        if visited_flags[current_y][current_x]:
-            continue
-        visited_flags[current_y][current_x] = True
-        if track_layout[current_y][current_x] == target_tile_type:
-            connected_tiles.append((current_x, current_y))
-            # Check all four directions
-            for x_offset, y_offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                neighbor_x = current_x + x_offset
-                neighbor_y = current_y + y_offset
-                if 0 <= neighbor_x < GRID_COLUMNS and 0 <= neighbor_y < GRID_ROWS:
-                    if not visited_flags[neighbor_y][neighbor_x] and track_layout[neighbor_y][neighbor_x] == target_tile_type:
-                        search_queue.append((neighbor_x, neighbor_y))
-    return connected_tiles
-
 def find_start_positions():
-    start_positions_list = []
-    for row in range(GRID_ROWS):
-        for column in range(GRID_COLUMNS):
-            if track_layout[row][column] == TRACK_TILE_TYPES['start_finish_line']:
-                start_positions_list.append((column, row))
-    return start_positions_list
-
-def calculate_bresenham_line(start_x, start_y, end_x, end_y):
-    line_points = []
-    delta_x = abs(end_x - start_x)
-    delta_y = abs(end_y - start_y)
-    current_x, current_y = start_x, start_y
-    x_step = 1 if end_x > start_x else -1
-    y_step = 1 if end_y > start_y else -1
-    
-    if delta_x > delta_y:
-        error = delta_x // 2
-        while current_x != end_x:
-            line_points.append((current_x, current_y))
-            error -= delta_y
-            if error < 0:
-                current_y += y_step
-                error += delta_x
-            current_x += x_step
-    else:
-        error = delta_y // 2
-        while current_y != end_y:
-            line_points.append((current_x, current_y))
-            error -= delta_x
-            if error < 0:
-                current_x += x_step
-                error += delta_y
-            current_y += y_step
-    line_points.append((end_x, end_y))
-    return line_points
+    return track.start_positions
 
 def validate_move(start_x, start_y, end_x, end_y):
-    trajectory_points = calculate_bresenham_line(start_x, start_y, end_x, end_y)
-    is_valid_move = True
-    crossed_tiles = []
-    
-    for point_x, point_y in trajectory_points:
-        # Check if point is within grid bounds
-        if not (0 <= point_x < GRID_COLUMNS and 0 <= point_y < GRID_ROWS):
-            is_valid_move = False
-            break
-        
-        tile_type = track_layout[point_y][point_x]
-        if tile_type == TRACK_TILE_TYPES['wall'] or tile_type == TRACK_TILE_TYPES['out_of_bounds']:
-            is_valid_move = False
-            break
-            
-        if tile_type in [TRACK_TILE_TYPES['checkpoint1'], TRACK_TILE_TYPES['checkpoint2'], TRACK_TILE_TYPES['start_finish_line']]:
-            crossed_tiles.append((point_x, point_y, tile_type))
-    
-    return is_valid_move, crossed_tiles
+    return track.is_move_valid(start_x, start_y, end_x, end_y)
 
 def calculate_possible_moves():
     possible_moves = []
@@ -200,16 +129,16 @@ def calculate_possible_moves():
 def process_crossed_tiles(crossed_tiles_list):
     global checkpoint1_passed, checkpoint2_passed, current_lap_number
     
-    for tile_x, tile_y, tile_type in crossed_tiles_list:
-        if tile_type == TRACK_TILE_TYPES['checkpoint1'] and not checkpoint1_passed:
-            if (tile_x, tile_y) in checkpoint1_group:
+    for tile_kind, tile_position in crossed_tiles_list:
+        if tile_kind == 'cp1' and not checkpoint1_passed:
+            if track.in_group(tile_position, track.checkpoint1_label):
                 checkpoint1_passed = True
                 print("Checkpoint 1 passed!")
-        elif tile_type == TRACK_TILE_TYPES['checkpoint2'] and checkpoint1_passed and not checkpoint2_passed:
-            if (tile_x, tile_y) in checkpoint2_group:
+        elif tile_kind == 'cp2' and checkpoint1_passed and not checkpoint2_passed:
+            if track.in_group(tile_position, track.checkpoint2_label):
                 checkpoint2_passed = True
                 print("Checkpoint 2 passed!")
-        elif tile_type == TRACK_TILE_TYPES['start_finish_line']:
+        elif tile_kind == 'finish':
             if checkpoint1_passed and checkpoint2_passed:
                 current_lap_number += 1
                 checkpoint1_passed = False
@@ -240,6 +169,27 @@ position_markers = [(car_grid_x, car_grid_y)]
 
 game_clock = pygame.time.Clock()
 
+# The track never changes during a race, so its tiles are drawn once
+track_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+track_surface.fill(WHITE)
+for row in range(GRID_ROWS):
+    for column in range(GRID_COLUMNS):
+        tile_value = track_layout[row][column]
+        color = TILE_COLOR_MAPPING.get(tile_value, WHITE)
+        rect = pygame.Rect(column * GRID_CELL_SIZE, row * GRID_CELL_SIZE, GRID_CELL_SIZE, GRID_CELL_SIZE)
+        pygame.draw.rect(track_surface, color, rect)
+        
+        if color == WHITE:
+            grid_color = GRAY
+        elif color == GREEN:
+            grid_color = (0, 100, 0)  # Darker green
+        elif color == RED:
+            grid_color = (139, 0, 0)  # Darker red
+        else:
+            grid_color = color
+        
+        pygame.draw.rect(track_surface, grid_color, rect, 1)  # Grid lines
+
 # Main Game Loop
 while game_running:
     game_clock.tick(60)
@@ -289,27 +239,8 @@ while game_running:
     # Calculate possible moves when not animating
     possible_next_positions = calculate_possible_moves() if not is_animating else []
 
-    # Draw game elements
-    game_window.fill(WHITE)
-    
-    # Draw track tiles
-    for row in range(GRID_ROWS):
-        for column in range(GRID_COLUMNS):
-            tile_value = track_layout[row][column]
-            color = TILE_COLOR_MAPPING.get(tile_value, WHITE)
-            rect = pygame.Rect(column * GRID_CELL_SIZE, row * GRID_CELL_SIZE, GRID_CELL_SIZE, GRID_CELL_SIZE)
-            pygame.draw.rect(game_window, color, rect)
-            
-            if color == WHITE:
-                grid_color = GRAY
-            elif color == GREEN:
-                grid_color = (0, 100, 0)  # Darker green
-            elif color == RED:
-                grid_color = (139, 0, 0)  # Darker red
-            else:
-                grid_color = color
-            
-            pygame.draw.rect(game_window, grid_color, rect, 1)  # Grid lines
+    # Draw game elements, starting from the pre-rendered track
+    game_window.blit(track_surface, (0, 0))
 
     # Draw car path
     if len(car_path_history) > 1:
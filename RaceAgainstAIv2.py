@@ -1,24 +1,36 @@
 import pygame
 import sys
-import json
 import random
 import heapq
 import time
-import copy
+import math
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from moveTable import MoveTable, INVALID_MOVE, PHASE_NONE, PHASE_CP1, PHASE_COUNT, DEFAULT_MAX_SPEED, table_fits
+from distanceField import DistanceHeuristic, axis_moves
+from lapPlanner import LapPlanner
+from anytimePlanner import AnytimePlanner, DEFAULT_WEIGHTS
+from bucketQueue import BucketQueue, FLOAT_RESOLUTION
+from searchStats import instrument, record_stats
+from pathCache import PathCache, track_hash, cache_directory_for
+from trackFormat import is_track_file, TrackFormatError
+from trackEngine import open_track, bresenham_line, ObstacleLayer
+from appContext import get_app_context, WINDOW_WIDTH, WINDOW_HEIGHT
+from packedState import (pack_state, unpack_state, state_position, state_phase, state_lap, reconstruct_states,
+                         PHASE_FROM_FLAGS, FLAGS_FROM_PHASE, FLAGS_MASK, CP1_SHIFT, LAP_SHIFT,
+                         X_SHIFT, Y_SHIFT, VX_SHIFT, VELOCITY_OFFSET)
 
-# Initialize Pygame
-pygame.init()
-
-# Game Window Settings
-WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 720
-game_window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Race Against AI")
+# Set by open_window when the race is started, importing the module opens nothing
+game_window = None
 
 # Grid Configuration
 GRID_CELL_SIZE = 20
-GRID_COLUMNS = WINDOW_WIDTH // GRID_CELL_SIZE
-GRID_ROWS = WINDOW_HEIGHT // GRID_CELL_SIZE
+# Cells that fit in the window, larger tracks are scrolled with the camera
+VIEW_COLUMNS = WINDOW_WIDTH // GRID_CELL_SIZE
+VIEW_ROWS = WINDOW_HEIGHT // GRID_CELL_SIZE
+# The camera recentres on the player once they are this close to the edge of the view
+CAMERA_MARGIN = 6
 
 # Color Definitions
 WHITE = (255, 255, 255)
@@ -40,6 +52,12 @@ TRACK_TILE_TYPES = {
     'checkpoint2': 4
 }
 
+# Bump when a search change makes previously cached plans invalid
+PLANNER_VERSION = 1
+
+# Shorter GIL switch interval while the planner thread runs, so the game loop keeps 60 FPS
+PLANNING_SWITCH_INTERVAL = 0.001
+
 TILE_COLORS = {
     0: BLACK,
     1: WHITE,
@@ -48,28 +66,56 @@ TILE_COLORS = {
     4: PURPLE
 }
 
-class State:
-    def __init__(self, x, y, vx, vy, cp1, cp2, lap):
-        self.x = x
-        self.y = y
-        self.vx = vx
-        self.vy = vy
-        self.cp1 = cp1
-        self.cp2 = cp2
-        self.lap = lap
-
-    def __lt__(self, other):
-        return False
+def open_window(app=None):
+    global game_window
+    game_window = (app or get_app_context()).open_window("Race Against AI")
+    return game_window
 
 class Game:
-    def __init__(self):
+    def __init__(self, app=None):
+        open_window(app)
+        self.track = None
         self.track_layout = []
+        self.grid_columns = VIEW_COLUMNS
+        self.grid_rows = VIEW_ROWS
         self.checkpoint1_group = []
         self.checkpoint2_group = []
         self.cp1_centroid = None
         self.cp2_centroid = None
         self.finish_centroid = None
         
+        # Precomputed move validity, built once per track
+        self.move_table = None
+        self.move_table_layout = None
+        self.max_table_speed = DEFAULT_MAX_SPEED
+        self.distance_heuristic = None
+        self.use_distance_heuristic = True
+        # Multi-lap races are planned a lap at a time, reusing laps that repeat
+        self.lap_planner = None
+        self.use_lap_planner = True
+        # Races start on a quick weighted plan that is improved towards optimal while they run
+        self.use_anytime_planner = True
+        self.first_plan_time = 0.25
+        
+        # Plans from earlier races on the same track
+        self.use_path_cache = True
+        self.path_cache = None
+        self.plan_cache_key = None
+        self.track_name = None
+        self.track_hash = None
+        
+        # Each car's moves for the current turn, with the state they were worked out for
+        self.legal_move_cache = {True: None, False: None}
+        
+        # Top left cell of the view
+        self.camera_x = 0
+        self.camera_y = 0
+        
+        # Tiles in view drawn once into a surface, rebuilt when the layout or camera changes
+        self.track_surface = None
+        self.track_surface_layout = None
+        self.track_surface_camera = None
+        
         # Player state
         self.player_x = 0
         self.player_y = 0
@@ -108,6 +154,7 @@ class Game:
         self.game_running = True
         self.required_laps = 1
         self.ai_path = []
+        self.ai_plan = []
         self.ai_path_index = 0
         self.game_over_reason = None
         self.show_stats = False
@@ -119,6 +166,22 @@ class Game:
         self.show_recalculating_message = False
         self.recalculation_message_timer = 0
         self.recalculation_message_duration = 60  
+        self.repair_window = 8
+        self.repair_slack = 4
+        
+        # Background planning, results are collected by update() on the main thread
+        self.planner = ThreadPoolExecutor(max_workers=1)
+        self.plan_future = None
+        self.plan_start_index = 0
+        self.plan_progress = {}
+        self.plan_cancel = threading.Event()
+        self.default_switch_interval = sys.getswitchinterval()
+        # Anytime refinement, which publishes (version, plan, bound) for update() to adopt
+        self.anytime_search = None
+        self.refine_future = None
+        self.refine_cancel = threading.Event()
+        self.refined_plan = None
+        self.adopted_version = 0
         
         # Blocked message state
         self.show_blocked_message = False
@@ -140,45 +203,25 @@ class Game:
 
     def load_track(self, filename):
         try:
-            with open(filename, 'r') as f:
-                self.track_layout = json.load(f)
+            self.track = open_track(filename)
+            self.track_layout = self.track.layout
+            self.grid_columns = self.track.columns
+            self.grid_rows = self.track.rows
             print(f"Track loaded from {filename}")
             
             self.show_loading_screen("Loading track...")
             
-            visited = [[False for _ in range(GRID_COLUMNS)] for _ in range(GRID_ROWS)]
-            
-            for y in range(GRID_ROWS):
-                for x in range(GRID_COLUMNS):
-                    if self.track_layout[y][x] == TRACK_TILE_TYPES['checkpoint1'] and not visited[y][x]:
-                        self.checkpoint1_group = self.find_connected_checkpoints((x, y), TRACK_TILE_TYPES['checkpoint1'], visited)
-                        break
-                if self.checkpoint1_group:
-                    break
-            
-            for y in range(GRID_ROWS):
-                for x in range(GRID_COLUMNS):
-                    if self.track_layout[y][x] == TRACK_TILE_TYPES['checkpoint2'] and not visited[y][x]:
-                        self.checkpoint2_group = self.find_connected_checkpoints((x, y), TRACK_TILE_TYPES['checkpoint2'], visited)
-                        break
-                if self.checkpoint2_group:
-                    break
-            
-            if self.checkpoint1_group:
-                self.cp1_centroid = (sum(x for x, y in self.checkpoint1_group)/len(self.checkpoint1_group),
-                                   sum(y for x, y in self.checkpoint1_group)/len(self.checkpoint1_group))
-            if self.checkpoint2_group:
-                self.cp2_centroid = (sum(x for x, y in self.checkpoint2_group)/len(self.checkpoint2_group),
-                                   sum(y for x, y in self.checkpoint2_group)/len(self.checkpoint2_group))
-            
-            start_positions = self.find_start_positions()
+            self.checkpoint1_group = self.track.checkpoint1_group
+            self.checkpoint2_group = self.track.checkpoint2_group
+            self.cp1_centroid = self.track.cp1_centroid
+            self.cp2_centroid = self.track.cp2_centroid
+            self.finish_centroid = self.track.finish_centroid
+            
+            start_positions = self.track.start_positions
             if not start_positions:
                 print("No starting positions found!")
                 sys.exit()
             
-            self.finish_centroid = (sum(x for x, y in start_positions)/len(start_positions),
-                                  sum(y for x, y in start_positions)/len(start_positions))
-            
             start_pos = random.choice(start_positions)
             self.player_x, self.player_y = start_pos
             self.player_path_history = [(self.player_x, self.player_y)]
@@ -189,203 +232,494 @@ class Game:
             self.ai_x, self.ai_y = ai_start
             self.ai_path_history = [(self.ai_x, self.ai_y)]
             self.ai_position_markers = [(self.ai_x, self.ai_y)]
+            self.centre_camera(self.player_x, self.player_y)
             
-            self.show_loading_screen("AI is calculating optimal route...")
+            self.distance_heuristic = DistanceHeuristic(self.track_layout, self.checkpoint1_group,
+                                                        self.checkpoint2_group, start_positions)
             
-            self.ai_path = self.compute_optimal_path(self.ai_x, self.ai_y)
-            if not self.ai_path:
-                print("No valid path found for AI!")
-                sys.exit()
+            start_state = pack_state(self.ai_x, self.ai_y, 0, 0, False, False, 1)
+            self.ai_plan = []
+            self.ai_path = []
+            self.ai_path_index = 0
+            self.refined_plan = None
+            self.adopted_version = 0
+            
+            cached_plan = None
+            if self.use_path_cache:
+                self.path_cache = PathCache(cache_directory_for(filename))
+                self.track_name = os.path.basename(filename)
+                self.track_hash = track_hash(self.track_layout)
+                self.plan_cache_key = self.path_cache.make_key(self.track_hash, start_state, self.required_laps,
+                                                               self.planner_identity())
+                cached_plan = self.path_cache.get(self.plan_cache_key)
+            
+            if cached_plan and cached_plan[0] == start_state and state_lap(cached_plan[-1]) > self.required_laps:
+                self.ai_plan = cached_plan
+                self.ai_path = [state_position(state) for state in self.ai_plan]
+                # The table only speeds up later replans, so the race starts without waiting for it
+                self.planner.submit(self.build_move_table)
+            elif self.use_anytime_planner:
+                self.start_planning(self.plan_race_anytime, start_state)
+            else:
+                self.start_planning(self.plan_race, start_state)
             
         except FileNotFoundError:
             print(f"File {filename} not found.")
             sys.exit()
-
-    def find_connected_checkpoints(self, start_pos, tile_type, visited):
-        queue = [start_pos]
-        connected = []
-        while queue:
-            x, y = queue.pop(0)
-            if visited[y][x]:
-                continue
-            visited[y][x] = True
-            if self.track_layout[y][x] == tile_type:
-                connected.append((x, y))
-                for dx, dy in [(-1,0), (1,0), (0,-1), (0,1)]:
-                    nx, ny = x + dx, y + dy
-                    if 0 <= nx < GRID_COLUMNS and 0 <= ny < GRID_ROWS:
-                        if not visited[ny][nx] and self.track_layout[ny][nx] == tile_type:
-                            queue.append((nx, ny))
-        return connected
-
-    def find_start_positions(self):
-        return [(x, y) for y in range(GRID_ROWS) for x in range(GRID_COLUMNS)
-                if self.track_layout[y][x] == TRACK_TILE_TYPES['start_finish']]
+        except TrackFormatError as error:
+            print(error)
+            sys.exit()
 
     def euclidean_distance(self, x1, y1, x2, y2):
         return ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
 
     def get_target(self, state):
-        if state.lap > self.required_laps:
+        if state_lap(state) > self.required_laps:
             return None
-        if not state.cp1:
+        phase = state_phase(state)
+        if phase == PHASE_NONE:
             return self.cp1_centroid
-        elif not state.cp2:
+        elif phase == PHASE_CP1:
             return self.cp2_centroid
         else:
             return self.finish_centroid
 
     def calculate_priority(self, cost, state, x, y, target_x, target_y):
+        if self.use_distance_heuristic and self.distance_heuristic is not None:
+            return cost + self.distance_heuristic.estimate_state(state, self.required_laps)
         return cost + self.euclidean_distance(x, y, target_x, target_y)
 
     def is_move_valid(self, x0, y0, x1, y1):
-        for x, y in self.bresenham_line(x0, y0, x1, y1):
-            if not (0 <= x < GRID_COLUMNS and 0 <= y < GRID_ROWS) or \
-               self.track_layout[y][x] == TRACK_TILE_TYPES['out_of_bounds']:
-                return False, []
-        
-        crossed = []
-        for x, y in self.bresenham_line(x0, y0, x1, y1):
-            tile = self.track_layout[y][x]
-            if tile == TRACK_TILE_TYPES['checkpoint1']:
-                crossed.append(('cp1', (x,y)))
-            elif tile == TRACK_TILE_TYPES['checkpoint2']:
-                crossed.append(('cp2', (x,y)))
-            elif tile == TRACK_TILE_TYPES['start_finish']:
-                crossed.append(('finish', (x,y)))
-        return True, crossed
-
-    def bresenham_line(self, x0, y0, x1, y1):
-        points = []
-        dx = abs(x1 - x0)
-        dy = abs(y1 - y0)
-        x, y = x0, y0
-        sx = -1 if x0 > x1 else 1
-        sy = -1 if y0 > y1 else 1
-        
-        if dx > dy:
-            err = dx / 2.0
-            while x != x1:
-                points.append((x, y))
-                err -= dy
-                if err < 0:
-                    y += sy
-                    err += dx
-                x += sx
-        else:
-            err = dy / 2.0
-            while y != y1:
-                points.append((x, y))
-                err -= dx
-                if err < 0:
-                    x += sx
-                    err += dy
-                y += sy
+        return self.track.is_move_valid(x0, y0, x1, y1)
+
+    def traced_transition(self, x, y, new_x, new_y, cp1, cp2, lap):
+        transition = self.track.transition(x, y, new_x, new_y, cp1, cp2, lap)
+        if transition is None:
+            return None
+        cp1, cp2, lap = transition
+        return int(cp1) | (int(cp2) << 1), lap
+
+    def next_states(self, state):
+        x, y, vx, vy, cp1, cp2, lap = unpack_state(state)
+        phase = PHASE_FROM_FLAGS[(state >> CP1_SHIFT) & FLAGS_MASK]
+        table = self.move_table if self.track_layout is self.move_table_layout else None
+        
+        for dvx in (-1, 0, 1):
+            for dvy in (-1, 0, 1):
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
+                
+                if not (0 <= new_x < self.grid_columns and 0 <= new_y < self.grid_rows):
+                    continue
+                
+                code = table.lookup(x, y, new_vx, new_vy, phase) if table is not None else None
+                if code is None:
+                    transition = self.traced_transition(x, y, new_x, new_y, cp1, cp2, lap)
+                    if transition is None:
+                        continue
+                    new_flags, new_lap = transition
+                elif code == INVALID_MOVE:
+                    continue
+                else:
+                    new_flags = FLAGS_FROM_PHASE[code & 3]
+                    new_lap = lap + (code >> 2)
                 
-        points.append((x1, y1))
-        return points
+                yield pack_state(new_x, new_y, new_vx, new_vy, new_flags & 1, new_flags >> 1, new_lap)
+
+    def plans_by_lap(self):
+        # The lap planner needs the move table, and a single lap gains nothing from it
+        return self.use_lap_planner and self.required_laps > 1 and \
+            table_fits(self.track.road_mask.road_cells, self.max_table_speed)
+
+    def planner_identity(self):
+        if self.plans_by_lap():
+            return f"laps-speed{self.max_table_speed}-v{PLANNER_VERSION}"
+        heuristic = 'distance' if self.use_distance_heuristic else 'euclidean'
+        return f"astar-{heuristic}-speed{self.max_table_speed}-v{PLANNER_VERSION}"
+
+    def build_move_table(self):
+        # Tracks too large for a table are searched by tracing each move as it is generated
+        if not table_fits(self.track.road_mask.road_cells, self.max_table_speed):
+            self.move_table = None
+            self.move_table_layout = None
+            return
+        self.move_table = MoveTable(self.track_layout, self.checkpoint1_group, self.checkpoint2_group,
+                                    TRACK_TILE_TYPES['start_finish'], bresenham_line, self.max_table_speed)
+        self.move_table_layout = self.track_layout
+
+    def plan_race(self, start_state, progress=None, cancel=None):
+        if progress is not None:
+            progress['stage'] = "Precomputing track moves..."
+        self.build_move_table()
+        
+        if progress is not None:
+            progress['stage'] = "AI is calculating optimal route..."
+        if self.plans_by_lap() and self.move_table is not None:
+            if self.lap_planner is None or self.lap_planner.table is not self.move_table:
+                self.lap_planner = LapPlanner(self.track, self.move_table, self.distance_heuristic)
+            plan = self.lap_planner.plan(start_state, self.required_laps, progress, cancel)
+        else:
+            plan = self.compute_optimal_plan(start_state, progress=progress, cancel=cancel)
+        
+        if plan and self.path_cache is not None:
+            self.path_cache.put(self.plan_cache_key, plan, self.track_name, self.track_hash)
+        return plan
+
+    def estimate_remaining(self, state):
+        target = self.get_target(state)
+        target_x, target_y = self.finish_centroid if target is None else target
+        x, y = state_position(state)
+        return self.calculate_priority(0, state, x, y, target_x, target_y)
+
+    def is_finished(self, state):
+        return state >> LAP_SHIFT > self.required_laps
 
-    def compute_optimal_path(self, start_x, start_y):
-        heap = []
-        initial_state = State(start_x, start_y, 0, 0, False, False, 1)
-        heapq.heappush(heap, (0, initial_state))
+    def plan_race_anytime(self, start_state, progress=None, cancel=None):
+        # The first plan of an ARA* search, found within about first_plan_time once the move
+        # table is built. collect_plan hands the rest of the search to refine_plan.
+        if progress is not None:
+            progress['stage'] = "Precomputing track moves..."
+        self.build_move_table()
         
-        visited = {}
+        if progress is not None:
+            progress['stage'] = "AI is finding a route..."
+        # A multi-lap race goes straight from the first plan to the lap planner, which is exact and
+        # quicker than the weighted searches over every lap
+        weights = DEFAULT_WEIGHTS[:1] if self.plans_by_lap() and self.move_table is not None else DEFAULT_WEIGHTS
+        planner = AnytimePlanner(self.next_states, self.estimate_remaining, self.is_finished, weights)
+        search = planner.plans(start_state, self.first_plan_time, progress, cancel)
+        first = next(search, None)
+        if first is None:
+            return None
+        plan, bound = first
+        self.anytime_search = (search, start_state, plan, bound, cancel)
+        return plan
+
+    def refine_plan(self, search, start_state, plan, bound, cancel):
+        # Runs on the planner thread after the first plan has been handed over, publishing every
+        # better plan in refined_plan. Only the optimal plan is cached.
+        version = 0
+        for plan, bound in search:
+            version += 1
+            self.refined_plan = (version, plan, bound)
+        
+        if bound > 1.0 and not cancel.is_set() and self.plans_by_lap() and self.move_table is not None:
+            if self.lap_planner is None or self.lap_planner.table is not self.move_table:
+                self.lap_planner = LapPlanner(self.track, self.move_table, self.distance_heuristic)
+            exact = self.lap_planner.plan(start_state, self.required_laps, cancel=cancel)
+            if exact:
+                plan, bound = exact, 1.0
+                version += 1
+                self.refined_plan = (version, plan, bound)
+        
+        if bound <= 1.0 and not cancel.is_set() and self.path_cache is not None:
+            self.path_cache.put(self.plan_cache_key, plan, self.track_name, self.track_hash)
+
+    def adopt_refined_plan(self, refined):
+        # Switches to a refined plan when the AI can get onto it from its current state and finish
+        # in fewer moves than it would by staying on its own plan
+        plan = self.ai_plan
+        index = self.ai_path_index
+        current = plan[index]
+        planned_cost = len(plan) - 1 - index
+        
+        if current in refined:
+            j = refined.index(current)
+            if len(refined) - 1 - j >= planned_cost:
+                return False
+            self.ai_plan = plan[:index] + refined[j:]
+        else:
+            # Otherwise a short detour onto it, around the player, from about as far along
+            first_rejoin = max(index - self.repair_window // 2, 0)
+            detour = self.find_detour(current, refined, first_rejoin, self.car_obstacles(False), planned_cost - 1)
+            if detour is None:
+                return False
+            route, rejoin = detour
+            self.ai_plan = plan[:index] + route + (refined[rejoin + 1:] if rejoin is not None else [])
+        
+        self.ai_path = [state_position(state) for state in self.ai_plan]
+        return True
+
+    def start_planning(self, function, *args):
+        # Runs function(*args, progress=..., cancel=...) on the planner thread. The plan replaces
+        # ai_plan from the current path index once update() sees it is done.
+        # A replan supersedes any refinement, which would otherwise hold up the planner thread
+        self.refine_cancel.set()
+        self.plan_progress = {'stage': "AI is calculating optimal route...", 'expanded': 0}
+        self.plan_cancel = threading.Event()
+        self.plan_start_index = self.ai_path_index
+        if self.refine_future is None:
+            self.default_switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(PLANNING_SWITCH_INTERVAL)
+        self.plan_future = self.planner.submit(function, *args, progress=self.plan_progress, cancel=self.plan_cancel)
+
+    def collect_plan(self):
+        if self.plan_future is None or not self.plan_future.done():
+            return False
+        
+        new_plan = self.plan_future.result()
+        self.plan_future = None
+        first_plan = not self.ai_plan
+        
+        # The search that found the first plan carries on improving it in the background, with
+        # the short switch interval kept so the game loop stays responsive
+        if self.anytime_search is not None:
+            self.refine_cancel = self.anytime_search[-1]
+            self.refine_future = self.planner.submit(self.refine_plan, *self.anytime_search)
+            self.anytime_search = None
+        else:
+            sys.setswitchinterval(self.default_switch_interval)
+        
+        if new_plan:
+            self.ai_plan = self.ai_plan[:self.plan_start_index] + new_plan
+            self.ai_path = [state_position(state) for state in self.ai_plan]
+        elif first_plan:
+            print("No valid path found for AI!")
+            sys.exit()
+        
+        if first_plan:
+            self.game_start_time = time.time()
+        self.is_recalculating_path = False
+        return True
+
+    def stop_planning(self):
+        self.refine_cancel.set()
+        if self.plan_future is not None or self.refine_future is not None:
+            self.plan_cancel.set()
+            self.plan_future = None
+            self.refine_future = None
+            sys.setswitchinterval(self.default_switch_interval)
+        self.planner.shutdown(wait=False)
+
+    def compute_optimal_path(self, start_x, start_y, stats=None):
+        plan = self.compute_optimal_plan(pack_state(start_x, start_y, 0, 0, False, False, 1), stats=stats)
+        if plan is None:
+            return None
+        return [state_position(state) for state in plan]
+
+    def compute_optimal_plan(self, start_state, obstacles=None, progress=None, cancel=None, stats=None):
+        # Distance heuristic estimates are whole moves, straight line ones are bucketed finer
+        open_list = BucketQueue(1 if self.use_distance_heuristic else FLOAT_RESOLUTION)
+        open_list.push(0, 0, start_state)
+        
+        cost_so_far = {start_state: 0}
         came_from = {}
+        expanded = 0
+        pushed = 1
+        stale = 0
+        peak_open = 1
+        # Table lookups are inline, so only traced moves count towards the validation time
+        traced_transition, push, pop = instrument(stats, self.traced_transition, open_list.push, open_list.pop)
         
-        while heap:
-            cost, current = heapq.heappop(heap)
+        # The table only describes the layout it was built from, so temporary layouts are traced
+        table = self.move_table if self.track_layout is self.move_table_layout else None
+        if table is not None:
+            max_speed = table.max_speed
+            speed_span = table.speed_span
+            flat = table.flat
+        
+        while open_list:
+            _, cost, current = pop()
             
-            if current.lap > self.required_laps:
-                path = []
-                while current in came_from:
-                    path.append((current.x, current.y))
-                    current = came_from[current]
-                path.append((start_x, start_y))
-                path.reverse()
-                return path
+            if current >> LAP_SHIFT > self.required_laps:
+                record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+                return reconstruct_states(came_from, current)
             
-            state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-            if state_key in visited and visited[state_key] <= cost:
+            if cost > cost_so_far[current]:
+                stale += 1
                 continue
-            visited[state_key] = cost
+            
+            expanded += 1
+            if not expanded & 1023:
+                if progress is not None:
+                    progress['expanded'] = expanded
+                if cancel is not None and cancel.is_set():
+                    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+                    return None
+            
+            x, y, vx, vy, cp1, cp2, lap = unpack_state(current)
+            phase = PHASE_FROM_FLAGS[(current >> CP1_SHIFT) & FLAGS_MASK]
+            base = table.cell_base(x, y) if table is not None else -1
+            new_cost = cost + 1
             
             for dvx in (-1, 0, 1):
                 for dvy in (-1, 0, 1):
-                    new_vx = current.vx + dvx
-                    new_vy = current.vy + dvy
-                    new_x = current.x + new_vx
-                    new_y = current.y + new_vy
-                    
-                    if not (0 <= new_x < GRID_COLUMNS and 0 <= new_y < GRID_ROWS):
-                        continue
+                    new_vx = vx + dvx
+                    new_vy = vy + dvy
+                    new_x = x + new_vx
+                    new_y = y + new_vy
                     
-                    valid, crossed = self.is_move_valid(current.x, current.y, new_x, new_y)
-                    if not valid:
+                    if not (0 <= new_x < self.grid_columns and 0 <= new_y < self.grid_rows):
                         continue
                     
-                    cp1 = current.cp1
-                    cp2 = current.cp2
-                    lap = current.lap
-                    
-                    for c in crossed:
-                        if c[0] == 'cp1' and not cp1 and c[1] in self.checkpoint1_group:
-                            cp1 = True
-                        elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in self.checkpoint2_group:
-                            cp2 = True
-                        elif c[0] == 'finish':
-                            if cp1 and cp2:
-                                lap += 1
-                                cp1 = False
-                                cp2 = False
-                            else:
-                                cp1 = False
-                                cp2 = False
+                    if base >= 0 and -max_speed <= new_vx <= max_speed and -max_speed <= new_vy <= max_speed:
+                        code = flat[base + ((new_vx + max_speed) * speed_span + new_vy + max_speed) * PHASE_COUNT + phase]
+                        if code == INVALID_MOVE:
+                            continue
+                        new_flags = FLAGS_FROM_PHASE[code & 3]
+                        new_lap = lap + (code >> 2)
+                    else:
+                        transition = traced_transition(x, y, new_x, new_y, cp1, cp2, lap)
+                        if transition is None:
+                            continue
+                        new_flags, new_lap = transition
                     
-                    new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
-                    new_cost = cost + 1
+                    if obstacles and obstacles.blocks(x, y, new_x, new_y):
+                        continue
                     
-                    target = self.get_target(new_state)
-                    if target is None:
-                        target_x, target_y = self.finish_centroid
-                    else:
-                        target_x, target_y = target
+                    new_state = ((new_lap << LAP_SHIFT) | (new_flags << CP1_SHIFT) | (new_x << X_SHIFT) | (new_y << Y_SHIFT) |
+                                 ((new_vx + VELOCITY_OFFSET) << VX_SHIFT) | (new_vy + VELOCITY_OFFSET))
                     
-                    new_state_key = (new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
-                    if new_state_key not in visited or new_cost < visited[new_state_key]:
+                    if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                        target = self.get_target(new_state)
+                        if target is None:
+                            target_x, target_y = self.finish_centroid
+                        else:
+                            target_x, target_y = target
+
+                        # The distance heuristic is infinite where the finish cannot be reached, and the
+                        # bucket queue only takes finite priorities, so those states are dropped
                         priority = self.calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
-                        heapq.heappush(heap, (priority, new_state))
+                        if not math.isfinite(priority):
+                            continue
+                        cost_so_far[new_state] = new_cost
                         came_from[new_state] = current
+                        push(priority, new_cost, new_state)
+                        pushed += 1
+            
+            if len(open_list) > peak_open:
+                peak_open = len(open_list)
         
+        record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
         return None
 
+    def car_obstacles(self, is_player):
+        # The cars in the way of the player's car, or of the AI's
+        if is_player:
+            return ObstacleLayer({'ai': (self.ai_x, self.ai_y)})
+        return ObstacleLayer({'player': (self.player_x, self.player_y)})
+
+    def repair_ai_path(self, obstacles):
+        # Keeps the stored plan and searches only for a detour from the AI's current state
+        # that rejoins it past the moves through obstacles, costing at most repair_slack extra moves.
+        # Returns False when no such detour exists and a full replan is needed.
+        plan = self.ai_plan
+        index = self.ai_path_index
+        if index >= len(plan) - 1:
+            return True
+        
+        last_blocked = None
+        for j in range(index + 1, min(len(plan), index + self.repair_window + 1)):
+            (x0, y0), (x1, y1) = self.ai_path[j - 1], self.ai_path[j]
+            if obstacles.blocks(x0, y0, x1, y1):
+                last_blocked = j
+        if last_blocked is None:
+            return True
+        
+        planned_cost = len(plan) - 1 - index
+        detour = self.find_detour(plan[index], plan, last_blocked, obstacles, planned_cost + self.repair_slack,
+                                  planned_cost)
+        if detour is None:
+            return False
+        
+        route, rejoin = detour
+        if rejoin is not None:
+            self.ai_plan = plan[:index] + route + plan[rejoin + 1:]
+        else:
+            self.ai_plan = plan[:index] + route
+        self.ai_path = [state_position(state) for state in self.ai_plan]
+        return True
+
+    def find_detour(self, start, plan, first_rejoin, obstacles, cost_limit, good_enough=-1):
+        # Cheapest route from start that avoids obstacles and rejoins plan at one of the repair_window
+        # states from first_rejoin, or crosses the finish, costing at most cost_limit moves in all.
+        # Stops early once it has one costing good_enough or less. Returns (route, index it rejoins
+        # plan at, or None at the finish), or None if there is no such route.
+        # Plan states the detour may rejoin, with their exact remaining cost
+        remaining = {}
+        targets = []
+        for j in range(first_rejoin, min(len(plan), first_rejoin + self.repair_window + 1)):
+            if state_position(plan[j]) not in obstacles:
+                remaining[plan[j]] = len(plan) - 1 - j
+                tx, ty, tvx, tvy, _, _, _ = unpack_state(plan[j])
+                targets.append((tx, ty, tvx, tvy, len(plan) - 1 - j))
+        if not targets:
+            return None
+        # Near the end of the race the detour may cross the finish line at any speed instead
+        finish_in_window = plan[-1] in remaining
+        
+        def rejoin_estimate(state):
+            # Fewest moves to reach a rejoin state's cell and velocity, plus what is left after it
+            x, y, vx, vy, _, _, _ = unpack_state(state)
+            best = math.inf
+            for tx, ty, tvx, tvy, left in targets:
+                moves = max(axis_moves(vx, tvx, tx - x), axis_moves(vy, tvy, ty - y))
+                if moves + left < best:
+                    best = moves + left
+            if finish_in_window:
+                best = min(best, self.distance_heuristic.estimate_state(state, self.required_laps))
+            return best
+        
+        best_cost = cost_limit + 1
+        best_state = None
+        came_from = {}
+        cost_so_far = {start: 0}
+        heap = [(rejoin_estimate(start), 0, start)]
+        
+        while heap and best_cost > good_enough:
+            priority, cost, current = heapq.heappop(heap)
+            if priority >= best_cost:
+                break
+            if cost > cost_so_far[current]:
+                continue
+            
+            x, y = state_position(current)
+            new_cost = cost + 1
+            for new_state in self.next_states(current):
+                if new_cost >= cost_so_far.get(new_state, new_cost + 1):
+                    continue
+                new_x, new_y = state_position(new_state)
+                if obstacles.blocks(x, y, new_x, new_y):
+                    continue
+                
+                if new_state in remaining or new_state >> LAP_SHIFT > self.required_laps:
+                    total = new_cost + remaining.get(new_state, 0)
+                    if total < best_cost:
+                        came_from[new_state] = current
+                        best_cost = total
+                        best_state = new_state
+                    continue
+                
+                estimate = rejoin_estimate(new_state)
+                if new_cost + estimate >= best_cost:
+                    continue
+                cost_so_far[new_state] = new_cost
+                came_from[new_state] = current
+                heapq.heappush(heap, (new_cost + estimate, new_cost, new_state))
+        
+        if best_state is None:
+            return None
+        
+        route = reconstruct_states(came_from, best_state)
+        if best_state in remaining:
+            return route, len(plan) - 1 - remaining[best_state]
+        return route, None
+
     def process_move(self, x, y, vx, vy, is_player):
         if is_player:
             state_vars = (self.player_cp1, self.player_cp2, self.player_lap)
         else:
             state_vars = (self.ai_cp1, self.ai_cp2, self.ai_lap)
         
-        cp1, cp2, lap = state_vars
-        _, crossed = self.is_move_valid(x, y, x + vx, y + vy)
-        
-        for c in crossed:
-            if c[0] == 'cp1' and not cp1 and c[1] in self.checkpoint1_group:
-                cp1 = True
-            elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in self.checkpoint2_group:
-                cp2 = True
-            elif c[0] == 'finish':
-                if cp1 and cp2:
-                    lap += 1
-                    if lap > self.required_laps:
-                        if is_player:
-                            self.player_has_won = True
-                        else:
-                            self.ai_has_won = True
-                    cp1 = False
-                    cp2 = False
-                else:
-                    cp1 = False
-                    cp2 = False
+        transition = self.track.transition(x, y, x + vx, y + vy, *state_vars)
+        cp1, cp2, lap = transition if transition is not None else state_vars
+        if lap > self.required_laps:
+            if is_player:
+                self.player_has_won = True
+            else:
+                self.ai_has_won = True
         
         if is_player:
             self.player_cp1, self.player_cp2, self.player_lap = cp1, cp2, lap
@@ -395,28 +729,14 @@ class Game:
         return self.player_has_won or self.ai_has_won
 
     def handle_player_move(self, mouse_pos):
-        if self.is_animating:
+        if self.is_animating or self.plan_future is not None:
             return
         
-        clicked_x = mouse_pos[0] // GRID_CELL_SIZE
-        clicked_y = mouse_pos[1] // GRID_CELL_SIZE
+        clicked_x = mouse_pos[0] // GRID_CELL_SIZE + self.camera_x
+        clicked_y = mouse_pos[1] // GRID_CELL_SIZE + self.camera_y
         
-        possible_moves = []
-        for dvx in (-1, 0, 1):
-            for dvy in (-1, 0, 1):
-                new_vx = self.player_vx + dvx
-                new_vy = self.player_vy + dvy
-                new_x = self.player_x + new_vx
-                new_y = self.player_y + new_vy
-                
-                if 0 <= new_x < GRID_COLUMNS and 0 <= new_y < GRID_ROWS:
-                    valid, crossed = self.is_move_valid(self.player_x, self.player_y, new_x, new_y)
-                    if valid and not self.would_collide_with_ai(self.player_x, self.player_y, new_x, new_y):
-                        possible_moves.append((new_x, new_y, new_vx, new_vy, crossed))
-        
-        for move in possible_moves:
-            new_x, new_y, new_vx, new_vy, _ = move
-            if clicked_x == new_x and clicked_y == new_y:
+        for new_x, new_y, new_vx, new_vy, _, collides in self.legal_moves(True):
+            if not collides and clicked_x == new_x and clicked_y == new_y:
                 self.is_animating = True
                 self.current_step = 0
                 self.animation_start = (self.player_x, self.player_y)
@@ -426,20 +746,25 @@ class Game:
                 break
 
     def has_valid_moves(self):
-        for dvx in (-1, 0, 1):
-            for dvy in (-1, 0, 1):
-                new_vx = self.player_vx + dvx
-                new_vy = self.player_vy + dvy
-                new_x = self.player_x + new_vx
-                new_y = self.player_y + new_vy
-                
-                if 0 <= new_x < GRID_COLUMNS and 0 <= new_y < GRID_ROWS:
-                    valid, _ = self.is_move_valid(self.player_x, self.player_y, new_x, new_y)
-                    if valid:
-                        return True
-        return False
+        return bool(self.legal_moves(True))
 
     def update(self):
+        if self.plan_future is not None:
+            self.collect_plan()
+            if self.plan_future is not None:
+                return
+        
+        if self.refine_future is not None and self.refine_future.done():
+            self.refine_future = None
+            sys.setswitchinterval(self.default_switch_interval)
+        
+        # Refined plans are only switched to between moves
+        refined = self.refined_plan
+        if refined is not None and refined[0] > self.adopted_version and not self.is_animating and \
+                not self.is_recalculating_path and self.game_running:
+            self.adopted_version = refined[0]
+            self.adopt_refined_plan(refined[1])
+        
         if self.is_animating:
             self.current_step += 1
             if self.current_step >= self.animation_steps:
@@ -494,19 +819,11 @@ class Game:
                 self.show_recalculating_message = False
             
         if self.is_recalculating_path:
-            temp_track = copy.deepcopy(self.track_layout)
-            temp_track[self.player_y][self.player_x] = TRACK_TILE_TYPES['out_of_bounds']
-            
-            original_track = self.track_layout
-            self.track_layout = temp_track
-            
-            new_path = self.compute_optimal_path(self.ai_x, self.ai_y)
-            
-            self.track_layout = original_track
-            
-            if new_path:
-                self.ai_path = self.ai_path[:self.ai_path_index] + new_path
-                self.ai_path_index = min(self.ai_path_index, len(self.ai_path) - 1)
+            obstacles = self.car_obstacles(False)
+            if not self.repair_ai_path(obstacles):
+                # No local detour, so replan the rest of the race in the background
+                self.start_planning(self.compute_optimal_plan, self.ai_plan[self.ai_path_index], obstacles)
+                return
             
             self.is_recalculating_path = False
             
@@ -527,8 +844,7 @@ class Game:
             self.ai_vx = next_pos[0] - self.ai_x
             self.ai_vy = next_pos[1] - self.ai_y
             
-            if not (next_pos[0] == self.player_x and next_pos[1] == self.player_y) and \
-               not any(p == (self.player_x, self.player_y) for p in self.bresenham_line(self.ai_x, self.ai_y, next_pos[0], next_pos[1])):
+            if not self.car_obstacles(False).blocks(self.ai_x, self.ai_y, next_pos[0], next_pos[1]):
                 self.is_animating = True
                 self.current_step = 0
                 self.animation_start = (self.ai_x, self.ai_y)
@@ -573,16 +889,36 @@ class Game:
         exit_rect = exit_text.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT - 100))
         game_window.blit(exit_text, exit_rect)
 
-    def draw(self):
-        game_window.fill(WHITE)
+    def centre_camera(self, x, y):
+        self.camera_x = max(0, min(x - VIEW_COLUMNS // 2, self.grid_columns - VIEW_COLUMNS))
+        self.camera_y = max(0, min(y - VIEW_ROWS // 2, self.grid_rows - VIEW_ROWS))
+
+    def update_camera(self):
+        x = self.player_x - self.camera_x
+        y = self.player_y - self.camera_y
+        if not (CAMERA_MARGIN <= x < VIEW_COLUMNS - CAMERA_MARGIN and CAMERA_MARGIN <= y < VIEW_ROWS - CAMERA_MARGIN):
+            self.centre_camera(self.player_x, self.player_y)
+
+    def cell_rect(self, x, y):
+        return pygame.Rect((x - self.camera_x) * GRID_CELL_SIZE, (y - self.camera_y) * GRID_CELL_SIZE,
+                           GRID_CELL_SIZE, GRID_CELL_SIZE)
+
+    def cell_centre(self, position):
+        return ((position[0] - self.camera_x) * GRID_CELL_SIZE + GRID_CELL_SIZE // 2,
+                (position[1] - self.camera_y) * GRID_CELL_SIZE + GRID_CELL_SIZE // 2)
+
+    def render_track_surface(self):
+        # Only the cells in view, anything past the edge of the track is left black
+        surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        surface.fill(BLACK)
         
-        for y in range(GRID_ROWS):
-            for x in range(GRID_COLUMNS):
-                tile_value = self.track_layout[y][x]
+        for y in range(self.camera_y, min(self.grid_rows, self.camera_y + VIEW_ROWS)):
+            row = self.track_layout[y]
+            for x in range(self.camera_x, min(self.grid_columns, self.camera_x + VIEW_COLUMNS)):
+                tile_value = row[x]
                 color = TILE_COLORS.get(tile_value, WHITE)
-                rect = pygame.Rect(x * GRID_CELL_SIZE, y * GRID_CELL_SIZE, 
-                                 GRID_CELL_SIZE, GRID_CELL_SIZE)
-                pygame.draw.rect(game_window, color, rect)
+                rect = self.cell_rect(x, y)
+                pygame.draw.rect(surface, color, rect)
                 
                 if color == WHITE or color == LIGHT_GRAY:
                     grid_color = GRAY
@@ -593,70 +929,63 @@ class Game:
                 else:
                     grid_color = color
                 
-                pygame.draw.rect(game_window, grid_color, rect, 1)  
+                pygame.draw.rect(surface, grid_color, rect, 1)  
+        return surface
+
+    def draw(self):
+        self.update_camera()
+        camera = (self.camera_x, self.camera_y)
+        if self.track_surface is None or self.track_surface_layout is not self.track_layout or \
+           self.track_surface_camera != camera:
+            self.track_surface = self.render_track_surface()
+            self.track_surface_layout = self.track_layout
+            self.track_surface_camera = camera
+        game_window.blit(self.track_surface, (0, 0))
         
         if self.is_player_turn and not self.is_animating and self.game_running:
-            for dvx in (-1, 0, 1):
-                for dvy in (-1, 0, 1):
-                    new_vx = self.player_vx + dvx
-                    new_vy = self.player_vy + dvy
-                    new_x = self.player_x + new_vx
-                    new_y = self.player_y + new_vy
-                    
-                    if 0 <= new_x < GRID_COLUMNS and 0 <= new_y < GRID_ROWS:
-                        valid, _ = self.is_move_valid(self.player_x, self.player_y, new_x, new_y)
-                        if valid:
-                            rect = pygame.Rect(new_x * GRID_CELL_SIZE, new_y * GRID_CELL_SIZE, 
-                                             GRID_CELL_SIZE, GRID_CELL_SIZE)
-                            
-                            if self.would_collide_with_ai(self.player_x, self.player_y, new_x, new_y):
-                                pygame.draw.rect(game_window, (255, 200, 200), rect)  
-                                pygame.draw.line(game_window, (255, 0, 0), 
-                                               (new_x * GRID_CELL_SIZE + 5, new_y * GRID_CELL_SIZE + 5),
-                                               (new_x * GRID_CELL_SIZE + GRID_CELL_SIZE - 5, new_y * GRID_CELL_SIZE + GRID_CELL_SIZE - 5), 3)
-                                pygame.draw.line(game_window, (255, 0, 0), 
-                                               (new_x * GRID_CELL_SIZE + GRID_CELL_SIZE - 5, new_y * GRID_CELL_SIZE + 5),
-                                               (new_x * GRID_CELL_SIZE + 5, new_y * GRID_CELL_SIZE + GRID_CELL_SIZE - 5), 3)
-                            else:
-                                pygame.draw.rect(game_window, (200, 255, 200), rect)  
-                                pygame.draw.rect(game_window, (0, 200, 0), rect, 2)  
+            for new_x, new_y, _, _, _, collides in self.legal_moves(True):
+                rect = self.cell_rect(new_x, new_y)
+                
+                if collides:
+                    pygame.draw.rect(game_window, (255, 200, 200), rect)  
+                    pygame.draw.line(game_window, (255, 0, 0), 
+                                   (rect.left + 5, rect.top + 5),
+                                   (rect.right - 5, rect.bottom - 5), 3)
+                    pygame.draw.line(game_window, (255, 0, 0), 
+                                   (rect.right - 5, rect.top + 5),
+                                   (rect.left + 5, rect.bottom - 5), 3)
+                else:
+                    pygame.draw.rect(game_window, (200, 255, 200), rect)  
+                    pygame.draw.rect(game_window, (0, 200, 0), rect, 2)  
         
         if self.show_ai_path and self.ai_path and not self.is_recalculating_path and self.ai_path_index < len(self.ai_path) - 1:
             path_color = list(self.AI_PATH_COLOR) + [150] 
             path_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
             
             for i in range(self.ai_path_index, len(self.ai_path) - 1):
-                start_point = (self.ai_path[i][0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                             self.ai_path[i][1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
-                end_point = (self.ai_path[i+1][0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                           self.ai_path[i+1][1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
+                start_point = self.cell_centre(self.ai_path[i])
+                end_point = self.cell_centre(self.ai_path[i+1])
                 pygame.draw.line(game_window, self.AI_PATH_COLOR, start_point, end_point, 2)
                 pygame.draw.circle(game_window, self.AI_PATH_COLOR, end_point, 3)
         
         if len(self.player_path_history) > 1:
             for i in range(1, len(self.player_path_history)):
-                start_point = (self.player_path_history[i-1][0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                             self.player_path_history[i-1][1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
-                end_point = (self.player_path_history[i][0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                           self.player_path_history[i][1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
+                start_point = self.cell_centre(self.player_path_history[i-1])
+                end_point = self.cell_centre(self.player_path_history[i])
                 pygame.draw.line(game_window, BLACK, start_point, end_point, 4)
         
         if len(self.ai_path_history) > 1:
             for i in range(1, len(self.ai_path_history)):
-                start_point = (self.ai_path_history[i-1][0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                             self.ai_path_history[i-1][1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
-                end_point = (self.ai_path_history[i][0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                           self.ai_path_history[i][1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
+                start_point = self.cell_centre(self.ai_path_history[i-1])
+                end_point = self.cell_centre(self.ai_path_history[i])
                 pygame.draw.line(game_window, self.AI_PATH_COLOR, start_point, end_point, 4)
         
         for position in self.player_position_markers:
-            marker_position = (position[0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                             position[1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
+            marker_position = self.cell_centre(position)
             pygame.draw.circle(game_window, BLUE, marker_position, 4)
         
         for position in self.ai_position_markers:
-            marker_position = (position[0]*GRID_CELL_SIZE+GRID_CELL_SIZE//2,
-                             position[1]*GRID_CELL_SIZE+GRID_CELL_SIZE//2)
+            marker_position = self.cell_centre(position)
             pygame.draw.circle(game_window, self.AI_MARKER_COLOR, marker_position, 4)
         
         if self.is_animating and self.is_player_turn:
@@ -666,8 +995,7 @@ class Game:
         else:
             x, y = self.player_x, self.player_y
         
-        player_rect = pygame.Rect(x * GRID_CELL_SIZE, y * GRID_CELL_SIZE,
-                                GRID_CELL_SIZE, GRID_CELL_SIZE)
+        player_rect = self.cell_rect(x, y)
         pygame.draw.rect(game_window, RED, player_rect)
         
         if self.is_animating and not self.is_player_turn:
@@ -677,13 +1005,17 @@ class Game:
         else:
             x, y = self.ai_x, self.ai_y
         
-        ai_rect = pygame.Rect(x * GRID_CELL_SIZE, y * GRID_CELL_SIZE,
-                            GRID_CELL_SIZE, GRID_CELL_SIZE)
+        ai_rect = self.cell_rect(x, y)
         pygame.draw.rect(game_window, self.AI_COLOR, ai_rect)
         
-        if self.show_recalculating_message or self.is_recalculating_path:
+        if self.plan_future is not None and not self.ai_plan:
+            self.draw_planning_progress()
+        elif self.show_recalculating_message or self.is_recalculating_path:
             font = pygame.font.Font(None, 36)
-            text = font.render("AI Recalculating Path to Avoid Player!", True, (255, 0, 0))
+            message = "AI Recalculating Path to Avoid Player!"
+            if self.plan_future is not None:
+                message += f" ({self.plan_progress.get('expanded', 0)} states searched)"
+            text = font.render(message, True, (255, 0, 0))
             text_rect = text.get_rect(center=(WINDOW_WIDTH//2, 30))
             bg_rect = text_rect.copy()
             bg_rect.inflate_ip(20, 10)
@@ -712,19 +1044,7 @@ class Game:
                 self.blocked_message_timer = 0
         
         if self.is_player_turn and not self.is_animating and self.game_running:
-            has_collision_moves = False
-            for dvx in (-1, 0, 1):
-                for dvy in (-1, 0, 1):
-                    new_vx = self.player_vx + dvx
-                    new_vy = self.player_vy + dvy
-                    new_x = self.player_x + new_vx
-                    new_y = self.player_y + new_vy
-                    
-                    if 0 <= new_x < GRID_COLUMNS and 0 <= new_y < GRID_ROWS:
-                        valid, _ = self.is_move_valid(self.player_x, self.player_y, new_x, new_y)
-                        if valid and self.would_collide_with_ai(self.player_x, self.player_y, new_x, new_y):
-                            has_collision_moves = True
-                            break
+            has_collision_moves = any(move[5] for move in self.legal_moves(True))
             
             if has_collision_moves:
                 font = pygame.font.Font(None, 28)
@@ -772,47 +1092,58 @@ class Game:
         
         pygame.display.flip()
 
+    def draw_planning_progress(self):
+        overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 160))
+        game_window.blit(overlay, (0, 0))
+        
+        font = pygame.font.Font(None, 48)
+        text = font.render(self.plan_progress.get('stage', ""), True, WHITE)
+        text_rect = text.get_rect(center=(WINDOW_WIDTH/2, WINDOW_HEIGHT/2 - 20))
+        game_window.blit(text, text_rect)
+        
+        font = pygame.font.Font(None, 28)
+        dots = "." * (pygame.time.get_ticks() // 300 % 4)
+        text = font.render(f"{self.plan_progress.get('expanded', 0)} states searched{dots}", True, LIGHT_GRAY)
+        text_rect = text.get_rect(center=(WINDOW_WIDTH/2, WINDOW_HEIGHT/2 + 25))
+        game_window.blit(text, text_rect)
+
     def is_player_on_ai_path(self):
         if not self.ai_path or self.ai_path_index >= len(self.ai_path) - 1:
             return False
             
+        obstacles = self.car_obstacles(False)
         current_pos = self.ai_path[self.ai_path_index]
         next_pos = self.ai_path[self.ai_path_index + 1]
         
-        path_points = self.bresenham_line(current_pos[0], current_pos[1], next_pos[0], next_pos[1])
-        
-        for x, y in path_points:
-            if self.player_x == x and self.player_y == y:
-                return True
+        if obstacles.blocks(current_pos[0], current_pos[1], next_pos[0], next_pos[1]):
+            return True
             
         check_ahead = min(3, len(self.ai_path) - self.ai_path_index - 1)
         for i in range(1, check_ahead):
             next_pos = self.ai_path[self.ai_path_index + i]
             prev_pos = self.ai_path[self.ai_path_index + i - 1]
-            path_points = self.bresenham_line(prev_pos[0], prev_pos[1], next_pos[0], next_pos[1])
-            for x, y in path_points:
-                if self.player_x == x and self.player_y == y:
-                    return True
+            if obstacles.blocks(prev_pos[0], prev_pos[1], next_pos[0], next_pos[1]):
+                return True
                     
         return False
         
-    def would_collide_with_ai(self, start_x, start_y, end_x, end_y):
-        if end_x == self.ai_x and end_y == self.ai_y:
-            return True
-            
-        path_points = self.bresenham_line(start_x, start_y, end_x, end_y)
-        for x, y in path_points:
-            if x == self.ai_x and y == self.ai_y:
-                return True
-                
-        return False
-
-    def has_valid_moves_considering_opponent(self, is_player):
-        current_x = self.player_x if is_player else self.ai_x
-        current_y = self.player_y if is_player else self.ai_y
-        current_vx = self.player_vx if is_player else self.ai_vx
-        current_vy = self.player_vy if is_player else self.ai_vy
+    def legal_moves(self, is_player):
+        # The car's on-track moves this turn as (new_x, new_y, new_vx, new_vy, crossed, collides),
+        # where collides means the move's line passes through another car. Worked out once per
+        # turn and shared by the move hints, clicks and blocked turn checks, which otherwise trace
+        # the same lines every frame. Any change of either car's state is a new turn.
+        if is_player:
+            key = (self.player_x, self.player_y, self.player_vx, self.player_vy, self.ai_x, self.ai_y)
+        else:
+            key = (self.ai_x, self.ai_y, self.ai_vx, self.ai_vy, self.player_x, self.player_y)
+        cached = self.legal_move_cache[is_player]
+        if cached is not None and cached[0] == key and cached[1] is self.track:
+            return cached[2]
         
+        current_x, current_y, current_vx, current_vy, _, _ = key
+        obstacles = self.car_obstacles(is_player)
+        moves = []
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
                 new_vx = current_vx + dvx
@@ -820,26 +1151,26 @@ class Game:
                 new_x = current_x + new_vx
                 new_y = current_y + new_vy
                 
-                if 0 <= new_x < GRID_COLUMNS and 0 <= new_y < GRID_ROWS:
-                    valid, _ = self.is_move_valid(current_x, current_y, new_x, new_y)
+                if 0 <= new_x < self.grid_columns and 0 <= new_y < self.grid_rows:
+                    valid, crossed = self.is_move_valid(current_x, current_y, new_x, new_y)
                     if valid:
-                        if is_player:
-                            if not self.would_collide_with_ai(current_x, current_y, new_x, new_y):
-                                return True
-                        else:
-                            if not (new_x == self.player_x and new_y == self.player_y) and \
-                               not any(p == (self.player_x, self.player_y) for p in self.bresenham_line(current_x, current_y, new_x, new_y)):
-                                return True
-        return False
+                        collides = obstacles.blocks(current_x, current_y, new_x, new_y)
+                        moves.append((new_x, new_y, new_vx, new_vy, crossed, collides))
+        self.legal_move_cache[is_player] = (key, self.track, moves)
+        return moves
+
+    def has_valid_moves_considering_opponent(self, is_player):
+        return any(not move[5] for move in self.legal_moves(is_player))
 
 def get_available_tracks():
     tracks = []
     for file in os.listdir():
-        if file.endswith('.json'):
+        if is_track_file(file):
             tracks.append(file)
     return tracks
 
-def select_track():
+def select_track(app=None):
+    open_window(app)
     tracks = get_available_tracks()
     if not tracks:
         print("No track files found!")
@@ -973,10 +1304,10 @@ def select_track():
     
     return None
 
-def main():
-    game = Game()
+def main(app=None):
+    game = Game(app)
     
-    result = select_track()
+    result = select_track(app)
     if not result:
         return
     
@@ -1004,6 +1335,7 @@ def main():
         game.draw()
         clock.tick(60)
     
+    game.stop_planning()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,131 @@
+import heapq
+import math
+import time
+
+from packedState import reconstruct_states
+
+# Inflation of the heuristic for each successive search. A search with weight w returns a plan
+# at most w times longer than the optimal one, and the last search is exact.
+DEFAULT_WEIGHTS = (3.0, 2.0, 1.5, 1.25, 1.0)
+
+# Expansions between checks of the cancel event and the first plan deadline
+CHECK_INTERVAL = 1024
+
+
+class AnytimePlanner:
+    # Anytime Repairing A* (ARA*). Weighted A* searches with decreasing weights that share their
+    # costs and parents, so each search only revisits the states whose cost the one before it
+    # improved. States improved after being expanded wait in `incons` for the next search. With
+    # weight 1 they are reopened straight away instead, so the last plan is optimal even when the
+    # heuristic is admissible but not consistent.
+    def __init__(self, successors, estimate, is_goal, weights=DEFAULT_WEIGHTS):
+        self.successors = successors
+        self.estimate = estimate
+        self.is_goal = is_goal
+        self.weights = weights
+        self.expanded = 0
+
+    def plans(self, start_state, first_plan_time=None, progress=None, cancel=None):
+        # Yields (plan, bound) each time a search finds a shorter plan, and after the last search,
+        # where the plan is at most bound times the optimal length. If the first search has not
+        # found a plan after first_plan_time seconds its weight is doubled, and doubled again every
+        # first_plan_time after that, so the first plan comes quickly however large the track.
+        self.cost_so_far = {start_state: 0}
+        self.parents = {}
+        self.estimates = {}
+        self.goal = None
+        self.goal_cost = math.inf
+        self.incons = set()
+        self.closed = set()
+        self.open_list = []
+        self.progress = progress
+        self.cancel = cancel
+        self.deadline = None if first_plan_time is None else time.perf_counter() + first_plan_time
+        self.first_plan_time = first_plan_time
+
+        weight = self.weights[0]
+        self.open_list.append((self.estimated(start_state) * weight, 0, start_state))
+        for search, weight in enumerate(self.weights):
+            if search > 0:
+                self.rekey(weight, self.incons)
+                self.incons = set()
+                self.closed = set()
+            found = self.goal_cost
+            weight = self.improve_plan(weight)
+            if weight is None:
+                return
+            # The last search always reports, so callers know the plan is now optimal
+            if self.goal_cost < found or (search == len(self.weights) - 1 and self.goal is not None):
+                yield reconstruct_states(self.parents, self.goal), self.bound()
+            if self.goal is None:
+                return
+
+    def estimated(self, state):
+        estimate = self.estimates.get(state)
+        if estimate is None:
+            estimate = self.estimates[state] = self.estimate(state)
+        return estimate
+
+    def rekey(self, weight, extra=()):
+        # Rebuilds the open list with a new weight, adding the states in extra
+        states = {state for _, negative_cost, state in self.open_list if -negative_cost == self.cost_so_far[state]}
+        states.update(extra)
+        self.open_list = [(self.cost_so_far[state] + weight * self.estimated(state), -self.cost_so_far[state], state)
+                          for state in states]
+        heapq.heapify(self.open_list)
+
+    def bound(self):
+        # Plan length over the lowest lower bound on the optimal left among the states still open
+        # or in incons. Heap entries for states since expanded or improved are skipped.
+        lower = self.goal_cost
+        open_states = {state for _, negative_cost, state in self.open_list
+                       if -negative_cost == self.cost_so_far[state] and state not in self.closed}
+        for state in self.incons | open_states:
+            lower = min(lower, self.cost_so_far[state] + self.estimated(state))
+        return self.goal_cost / lower if lower > 0 else 1.0
+
+    def improve_plan(self, weight):
+        # One weighted search, until no open state could lead to a shorter plan. Returns the weight
+        # it finished with, raised if the first plan was late, or None if it was cancelled.
+        open_list = self.open_list
+        cost_so_far = self.cost_so_far
+        closed = self.closed
+        reopen = weight <= 1
+
+        while open_list and open_list[0][0] < self.goal_cost:
+            _, negative_cost, state = heapq.heappop(open_list)
+            cost = -negative_cost
+            if cost > cost_so_far[state] or state in closed:
+                continue
+            closed.add(state)
+
+            self.expanded += 1
+            if not self.expanded % CHECK_INTERVAL:
+                if self.progress is not None:
+                    self.progress['expanded'] = self.expanded
+                if self.cancel is not None and self.cancel.is_set():
+                    return None
+                if self.goal is None and self.deadline is not None and time.perf_counter() > self.deadline:
+                    weight *= 2
+                    self.deadline = time.perf_counter() + self.first_plan_time
+                    self.rekey(weight)
+                    open_list = self.open_list
+
+            new_cost = cost + 1
+            for new_state in self.successors(state):
+                if new_cost >= cost_so_far.get(new_state, math.inf):
+                    continue
+                cost_so_far[new_state] = new_cost
+                self.parents[new_state] = state
+                if self.is_goal(new_state):
+                    if new_cost < self.goal_cost:
+                        self.goal = new_state
+                        self.goal_cost = new_cost
+                elif new_state not in closed:
+                    heapq.heappush(open_list, (new_cost + weight * self.estimated(new_state), -new_cost, new_state))
+                elif reopen:
+                    closed.discard(new_state)
+                    heapq.heappush(open_list, (new_cost + weight * self.estimated(new_state), -new_cost, new_state))
+                else:
+                    self.incons.add(new_state)
+        return weight
@@ -0,0 +1,38 @@
+# The pygame window shared by the menu and every game mode. pygame and the window are only set
+# up the first time a mode asks for them, so the search modules can be imported without a display.
+
+import pygame
+
+WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 720
+
+
+class AppContext:
+    def __init__(self, width=WINDOW_WIDTH, height=WINDOW_HEIGHT):
+        self.width = width
+        self.height = height
+        self.window = None
+        self.clock = None
+
+    def open_window(self, caption):
+        if self.window is None:
+            pygame.init()
+            self.window = pygame.display.set_mode((self.width, self.height))
+            self.clock = pygame.time.Clock()
+        pygame.display.set_caption(caption)
+        return self.window
+
+    def close(self):
+        self.window = None
+        self.clock = None
+        pygame.quit()
+
+
+app_context = None
+
+
+def get_app_context():
+    # The context every mode shares when it is run without one
+    global app_context
+    if app_context is None:
+        app_context = AppContext()
+    return app_context
@@ -0,0 +1,567 @@
+# Headless benchmark runner for the heuristic and data structure pathfinders.
+#
+# Usage:
+#   python benchmark.py loop.json long.json --heuristics "BFS Distance Field" heuristic5 \
+#       --algorithms "Heap-based A*" --laps 1 --trials 3 --output results.csv
+#
+# For numbers to tune on, warm up and repeat, then compare against an earlier .json output:
+#   python benchmark.py loop.json --algorithms all --warmup 2 --trials 20 --output after.json \
+#       --baseline before.json
+
+import argparse
+import csv
+import gc
+import json
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from searchStats import STAT_FIELDS, BudgetExceeded, search_budget
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where memory limits are skipped
+    resource = None
+
+# Counted on every trial, the timings come from a separate run
+COUNTER_FIELDS = [field for field in STAT_FIELDS if not field.endswith('_time')]
+TIMING_FIELDS = [field for field in STAT_FIELDS if field.endswith('_time')]
+
+# Two sided 95% critical values of Student's t by degrees of freedom. Between entries the
+# smaller df is used, which errs towards wider intervals.
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+        18: 2.101, 19: 2.093, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+Z_95 = 1.960
+
+
+def t_critical(df):
+    if df >= 1000:
+        return Z_95
+    return T_95[max(key for key in T_95 if key <= max(df, 1))]
+
+
+def summarise_times(times):
+    # Median, 95th percentile, standard deviation and a 95% confidence interval for the mean
+    times = sorted(t for t in times if t is not None)
+    if not times:
+        return None
+    mean = statistics.fmean(times)
+    summary = {
+        "runs": len(times),
+        "mean": mean,
+        "median": statistics.median(times),
+        "p95": times[0] if len(times) == 1 else statistics.quantiles(times, n=20, method='inclusive')[18],
+        "stdev": None,
+        "ci95_low": None,
+        "ci95_high": None
+    }
+    if len(times) > 1:
+        stdev = statistics.stdev(times)
+        margin = t_critical(len(times) - 1) * stdev / math.sqrt(len(times))
+        summary.update(stdev=stdev, ci95_low=mean - margin, ci95_high=mean + margin)
+    return summary
+
+
+def is_regression(current, baseline, threshold):
+    # Welch's t-test: slower by more than threshold and beyond the 95% critical value.
+    # Returns (slowdown, t) or None when it is not a significant slowdown.
+    if len(current) < 2 or len(baseline) < 2:
+        return None
+    current_mean = statistics.fmean(current)
+    baseline_mean = statistics.fmean(baseline)
+    if current_mean <= baseline_mean * (1 + threshold):
+        return None
+    current_error = statistics.variance(current) / len(current)
+    baseline_error = statistics.variance(baseline) / len(baseline)
+    error = current_error + baseline_error
+    if error == 0:
+        return current_mean / baseline_mean - 1, math.inf
+    t = (current_mean - baseline_mean) / math.sqrt(error)
+    df = error ** 2 / (current_error ** 2 / (len(current) - 1) + baseline_error ** 2 / (len(baseline) - 1))
+    if t <= t_critical(int(df)):
+        return None
+    return current_mean / baseline_mean - 1, t
+
+
+def timed_run(pathfinder, start_x, start_y, laps, isolate_gc=True, time_limit=None, node_limit=None):
+    # (seconds, moves, stats, error) for one run, with no time or moves if no path was found and
+    # the reason in error if the search ran out of budget
+    stats = {}
+    # Collect before the run and keep the collector off during it, so one trial's garbage is
+    # never collected on another's time
+    if isolate_gc:
+        gc.collect()
+        gc.disable()
+    try:
+        budget = search_budget(time_limit, node_limit)
+        start_time = time.perf_counter_ns()
+        path = pathfinder(start_x, start_y, laps, stats=stats, budget=budget)
+        duration = (time.perf_counter_ns() - start_time) / 1e9
+    finally:
+        if isolate_gc:
+            gc.enable()
+    if isinstance(path, BudgetExceeded):
+        return None, None, stats, path.reason
+    if not path:
+        return None, None, stats, None
+    return duration, len(path) - 1, stats, None
+
+
+def timing_run(pathfinder, start_x, start_y, laps, time_limit=None, node_limit=None):
+    # Timing every validation and queue operation slows the search, so it gets its own run
+    stats = {'timing': True}
+    pathfinder(start_x, start_y, laps, stats=stats, budget=search_budget(time_limit, node_limit))
+    return {field: stats[field] for field in TIMING_FIELDS if field in stats}
+
+
+def memory_run(pathfinder, start_x, start_y, laps, time_limit=None, node_limit=None):
+    # Traced separately so tracemalloc overhead stays out of the timings
+    tracemalloc.start()
+    pathfinder(start_x, start_y, laps, budget=search_budget(time_limit, node_limit))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def aggregate_trials(times, moves, trial_stats, timing_stats=None, peak_memory=None, errors=None, timing_error=None,
+                     memory_error=None):
+    num_trials = len(times)
+    successes = sum(1 for t in times if t is not None)
+    if successes > 0:
+        avg_time = sum(t for t in times if t is not None) / successes
+        avg_moves = sum(m for m in moves if m is not None) / successes
+        success_rate = (successes / num_trials) * 100
+    else:
+        avg_time = float('inf')
+        avg_moves = float('inf')
+        success_rate = 0
+
+    results = {
+        "avg_time": avg_time,
+        "avg_moves": avg_moves,
+        "success_rate": success_rate,
+        "raw_times": times,
+        "raw_moves": moves,
+        "raw_stats": trial_stats,
+        "avg_stats": {},
+        "time_summary": summarise_times(times),
+        "errors": errors or [None] * num_trials,
+        "skipped": next((stats['skipped'] for stats in trial_stats if 'skipped' in stats), None),
+        "timing_error": timing_error,
+        "memory_error": memory_error
+    }
+    for field in COUNTER_FIELDS:
+        counted = [stats[field] for stats in trial_stats if field in stats]
+        if counted:
+            results["avg_stats"][field] = sum(counted) / len(counted)
+    if timing_stats:
+        results["avg_stats"].update(timing_stats)
+    if peak_memory is not None:
+        results["peak_memory"] = peak_memory
+    return results
+
+
+def run_trials(pathfinder, start_x, start_y, laps, num_trials, measure_memory=False, measure_timing=False,
+               warmup=0, isolate_gc=True, time_limit=None, node_limit=None):
+    # Every run is given its own time_limit seconds and node_limit expansions. Once a trial runs
+    # out, later runs would too, so the remaining trials are recorded as failing for the same reason.
+    limits = (time_limit, node_limit)
+    # Untimed runs first, so imports, the move table and caches are ready for the timed ones
+    for run in range(warmup):
+        if isinstance(pathfinder(start_x, start_y, laps, budget=search_budget(*limits)), BudgetExceeded):
+            break
+
+    times = []
+    moves = []
+    trial_stats = []
+    errors = []
+    for trial in range(num_trials):
+        if errors and errors[-1] is not None:
+            duration, move_count, stats, error = None, None, {}, errors[-1]
+        else:
+            duration, move_count, stats, error = timed_run(pathfinder, start_x, start_y, laps, isolate_gc, *limits)
+        times.append(duration)
+        moves.append(move_count)
+        trial_stats.append(stats)
+        errors.append(error)
+
+    over_budget = any(errors)
+    timing_stats = timing_run(pathfinder, start_x, start_y, laps, *limits) \
+        if measure_timing and not over_budget else None
+    peak_memory = memory_run(pathfinder, start_x, start_y, laps, *limits) \
+        if measure_memory and not over_budget else None
+    return aggregate_trials(times, moves, trial_stats, timing_stats, peak_memory, errors)
+
+
+def resolve_names(requested, available):
+    if requested is None:
+        return list(available.items())
+    by_function = {func.__name__: (name, func) for name, func in available.items()}
+    by_lower_name = {name.lower(): (name, func) for name, func in available.items()}
+    selected = []
+    for item in requested:
+        if item.lower() == 'all':
+            selected.extend(available.items())
+        elif item in by_function:
+            selected.append(by_function[item])
+        elif item.lower() in by_lower_name:
+            selected.append(by_lower_name[item.lower()])
+        else:
+            raise SystemExit(f"Unknown name '{item}'. Choose from: {', '.join(available)}")
+    return selected
+
+
+def load_pathfinders(track_filename, heuristics, algorithms, laps):
+    # (kind, name, pathfinder, start_x, start_y) for every pathfinder, with the track loaded
+    import functools
+    import heuristicTesting
+    import dataStructureTesting
+
+    pathfinders = []
+    if heuristics:
+        heuristicTesting.load_track(track_filename)
+        heuristicTesting.required_laps = laps
+        start_x, start_y = heuristicTesting.find_start_positions()[0]
+        for name, heuristic_func in heuristics:
+            pathfinder = functools.partial(heuristicTesting.compute_optimal_path_with_heuristic,
+                                           heuristic_func=heuristic_func)
+            pathfinders.append(('heuristic', name, pathfinder, start_x, start_y))
+    if algorithms:
+        dataStructureTesting.load_track(track_filename)
+        dataStructureTesting.required_laps = laps
+        start_x, start_y = dataStructureTesting.find_start_positions()[0]
+        for name, algo_func in algorithms:
+            pathfinders.append(('data_structure', name, algo_func, start_x, start_y))
+    return pathfinders
+
+
+def available_workers():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def run_job(job):
+    # One trial, timing run or memory run of one pathfinder, loading its track first
+    import heuristicTesting
+    import dataStructureTesting
+
+    track_filename, kind, name, laps, run, warmup, isolate_gc, time_limit, node_limit = job
+    if kind == 'heuristic':
+        pathfinders = load_pathfinders(track_filename, [(name, heuristicTesting.HEURISTICS[name])], [], laps)
+    else:
+        pathfinders = load_pathfinders(track_filename, [], [(name, dataStructureTesting.ALGORITHMS[name])], laps)
+    _, _, pathfinder, start_x, start_y = pathfinders[0]
+
+    if run == 'timing':
+        return timing_run(pathfinder, start_x, start_y, laps, time_limit, node_limit)
+    if run == 'memory':
+        return memory_run(pathfinder, start_x, start_y, laps, time_limit, node_limit)
+    for warmup_run in range(warmup):
+        pathfinder(start_x, start_y, laps, budget=search_budget(time_limit, node_limit))
+    return timed_run(pathfinder, start_x, start_y, laps, isolate_gc, time_limit, node_limit)
+
+
+def job_process(job, connection, memory_limit):
+    # Sends back (error, result). The pathfinder modules print as they load, which would
+    # interleave across workers, so their output is dropped.
+    sys.stdout = open(os.devnull, 'w')
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    try:
+        outcome = (None, run_job(job))
+    except MemoryError:
+        outcome = ("memory limit", None)
+    except Exception as error:
+        outcome = (repr(error), None)
+    connection.send(outcome)
+    connection.close()
+
+
+def run_jobs(jobs, workers, timeout=None, memory_limit=None):
+    # Runs every job in a process of its own, at most `workers` at once, and returns each job's
+    # (error, result) in order. A process is used per job rather than a pool so that a job past
+    # its timeout can be killed without losing the others.
+    context = multiprocessing.get_context('spawn')
+    outcomes = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    pending.reverse()
+    running = {}
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, job = pending.pop()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=job_process, args=(job, sender, memory_limit), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = (index, process, time.monotonic())
+
+        for receiver in multiprocessing.connection.wait(list(running), timeout=0.1):
+            index, process, _ = running.pop(receiver)
+            try:
+                outcomes[index] = receiver.recv()
+            except EOFError:
+                # Killed without reporting back, for instance by the operating system running out of memory
+                process.join()
+                outcomes[index] = (f"worker exited with code {process.exitcode}", None)
+            receiver.close()
+            process.join()
+
+        if timeout is not None:
+            now = time.monotonic()
+            for receiver, (index, process, started) in list(running.items()):
+                if now - started > timeout:
+                    process.kill()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    outcomes[index] = ("timeout", None)
+    return outcomes
+
+
+def run_matrix(tracks, heuristics, algorithms, laps, num_trials, workers=1, timeout=None, memory_limit=None,
+               warmup=0, isolate_gc=True, measure_memory=False, measure_timing=False, time_limit=None,
+               node_limit=None):
+    # run_trials for every pathfinder on every track, keyed by (track, kind, name). With one worker
+    # and no limits everything runs here. Otherwise every trial, timing run and memory run is a job
+    # of its own, fanned out across worker processes, and a job that times out or runs out of
+    # memory counts as a failed trial with the reason in the results' errors. time_limit and
+    # node_limit are budgets the searches check themselves, so they need no extra process.
+    results = {}
+    if workers <= 1 and timeout is None and memory_limit is None:
+        for track_filename in tracks:
+            for kind, name, pathfinder, start_x, start_y in load_pathfinders(track_filename, heuristics,
+                                                                             algorithms, laps):
+                print(f"{track_filename}: {name}...", file=sys.stderr)
+                results[(track_filename, kind, name)] = run_trials(pathfinder, start_x, start_y, laps, num_trials,
+                                                                   measure_memory, measure_timing, warmup,
+                                                                   isolate_gc, time_limit, node_limit)
+        return results
+
+    if memory_limit and resource is None:
+        print("Memory limits need the resource module, which this platform does not have", file=sys.stderr)
+    runs = ['trial'] * num_trials + (['timing'] if measure_timing else []) + (['memory'] if measure_memory else [])
+    jobs = []
+    for track_filename in tracks:
+        names = [('heuristic', name) for name, _ in heuristics] + [('data_structure', name) for name, _ in algorithms]
+        for kind, name in names:
+            jobs.extend((track_filename, kind, name, laps, run, warmup, isolate_gc, time_limit, node_limit)
+                        for run in runs)
+    print(f"Running {len(jobs)} jobs across {workers} processes...", file=sys.stderr)
+
+    grouped = {}
+    for job, outcome in zip(jobs, run_jobs(jobs, workers, timeout, memory_limit)):
+        grouped.setdefault(job[:3], []).append((job[4],) + outcome)
+    for key, outcomes in grouped.items():
+        times = []
+        moves = []
+        trial_stats = []
+        errors = []
+        timing_stats = None
+        peak_memory = None
+        timing_error = None
+        memory_error = None
+        for run, error, result in outcomes:
+            if run == 'trial':
+                duration, move_count, stats, budget_error = result if error is None else (None, None, {}, None)
+                error = error or budget_error
+                times.append(duration)
+                moves.append(move_count)
+                trial_stats.append(stats)
+                errors.append(error)
+            elif run == 'timing':
+                timing_stats = result
+                timing_error = error
+            else:
+                peak_memory = result
+                memory_error = error
+        results[key] = aggregate_trials(times, moves, trial_stats, timing_stats, peak_memory, errors, timing_error,
+                                        memory_error)
+    return results
+
+
+def result_rows(track_filename, kind, name, laps, results):
+    rows = []
+    for trial in range(len(results["raw_times"])):
+        row = {
+            "track": track_filename,
+            "kind": kind,
+            "name": name,
+            "laps": laps,
+            "trial": trial + 1,
+            "success": results["raw_moves"][trial] is not None,
+            "time": results["raw_times"][trial],
+            "moves": results["raw_moves"][trial]
+        }
+        for field in COUNTER_FIELDS:
+            row[field] = results["raw_stats"][trial].get(field)
+        for field in TIMING_FIELDS:
+            row[field] = results["avg_stats"].get(field)
+        row["peak_memory"] = results.get("peak_memory")
+        row["error"] = results["errors"][trial]
+        row["skipped"] = results["skipped"]
+        row["timing_error"] = results["timing_error"]
+        row["memory_error"] = results["memory_error"]
+        rows.append(row)
+    return rows
+
+
+def result_summary(track_filename, kind, name, laps, results):
+    return dict({"track": track_filename, "kind": kind, "name": name, "laps": laps,
+                 "success_rate": results["success_rate"], "skipped": results["skipped"],
+                 "timing_error": results["timing_error"], "memory_error": results["memory_error"]},
+                **(results["time_summary"] or {}))
+
+
+def result_key(result):
+    return result["track"], result["kind"], result["name"], result["laps"]
+
+
+def times_by_key(rows):
+    times = {}
+    for row in rows:
+        if row["time"] is not None:
+            times.setdefault(result_key(row), []).append(row["time"])
+    return times
+
+
+def compare_to_baseline(rows, baseline_filename, threshold):
+    # Regressions against the trials of an earlier .json output, as (key, slowdown, t)
+    with open(baseline_filename) as file:
+        baseline = times_by_key(json.load(file)["results"])
+    regressions = []
+    for key, times in times_by_key(rows).items():
+        if key in baseline:
+            regression = is_regression(times, baseline[key], threshold)
+            if regression is not None:
+                regressions.append((key,) + regression)
+    return regressions
+
+
+def print_summaries(summaries):
+    # Track and name columns fit their longest entry, so long track paths don't run into the name
+    track_width = max([len("track")] + [len(summary['track']) for summary in summaries])
+    name_width = max([len("name")] + [len(summary['name']) for summary in summaries])
+    print(f"{'track':<{track_width}}  {'name':<{name_width}}  {'median ms':>11}{'p95 ms':>11}{'stdev ms':>11}"
+          f"{'95% CI ms':>22}", file=sys.stderr)
+    for summary in summaries:
+        if "median" not in summary:
+            outcome = f"skipped: {summary['skipped']}" if summary.get('skipped') else "no successful runs"
+            print(f"{summary['track']:<{track_width}}  {summary['name']:<{name_width}}  {outcome:>33}",
+                  file=sys.stderr)
+        else:
+            interval = "-" if summary["stdev"] is None else \
+                f"{summary['ci95_low'] * 1000:.2f} - {summary['ci95_high'] * 1000:.2f}"
+            stdev = "-" if summary["stdev"] is None else f"{summary['stdev'] * 1000:.2f}"
+            print(f"{summary['track']:<{track_width}}  {summary['name']:<{name_width}}  "
+                  f"{summary['median'] * 1000:>11.2f}{summary['p95'] * 1000:>11.2f}{stdev:>11}{interval:>22}",
+                  file=sys.stderr)
+        for run in ('timing', 'memory'):
+            if summary.get(f"{run}_error"):
+                print(f"{'':<{track_width}}  {run} run failed: {summary[f'{run}_error']}", file=sys.stderr)
+
+
+def write_results(rows, output, config, summaries=None):
+    if output.endswith('.csv'):
+        with open(output, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0].keys()) if rows else ["track"])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(output, 'w') as file:
+            json.dump({"config": config, "results": rows, "summary": summaries or []}, file, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pathfinding benchmarks without opening a window.")
+    parser.add_argument('tracks', nargs='+', help="Track files (.json or .track) to benchmark")
+    parser.add_argument('--heuristics', nargs='*', default=None,
+                        help="Heuristic names or function names from heuristicTesting ('all' for every one)")
+    parser.add_argument('--algorithms', nargs='*', default=None,
+                        help="Algorithm names or function names from dataStructureTesting ('all' for every one)")
+    parser.add_argument('--laps', type=int, default=1)
+    parser.add_argument('--trials', type=int, default=3)
+    parser.add_argument('--jobs', type=int, default=0,
+                        help="Worker processes, 0 for one per available core and 1 to run everything in this process")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="Seconds before a job, including loading its track, is killed and counted as failed")
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help="Seconds each search may run before it stops itself and is recorded as a timeout")
+    parser.add_argument('--max-nodes', type=int, default=None,
+                        help="Nodes each search may expand before it stops and is recorded as over its node budget")
+    parser.add_argument('--memory-limit', type=int, default=None,
+                        help="Address space limit per job in MB (not on Windows)")
+    parser.add_argument('--warmup', type=int, default=0, help="Untimed runs before each pathfinder's trials")
+    parser.add_argument('--keep-gc', action='store_true',
+                        help="Leave the garbage collector running during timed trials")
+    parser.add_argument('--baseline', default=None,
+                        help="Earlier .json output to compare against, significant slowdowns exit with status 1")
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help="Smallest slowdown, as a fraction, that counts as a regression")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the traced run that records peak memory")
+    parser.add_argument('--no-timing', action='store_true',
+                        help="Skip the run that times move validation and open list operations")
+    parser.add_argument('--output', default='benchmark_results.json', help="Output file, .json or .csv")
+    args = parser.parse_args(argv)
+
+    # The testing modules only open a window when their tests are run from the menu
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import heuristicTesting
+    import dataStructureTesting
+
+    # With neither option given, run everything
+    if args.heuristics is None and args.algorithms is None:
+        args.heuristics = ['all']
+        args.algorithms = ['all']
+    heuristics = resolve_names(args.heuristics, heuristicTesting.HEURISTICS) if args.heuristics else []
+    algorithms = resolve_names(args.algorithms, dataStructureTesting.ALGORITHMS) if args.algorithms else []
+
+    workers = args.jobs or available_workers()
+    memory_limit = args.memory_limit * 1024 * 1024 if args.memory_limit else None
+    all_results = run_matrix(args.tracks, heuristics, algorithms, args.laps, args.trials, workers, args.timeout,
+                             memory_limit, args.warmup, not args.keep_gc, not args.no_memory, not args.no_timing,
+                             args.time_limit, args.max_nodes)
+    rows = []
+    summaries = []
+    for (track_filename, kind, name), results in all_results.items():
+        rows.extend(result_rows(track_filename, kind, name, args.laps, results))
+        summaries.append(result_summary(track_filename, kind, name, args.laps, results))
+
+    config = {
+        "tracks": args.tracks,
+        "heuristics": [name for name, _ in heuristics],
+        "algorithms": [name for name, _ in algorithms],
+        "laps": args.laps,
+        "trials": args.trials,
+        "warmup": args.warmup,
+        "workers": workers,
+        "timeout": args.timeout,
+        "memory_limit_mb": args.memory_limit,
+        "time_limit": args.time_limit,
+        "max_nodes": args.max_nodes,
+        "gc_isolated": not args.keep_gc
+    }
+    write_results(rows, args.output, config, summaries)
+    print_summaries(summaries)
+    print(f"Wrote {len(rows)} results to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        regressions = compare_to_baseline(rows, args.baseline, args.threshold)
+        for (track, _, name, laps), slowdown, t in regressions:
+            print(f"Regression: {name} on {track} ({laps} laps) is {slowdown:.1%} slower than the baseline "
+                  f"(t = {t:.2f})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No significant regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Buckets per move for float heuristics such as straight line distance. Coarser buckets lose
+# the estimate's ordering, and on the repo tracks 16 expands within 1% of a heap.
+FLOAT_RESOLUTION = 16
+
+
+class BucketQueue:
+    # Open list for A* with unit move costs (Dial's algorithm). Priorities are bucketed to whole
+    # steps of 1 / resolution, rounded down so a float heuristic never overestimates more than it
+    # did before. Each bucket keeps one list per g and pops the largest g first, so ties go to the
+    # state furthest along. Push is O(1), and pop is O(1) apart from stepping over emptied buckets
+    # and g slots, which each pointer passes at most once per push below it.
+    def __init__(self, resolution=1):
+        self.resolution = resolution
+        self.buckets = []
+        self.tops = []
+        self.minimum = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, priority, g, item):
+        bucket = int(priority * self.resolution)
+        buckets = self.buckets
+        if bucket >= len(buckets):
+            grow = bucket + 1 - len(buckets)
+            buckets.extend([] for _ in range(grow))
+            self.tops.extend([-1] * grow)
+        by_g = buckets[bucket]
+        if g >= len(by_g):
+            by_g.extend([] for _ in range(g + 1 - len(by_g)))
+        by_g[g].append(item)
+        if g > self.tops[bucket]:
+            self.tops[bucket] = g
+        # An inconsistent heuristic can push below the current minimum
+        if bucket < self.minimum:
+            self.minimum = bucket
+        self.size += 1
+
+    def pop(self):
+        # (bucket, g, item) for the lowest bucket and the largest g in it, IndexError when empty
+        if not self.size:
+            raise IndexError("pop from an empty BucketQueue")
+        buckets = self.buckets
+        tops = self.tops
+        bucket = self.minimum
+        while True:
+            by_g = buckets[bucket]
+            g = tops[bucket]
+            while g >= 0 and not by_g[g]:
+                g -= 1
+            tops[bucket] = g
+            if g >= 0:
+                break
+            bucket += 1
+        self.minimum = bucket
+        self.size -= 1
+        return bucket, g, by_g[g].pop()
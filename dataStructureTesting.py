@@ -1,21 +1,29 @@
 import pygame
 import sys
-import json
-import random
 import heapq
-import time
-from collections import deque
 import os
-
-pygame.init()
+from collections import deque
+from packedState import pack_state, unpack_state, state_lap, state_position, reconstruct_path
+from moveTable import MoveTable, table_fits
+from distanceField import DistanceHeuristic
+from frontierSearch import FrontierSearch
+from lapPlanner import LapPlanner
+from bucketQueue import BucketQueue, FLOAT_RESOLUTION
+from searchStats import (instrument, record_stats, next_budget_check, budget_exceeded, search_skipped, STAT_FIELDS,
+                         STAT_LABELS)
+from trackFormat import is_track_file, TrackFormatError
+from trackEngine import open_track, bresenham_line
+from benchmark import run_matrix, available_workers
+from appContext import get_app_context, WINDOW_WIDTH, WINDOW_HEIGHT
 
 # Screen dimensions
-WIDTH, HEIGHT = 1280, 720
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Racetrack Pathfinder")
+WIDTH, HEIGHT = WINDOW_WIDTH, WINDOW_HEIGHT
+# Set by open_window when the tests are started, importing the module opens nothing
+screen = None
 
 # Grid dimensions
 GRID_SIZE = 20
+# Replaced by the loaded track's own size
 GRID_WIDTH = WIDTH // GRID_SIZE
 GRID_HEIGHT = HEIGHT // GRID_SIZE
 
@@ -46,6 +54,7 @@ TILE_COLORS = {
 }
 
 # Initialize track and game state
+track = None
 track_grid = []
 checkpoint1_group = []
 checkpoint2_group = []
@@ -58,46 +67,24 @@ current_step = 0
 computed_path = []
 moves_made = 0
 required_laps = 1
-
-class State:
-    def __init__(self, x, y, vx, vy, cp1, cp2, lap):
-        self.x = x
-        self.y = y
-        self.vx = vx
-        self.vy = vy
-        self.cp1 = cp1  
-        self.cp2 = cp2  
-        self.lap = lap
-
-    def __lt__(self, other):
-        return False  
+frontier_search = None
+move_table = None
+distance_heuristic = None
 
 def load_track(filename):
     global track_grid, checkpoint1_group, checkpoint2_group, cp1_centroid, cp2_centroid, finish_centroid, start_positions
+    global GRID_WIDTH, GRID_HEIGHT, track
+    global frontier_search, move_table, distance_heuristic
     try:
-        with open(filename, 'r') as f:
-            track_grid = json.load(f)
+        track = open_track(filename)
+        track_grid = track.layout
+        GRID_WIDTH, GRID_HEIGHT = track.columns, track.rows
         print(f"Track loaded from {filename}")
         
-        visited = [[False for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if track_grid[y][x] == TILE_TYPES['checkpoint1'] and not visited[y][x]:
-                    checkpoint1_group = bfs((x, y), TILE_TYPES['checkpoint1'], visited)
-                    break
-            if checkpoint1_group:
-                break
-        
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if track_grid[y][x] == TILE_TYPES['checkpoint2'] and not visited[y][x]:
-                    checkpoint2_group = bfs((x, y), TILE_TYPES['checkpoint2'], visited)
-                    break
-            if checkpoint2_group:
-                break
+        checkpoint1_group = track.checkpoint1_group
+        checkpoint2_group = track.checkpoint2_group
 
-        start_positions = find_start_positions()
+        start_positions = track.start_positions
         
         if not checkpoint1_group or not checkpoint2_group:
             print("Two checkpoint groups required")
@@ -105,76 +92,31 @@ def load_track(filename):
         else:
             print(f"Checkpoint1: {len(checkpoint1_group)} tiles")
             print(f"Checkpoint2: {len(checkpoint2_group)} tiles")
-            cp1_centroid = (sum(x for x, y in checkpoint1_group)/len(checkpoint1_group), 
-                sum(y for x, y in checkpoint1_group)/len(checkpoint1_group))
-            cp2_centroid = (sum(x for x, y in checkpoint2_group)/len(checkpoint2_group), 
-                            sum(y for x, y in checkpoint2_group)/len(checkpoint2_group))
-            finish_centroid = (sum(x for x, y in start_positions) / len(start_positions),
-                                sum(y for x, y in start_positions) / len(start_positions) )
+            cp1_centroid = track.cp1_centroid
+            cp2_centroid = track.cp2_centroid
+            finish_centroid = track.finish_centroid
+            
+            # Tables for the NumPy frontier search, built here so they stay out of its timings.
+            # Its dense state arrays do not scale to large tracks, which only the other searches run on.
+            frontier_search = None
+            move_table = None
+            distance_heuristic = DistanceHeuristic(track_grid, checkpoint1_group, checkpoint2_group, start_positions)
+            if table_fits(track.road_mask.road_cells):
+                move_table = MoveTable(track_grid, checkpoint1_group, checkpoint2_group, TILE_TYPES['start_finish'],
+                                       bresenham_line)
+                frontier_search = FrontierSearch(move_table, distance_heuristic)
 
         
             
     except FileNotFoundError:
         print(f"File {filename} not found.")
         sys.exit()
-
-def bfs(start_pos, tile_type, visited):
-    queue = [start_pos]
-    connected = []
-    while queue:
-        x, y = queue.pop(0)
-        if visited[y][x]:
-            continue
-        visited[y][x] = True
-        if track_grid[y][x] == tile_type:
-            connected.append((x, y))
-            for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
-                nx, ny = x+dx, y+dy
-                if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
-                    if not visited[ny][nx] and track_grid[ny][nx] == tile_type:
-                        queue.append((nx, ny))
-    return connected
+    except TrackFormatError as error:
+        print(error)
+        sys.exit()
 
 def find_start_positions():
-    return [(x, y) for y in range(GRID_HEIGHT) for x in range(GRID_WIDTH)
-            if track_grid[y][x] == TILE_TYPES['start_finish']]
-
-def bresenham_line(x0, y0, x1, y1):
-    points = []
-    dx, dy = abs(x1 - x0), abs(y1 - y0)
-    sx = -1 if x0 > x1 else 1
-    sy = -1 if y0 > y1 else 1
-    err = dx - dy
-    
-    while True:
-        points.append((x0, y0))
-        if x0 == x1 and y0 == y1:
-            break
-        e2 = 2 * err
-        if e2 > -dy:
-            err -= dy
-            x0 += sx
-        if e2 < dx:
-            err += dx
-            y0 += sy
-    return points
-
-def is_move_valid(x0, y0, x1, y1):
-    for x, y in bresenham_line(x0, y0, x1, y1):
-        if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT) or \
-           track_grid[y][x] == TILE_TYPES['out_of_bounds']:
-            return False, []
-    
-    crossed = []
-    for x, y in bresenham_line(x0, y0, x1, y1):
-        tile = track_grid[y][x]
-        if tile == TILE_TYPES['checkpoint1']:
-            crossed.append(('cp1', (x,y)))
-        elif tile == TILE_TYPES['checkpoint2']:
-            crossed.append(('cp2', (x,y)))
-        elif tile == TILE_TYPES['start_finish']:
-            crossed.append(('finish', (x,y)))
-    return True, crossed
+    return track.start_positions
 
 def heuristic1(x, y, target_x, target_y):
     dx = target_x - x
@@ -183,12 +125,13 @@ def heuristic1(x, y, target_x, target_y):
 
 
 def get_target(state):
-    if state.lap > required_laps:
+    _, _, _, _, cp1, cp2, lap = unpack_state(state)
+    if lap > required_laps:
         return None
     
-    if not state.cp1:
+    if not cp1:
         return cp1_centroid  
-    elif not state.cp2:
+    elif not cp2:
         return cp2_centroid  
     else:
         return finish_centroid  
@@ -210,7 +153,7 @@ def render_results(screen, all_results):
     total_height += 90
     
     for _ in all_results:
-        total_height += 150
+        total_height += 225 + 25 * len(STAT_FIELDS)
     
     total_height += 50
     
@@ -223,9 +166,9 @@ def render_results(screen, all_results):
     instructions = text_font.render("Press ESC to return to menu", True, TEXT_COLOR)
     content_surface.blit(instructions, (WIDTH//2 - instructions.get_width()//2, 50))
     
-    headers = ["Algorithm", "Success Rate", "Avg Time (s)", "Avg Moves"]
+    headers = ["Algorithm", "Success Rate", "Avg Time (s)", "Avg Moves", "Expanded", "Peak Open"]
     header_y = 80
-    x_positions = [50, 300, 500, 700]
+    x_positions = [50, 300, 500, 700, 900, 1080]
     for header, x in zip(headers, x_positions):
         header_text = header_font.render(header, True, HEADER_COLOR)
         content_surface.blit(header_text, (x, header_y))
@@ -237,7 +180,8 @@ def render_results(screen, all_results):
         content_surface.blit(algo_text, (50, y))
         
         # Success rate
-        success_text = text_font.render(f"{results['success_rate']:.1f}%", True, TEXT_COLOR)
+        success_text = text_font.render("Skipped" if results.get('skipped') else f"{results['success_rate']:.1f}%",
+                                        True, TEXT_COLOR)
         content_surface.blit(success_text, (300, y))
         
         # Average time
@@ -248,6 +192,11 @@ def render_results(screen, all_results):
         moves_text = text_font.render(f"{results['avg_moves']:.1f}", True, TEXT_COLOR)
         content_surface.blit(moves_text, (700, y))
         
+        for field, x in (('nodes_expanded', 900), ('peak_open', 1080)):
+            value = results['avg_stats'].get(field)
+            count_text = text_font.render("-" if value is None else f"{value:,.0f}", True, TEXT_COLOR)
+            content_surface.blit(count_text, (x, y))
+        
         y += 40
     
     y += 40
@@ -273,6 +222,29 @@ def render_results(screen, all_results):
                 f"Worst Time: {max(successful_times):.3f} seconds"
             ])
         
+        summary = results.get('time_summary')
+        if summary and summary['stdev'] is not None:
+            stats.extend([
+                f"Median Time: {summary['median']:.3f} seconds (95th percentile {summary['p95']:.3f})",
+                f"Standard Deviation: {summary['stdev']:.3f} seconds, "
+                f"95% CI {summary['ci95_low']:.3f} - {summary['ci95_high']:.3f}"
+            ])
+        
+        if results.get('skipped'):
+            stats.append(f"Skipped: {results['skipped']}")
+        errors = sorted(set(error for error in results.get('errors', []) if error))
+        if errors:
+            stats.append(f"Failed Trials: {', '.join(errors)}")
+        for run in ('timing', 'memory'):
+            if results.get(f'{run}_error'):
+                stats.append(f"Failed {run.capitalize()} Run: {results[f'{run}_error']}")
+        
+        for field in STAT_FIELDS:
+            if field in results['avg_stats']:
+                value = results['avg_stats'][field]
+                stats.append(f"{STAT_LABELS[field]}: {value:.3f}" if field.endswith('_time')
+                             else f"{STAT_LABELS[field]}: {value:,.0f}")
+        
         for stat in stats:
             stat_text = text_font.render(stat, True, TEXT_COLOR)
             content_surface.blit(stat_text, (70, y))
@@ -326,7 +298,7 @@ def show_loading_screen(screen, message):
 def get_available_tracks():
     tracks = []
     for file in os.listdir():
-        if file.endswith('.json'):
+        if is_track_file(file):
             tracks.append(file)
     return tracks
 
@@ -409,21 +381,21 @@ def select_track():
     
     return 'BACK'
 
-def test_data_structures():
-    algorithms = {
-        "Heap-based A*": compute_optimal_path_heap,
-        "List-based A*": compute_optimal_path_list,
-        "Queue-based A*": compute_optimal_path_queue,
-        "Stack-based A*": compute_optimal_path_stack,
-        "BST-based A*": compute_optimal_path_bst
-    }
-    
+def open_window(app=None):
+    global screen
+    screen = (app or get_app_context()).open_window("Racetrack Pathfinder")
+    return screen
+
+def test_data_structures(app=None):
+    open_window(app)
     track_filename = select_track()
     if track_filename == 'BACK':
         return
     
     laps = 1
     num_trials = 3
+    # Seconds a trial may search before it is recorded as a timeout, so slow structures cannot hang the menu
+    time_limit = 60
     
     show_loading_screen(screen, "Loading track and initializing tests...")
     
@@ -433,46 +405,13 @@ def test_data_structures():
         print("No start positions found.")
         return
     
-    start_x, start_y = start_positions[0]
-    
-    all_results = {}
+    # Every trial is a job of its own, spread across the available cores
+    workers = available_workers()
+    show_loading_screen(screen, f"Testing {len(ALGORITHMS)} algorithms across {workers} processes...")
     
-    for algo_name, algo_func in algorithms.items():
-        show_loading_screen(screen, f"Testing {algo_name}...")
-        
-        times = []
-        moves = []
-        successes = 0
-        
-        for trial in range(num_trials):
-            start_time = time.time()
-            path = algo_func(start_x, start_y, laps)
-            duration = time.time() - start_time
-            
-            if path:
-                successes += 1
-                times.append(duration)
-                moves.append(len(path) - 1)
-            else:
-                times.append(None)
-                moves.append(None)
-        
-        if successes > 0:
-            avg_time = sum(t for t in times if t is not None) / successes
-            avg_moves = sum(m for m in moves if m is not None) / successes
-            success_rate = (successes / num_trials) * 100
-        else:
-            avg_time = float('inf')
-            avg_moves = float('inf')
-            success_rate = 0
-            
-        all_results[algo_name] = {
-            "avg_time": avg_time,
-            "avg_moves": avg_moves,
-            "success_rate": success_rate,
-            "raw_times": times,
-            "raw_moves": moves
-        }
+    matrix = run_matrix([track_filename], [], list(ALGORITHMS.items()), laps, num_trials, workers,
+                        measure_timing=True, time_limit=time_limit)
+    all_results = {algo_name: results for (_, _, algo_name), results in matrix.items()}
     
     show_loading_screen(screen, "Preparing results display...")
     
@@ -497,79 +436,65 @@ def calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y, he
     
     return new_cost + h_value
 
-def compute_optimal_path_heap(start_x, start_y, laps):
+def compute_optimal_path_heap(start_x, start_y, laps, stats=None, budget=None):
     heap = []
-    initial_state = State(start_x, start_y, 0, 0, False, False, 1)
-    heapq.heappush(heap, (0, initial_state))
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    heapq.heappush(heap, (0, 0, initial_state))
 
     
     
-    visited = {}
+    cost_so_far = {initial_state: 0}
     came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    move_transition, push, pop = instrument(stats, track.transition, heapq.heappush, heapq.heappop)
+    budget_check = next_budget_check(budget, 0)
     
     while heap:
-        cost, current = heapq.heappop(heap)
+        _, cost, current = pop(heap)
         
         # if current lap is higher than total laps then path is found, return the path. 
-        if current.lap > laps:
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
             # Reconstruct path by walking backwards
-            path = []
-            while current in came_from:
-                path.append((current.x, current.y))
-                current = came_from[current]
-            path.append((start_x, start_y))
-            path.reverse()
-            return path
-        
-        #Creates a state key to check if the state has been visited before
-        state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-        # if state has been visited and the cost is less than the current cost then skip the state
-        if state_key in visited and visited[state_key] <= cost:
+            return reconstruct_path(came_from, current)
+        
+        # if a cheaper route to this state was found after it was queued then skip the stale entry
+        if cost > cost_so_far[current]:
+            stale += 1
             continue
-        visited[state_key] = cost
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
         
 
         # try all possible moves
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
-                new_vx = current.vx + dvx
-                new_vy = current.vy + dvy
-                new_x = current.x + new_vx
-                new_y = current.y + new_vy
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
                 # if new position is outside the grid then skip the move
                 if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
                     continue
                 
-                # check if move is valid and get a list of any checkpoints or finish lines that are crossed
-                valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                if not valid:
+                # check the move stays on the road and apply any checkpoints or finish lines it crosses
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
                     continue
-                
-                # Update checkpoint states
-                cp1 = current.cp1
-                cp2 = current.cp2
-                lap = current.lap
-                for c in crossed:
-                    # if cechk points are crossed then update the checkpoint states/
-                    if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                        cp1 = True
-                    elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                        cp2 = True
-                    # if we hit the finish line
-                    elif c[0] == 'finish':
-                        # if both checkpoints are crossed then increment the lap
-                        if cp1 and cp2:
-                            lap += 1
-                            cp1 = False
-                            cp2 = False
-                        # otherwise reset
-                        else:
-                            cp1 = False
-                            cp2 = False
+                cp1, cp2, lap = transition
                 
                 # Create a new state with updated values
-                new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
                 # inceraae the cost by 1 as were making a move.
                 new_cost = cost + 1
 
@@ -579,80 +504,78 @@ def compute_optimal_path_heap(start_x, start_y, laps):
                 else:
                     target_x, target_y = target
                 
-                # Create a new state key for the new move 
-                new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                # if the state hasnt been visited before or the cost is less than the previous cost then add the state to the heap
-                if new_state_key not in visited or new_cost < visited[new_state_key]:
+                # if the state hasnt been reached before or this route is cheaper then add the state to the heap
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
                     priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
-                    heapq.heappush(heap, (priority, new_state))
+                    push(heap, (priority, new_cost, new_state))
+                    pushed += 1
                     # remeber where we came from to get to this new state 
                     came_from[new_state] = current
+        if len(heap) > peak_open:
+            peak_open = len(heap)
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
     return None
 
 
 
-def compute_optimal_path_list(start_x, start_y, laps):
+def compute_optimal_path_list(start_x, start_y, laps, stats=None, budget=None):
     open_list = []
-    initial_state = State(start_x, start_y, 0, 0, False, False, 1)
-    open_list.append((0, initial_state))
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    open_list.append((0, 0, initial_state))
     
-    visited = {}
+    cost_so_far = {initial_state: 0}
     came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
     
-    while open_list:
+    def pop_lowest(open_list):
         min_cost_index = 0
         for i in range(len(open_list)):
             if open_list[i][0] < open_list[min_cost_index][0]:
                 min_cost_index = i
+        return open_list.pop(min_cost_index)
+    
+    move_transition, push, pop = instrument(stats, track.transition, open_list.append, pop_lowest)
+    budget_check = next_budget_check(budget, 0)
+    
+    while open_list:
+        _, cost, current = pop(open_list)
         
-        cost, current = open_list.pop(min_cost_index)
-        
-        if current.lap > laps:
-            path = []
-            while current in came_from:
-                path.append((current.x, current.y))
-                current = came_from[current]
-            path.append((start_x, start_y))
-            path.reverse()
-            return path
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
         
-        state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-        if state_key in visited and visited[state_key] <= cost:
+        if cost > cost_so_far[current]:
+            stale += 1
             continue
-        visited[state_key] = cost
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
         
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
-                new_vx = current.vx + dvx
-                new_vy = current.vy + dvy
-                new_x = current.x + new_vx
-                new_y = current.y + new_vy
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
                 if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
                     continue
                 
-                valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                if not valid:
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
                     continue
+                cp1, cp2, lap = transition
                 
-                cp1 = current.cp1
-                cp2 = current.cp2
-                lap = current.lap
-                for c in crossed:
-                    if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                        cp1 = True
-                    elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                        cp2 = True
-                    elif c[0] == 'finish':
-                        if cp1 and cp2:
-                            lap += 1
-                            cp1 = False
-                            cp2 = False
-                        else:
-                            cp1 = False
-                            cp2 = False
-                
-                new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
                 new_cost = cost + 1
 
                 target = get_target(new_state)
@@ -661,70 +584,67 @@ def compute_optimal_path_list(start_x, start_y, laps):
                 else:
                     target_x, target_y = target
                 
-                new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                if new_state_key not in visited or new_cost < visited[new_state_key]:
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
                     priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
-                    open_list.append((priority, new_state))
+                    push((priority, new_cost, new_state))
+                    pushed += 1
                     came_from[new_state] = current
+        if len(open_list) > peak_open:
+            peak_open = len(open_list)
     
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
     return None
 
 
-def compute_optimal_path_queue(start_x, start_y, laps):
-    queue = deque([(0, State(start_x, start_y, 0, 0, False, False, 1))])
+def compute_optimal_path_queue(start_x, start_y, laps, stats=None, budget=None):
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    queue = deque([(0, 0, initial_state)])
     
-    visited = {}
+    cost_so_far = {initial_state: 0}
     came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    move_transition, push, pop = instrument(stats, track.transition, queue.append, queue.popleft)
+    budget_check = next_budget_check(budget, 0)
     
     while queue:
-        cost, current = queue.popleft()
-        
-        if current.lap > laps:
-            path = []
-            while current in came_from:
-                path.append((current.x, current.y))
-                current = came_from[current]
-            path.append((start_x, start_y))
-            path.reverse()
-            return path
-        
-        state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-        if state_key in visited and visited[state_key] <= cost:
+        _, cost, current = pop()
+        
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
+        
+        if cost > cost_so_far[current]:
+            stale += 1
             continue
-        visited[state_key] = cost
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
         
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
-                new_vx = current.vx + dvx
-                new_vy = current.vy + dvy
-                new_x = current.x + new_vx
-                new_y = current.y + new_vy
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
                 if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
                     continue
                 
-                valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                if not valid:
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
                     continue
+                cp1, cp2, lap = transition
                 
-                cp1 = current.cp1
-                cp2 = current.cp2
-                lap = current.lap
-                for c in crossed:
-                    if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                        cp1 = True
-                    elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                        cp2 = True
-                    elif c[0] == 'finish':
-                        if cp1 and cp2:
-                            lap += 1
-                            cp1 = False
-                            cp2 = False
-                        else:
-                            cp1 = False
-                            cp2 = False
-                
-                new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
                 new_cost = cost + 1
 
                 target = get_target(new_state)
@@ -733,72 +653,74 @@ def compute_optimal_path_queue(start_x, start_y, laps):
                 else:
                     target_x, target_y = target
                 
-                new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                if new_state_key not in visited or new_cost < visited[new_state_key]:
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
                     priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
-                    queue.append((priority, new_state))
+                    push((priority, new_cost, new_state))
+                    pushed += 1
                     came_from[new_state] = current
+        if len(queue) > peak_open:
+            peak_open = len(queue)
     
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
     return None
 
 
-def compute_optimal_path_stack(start_x, start_y, laps):
-    stack = [(0, State(start_x, start_y, 0, 0, False, False, 1))]
+def compute_optimal_path_stack(start_x, start_y, laps, stats=None, budget=None):
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    stack = [(0, 0, initial_state)]
     
-    visited = {}
+    cost_so_far = {initial_state: 0}
     came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    
+    def push_moves(moves):
+        moves.sort(reverse=True)
+        stack.extend(moves)
+    
+    move_transition, push, pop = instrument(stats, track.transition, push_moves, stack.pop)
+    budget_check = next_budget_check(budget, 0)
     
     while stack:
-        cost, current = stack.pop()
-        
-        if current.lap > laps:
-            path = []
-            while current in came_from:
-                path.append((current.x, current.y))
-                current = came_from[current]
-            path.append((start_x, start_y))
-            path.reverse()
-            return path
-        
-        state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-        if state_key in visited and visited[state_key] <= cost:
+        _, cost, current = pop()
+        
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
+        
+        if cost > cost_so_far[current]:
+            stale += 1
             continue
-        visited[state_key] = cost
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
         
         moves = []
         
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
-                new_vx = current.vx + dvx
-                new_vy = current.vy + dvy
-                new_x = current.x + new_vx
-                new_y = current.y + new_vy
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
                 if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
                     continue
                 
-                valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                if not valid:
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
                     continue
+                cp1, cp2, lap = transition
                 
-                cp1 = current.cp1
-                cp2 = current.cp2
-                lap = current.lap
-                for c in crossed:
-                    if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                        cp1 = True
-                    elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                        cp2 = True
-                    elif c[0] == 'finish':
-                        if cp1 and cp2:
-                            lap += 1
-                            cp1 = False
-                            cp2 = False
-                        else:
-                            cp1 = False
-                            cp2 = False
-                
-                new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
                 new_cost = cost + 1
 
                 target = get_target(new_state)
@@ -807,22 +729,26 @@ def compute_optimal_path_stack(start_x, start_y, laps):
                 else:
                     target_x, target_y = target
                 
-                new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                if new_state_key not in visited or new_cost < visited[new_state_key]:
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
                     priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
-                    moves.append((priority, new_state))
+                    moves.append((priority, new_cost, new_state))
                     came_from[new_state] = current
         
-        moves.sort(reverse=True)  
-        stack.extend(moves)
+        push(moves)
+        pushed += len(moves)
+        if len(stack) > peak_open:
+            peak_open = len(stack)
     
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
     return None
 
-def compute_optimal_path_bst(start_x, start_y, laps):
+def compute_optimal_path_bst(start_x, start_y, laps, stats=None, budget=None):
 
     class BSTNode:
-        def __init__(self, priority, state):
+        def __init__(self, priority, cost, state):
             self.priority = priority
+            self.cost = cost
             self.state = state
             self.left = None
             self.right = None
@@ -832,8 +758,8 @@ def compute_optimal_path_bst(start_x, start_y, laps):
             self.root = None
             self.size = 0
         
-        def insert(self, priority, state):
-            new_node = BSTNode(priority, state)
+        def insert(self, priority, cost, state):
+            new_node = BSTNode(priority, cost, state)
             
             if self.root is None:
                 self.root = new_node
@@ -857,13 +783,13 @@ def compute_optimal_path_bst(start_x, start_y, laps):
         
         def pop_min(self):
             if self.root is None:
-                return None, None
+                return None, None, None
             
             if self.root.left is None:
                 min_node = self.root
                 self.root = self.root.right
                 self.size -= 1
-                return min_node.priority, min_node.state
+                return min_node.priority, min_node.cost, min_node.state
             
             parent = self.root
             current = self.root.left
@@ -874,68 +800,130 @@ def compute_optimal_path_bst(start_x, start_y, laps):
             
             parent.left = current.right
             self.size -= 1
-            return current.priority, current.state
+            return current.priority, current.cost, current.state
         
         def is_empty(self):
             return self.root is None
     
     bst = BST()
-    initial_state = State(start_x, start_y, 0, 0, False, False, 1)
-    bst.insert(0, initial_state)
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    bst.insert(0, 0, initial_state)
     
-    visited = {}
+    cost_so_far = {initial_state: 0}
     came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    move_transition, push, pop = instrument(stats, track.transition, bst.insert, bst.pop_min)
+    budget_check = next_budget_check(budget, 0)
     
     while not bst.is_empty():
-        cost, current = bst.pop_min()
-        
-        if current.lap > laps:
-            path = []
-            while current in came_from:
-                path.append((current.x, current.y))
-                current = came_from[current]
-            path.append((start_x, start_y))
-            path.reverse()
-            return path
-        
-        state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-        if state_key in visited and visited[state_key] <= cost:
+        _, cost, current = pop()
+        
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
+        
+        if cost > cost_so_far[current]:
+            stale += 1
             continue
-        visited[state_key] = cost
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
         
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
-                new_vx = current.vx + dvx
-                new_vy = current.vy + dvy
-                new_x = current.x + new_vx
-                new_y = current.y + new_vy
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
                 if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
                     continue
                 
-                valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                if not valid:
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
                     continue
+                cp1, cp2, lap = transition
+                
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_cost = cost + 1
+                
+                target = get_target(new_state)
+                if target is None:
+                    target_x, target_y = finish_centroid
+                else:
+                    target_x, target_y = target
+                
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
+                    priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
+                    push(priority, new_cost, new_state)
+                    pushed += 1
+                    came_from[new_state] = current
+        if bst.size > peak_open:
+            peak_open = bst.size
+    
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+    return None
+
+def compute_optimal_path_bucket(start_x, start_y, laps, stats=None, budget=None):
+    # Dial's algorithm: f is bucketed to 1 / FLOAT_RESOLUTION of a move, largest g first within a bucket, see bucketQueue.py
+    open_list = BucketQueue(FLOAT_RESOLUTION)
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    open_list.push(0, 0, initial_state)
+    
+    cost_so_far = {initial_state: 0}
+    came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    move_transition, push, pop = instrument(stats, track.transition, open_list.push, open_list.pop)
+    budget_check = next_budget_check(budget, 0)
+    
+    while open_list:
+        _, cost, current = pop()
+        
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
+        
+        if cost > cost_so_far[current]:
+            stale += 1
+            continue
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
+        
+        for dvx in (-1, 0, 1):
+            for dvy in (-1, 0, 1):
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
-                cp1 = current.cp1
-                cp2 = current.cp2
-                lap = current.lap
+                if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
+                    continue
                 
-                for c in crossed:
-                    if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                        cp1 = True
-                    elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                        cp2 = True
-                    elif c[0] == 'finish':
-                        if cp1 and cp2:
-                            lap += 1
-                            cp1 = False
-                            cp2 = False
-                        else:
-                            cp1 = False
-                            cp2 = False
+                # check the move stays on the road and apply any checkpoints or finish lines it crosses
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
+                    continue
+                cp1, cp2, lap = transition
                 
-                new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
                 new_cost = cost + 1
                 
                 target = get_target(new_state)
@@ -944,10 +932,43 @@ def compute_optimal_path_bst(start_x, start_y, laps):
                 else:
                     target_x, target_y = target
                 
-                new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                if new_state_key not in visited or new_cost < visited[new_state_key]:
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
                     priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y)
-                    bst.insert(priority, new_state)
+                    push(priority, new_cost, new_state)
+                    pushed += 1
                     came_from[new_state] = current
-    
-    return None
\ No newline at end of file
+        if len(open_list) > peak_open:
+            peak_open = len(open_list)
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+    return None
+
+def compute_optimal_path_numpy(start_x, start_y, laps, stats=None, budget=None):
+    # Expands the whole lowest-f bucket per step as NumPy arrays, see frontierSearch.py
+    if frontier_search is None:
+        return search_skipped("track too large for a move table", stats)
+    return frontier_search.search(start_x, start_y, laps, stats, budget)
+
+def compute_optimal_path_laps(start_x, start_y, laps, stats=None, budget=None):
+    # One breadth first layer per lap, reusing laps whose starting states repeat, see lapPlanner.py.
+    # A new planner per call, so every trial pays for its own layers.
+    if move_table is None:
+        return search_skipped("track too large for a move table", stats)
+    lap_planner = LapPlanner(track, move_table, distance_heuristic)
+    plan = lap_planner.plan(pack_state(start_x, start_y, 0, 0, False, False, 1), laps, budget=budget)
+    if stats is not None:
+        lap_planner.record_stats(stats)
+    if not plan:
+        return plan
+    return [state_position(state) for state in plan]
+
+ALGORITHMS = {
+    "Heap-based A*": compute_optimal_path_heap,
+    "List-based A*": compute_optimal_path_list,
+    "Queue-based A*": compute_optimal_path_queue,
+    "Stack-based A*": compute_optimal_path_stack,
+    "BST-based A*": compute_optimal_path_bst,
+    "Bucket-queue A*": compute_optimal_path_bucket,
+    "NumPy frontier A*": compute_optimal_path_numpy,
+    "Lap-layered search": compute_optimal_path_laps
+}
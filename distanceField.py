@@ -0,0 +1,110 @@
+import math
+from collections import deque
+from functools import lru_cache
+
+from packedState import unpack_state
+
+UNREACHABLE = -1
+
+NEIGHBOUR_OFFSETS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+def distance_field(track_layout, sources, out_of_bounds_tile=0):
+    # 8-connected BFS over drivable tiles. A move of Chebyshev length n traces n+1 adjacent
+    # cells, so these distances never exceed the cells a car has to sweep to get there.
+    rows = len(track_layout)
+    columns = len(track_layout[0])
+    distances = [[UNREACHABLE] * columns for _ in range(rows)]
+    queue = deque()
+    for x, y in sources:
+        if distances[y][x] == UNREACHABLE:
+            distances[y][x] = 0
+            queue.append((x, y))
+
+    while queue:
+        x, y = queue.popleft()
+        next_distance = distances[y][x] + 1
+        for dx, dy in NEIGHBOUR_OFFSETS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < columns and 0 <= ny < rows and distances[ny][nx] == UNREACHABLE \
+                    and track_layout[ny][nx] != out_of_bounds_tile:
+                distances[ny][nx] = next_distance
+                queue.append((nx, ny))
+    return distances
+
+
+def group_distance(distances, group):
+    reachable = [distances[y][x] for x, y in group if distances[y][x] != UNREACHABLE]
+    return min(reachable) if reachable else None
+
+
+def minimum_moves(distance, speed):
+    # Fewest moves to sweep `distance` cells starting at `speed`, when every move can
+    # add at most one to the speed: smallest k with k*speed + k(k+1)/2 >= distance
+    if distance <= 0:
+        return 0
+    b = 2 * speed + 1
+    k = max(0, (math.isqrt(b * b + 8 * distance) - b) // 2)
+    while k * k + b * k < 2 * distance:
+        k += 1
+    return k
+
+
+@lru_cache(maxsize=None)
+def axis_moves(speed, target_speed, distance):
+    # Fewest moves along one axis to travel `distance` and end at `target_speed`. In k moves
+    # the velocity changes by target_speed - speed, and the furthest the car can get is by
+    # accelerating first and braking last.
+    change = target_speed - speed
+    k = abs(change)
+    while True:
+        p = (k + change) // 2
+        q = p - change
+        furthest = p * k - p * (p - 1) // 2 - q * (q + 1) // 2
+        p = (k - change) // 2
+        q = p + change
+        furthest_back = p * k - p * (p - 1) // 2 - q * (q + 1) // 2
+        if -furthest_back <= distance - k * speed <= furthest:
+            return k
+        k += 1
+
+
+class DistanceHeuristic:
+    # Admissible lower bound on the moves left in a race, from backward BFS distance fields
+    # to checkpoint 1, checkpoint 2 and the finish line.
+    def __init__(self, track_layout, checkpoint1_group, checkpoint2_group, finish_tiles, out_of_bounds_tile=0):
+        to_cp1 = distance_field(track_layout, checkpoint1_group, out_of_bounds_tile)
+        to_cp2 = distance_field(track_layout, checkpoint2_group, out_of_bounds_tile)
+        to_finish = distance_field(track_layout, finish_tiles, out_of_bounds_tile)
+
+        cp1_to_cp2 = group_distance(to_cp2, checkpoint1_group)
+        cp2_to_finish = group_distance(to_finish, checkpoint2_group)
+        finish_to_cp1 = group_distance(to_cp1, finish_tiles)
+        self.solvable = None not in (cp1_to_cp2, cp2_to_finish, finish_to_cp1)
+        if not self.solvable:
+            cp1_to_cp2 = cp2_to_finish = finish_to_cp1 = 0
+
+        self.lap_distance = finish_to_cp1 + cp1_to_cp2 + cp2_to_finish
+        self.columns = len(track_layout[0])
+
+        # Distance still to sweep in the current lap, indexed by checkpoint phase then cell
+        self.lap_remaining = []
+        for field, tail in ((to_cp1, cp1_to_cp2 + cp2_to_finish), (to_cp2, cp2_to_finish), (to_finish, 0)):
+            self.lap_remaining.append([UNREACHABLE if d == UNREACHABLE else d + tail
+                                       for row in field for d in row])
+        self.to_cp1 = to_cp1
+        self.to_cp2 = to_cp2
+        self.to_finish = to_finish
+
+    def estimate(self, x, y, vx, vy, phase, lap, laps):
+        if lap > laps:
+            return 0
+        distance = self.lap_remaining[phase][y * self.columns + x]
+        if distance == UNREACHABLE:
+            return math.inf
+        distance += (laps - lap) * self.lap_distance
+        return minimum_moves(distance, max(abs(vx), abs(vy)))
+
+    def estimate_state(self, state, laps):
+        x, y, vx, vy, cp1, cp2, lap = unpack_state(state)
+        return self.estimate(x, y, vx, vy, cp1 + cp2, lap, laps)
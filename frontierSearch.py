@@ -0,0 +1,202 @@
+import time
+
+import numpy as np
+
+from moveTable import INVALID_MOVE, PHASE_NONE, PHASE_COUNT
+from distanceField import UNREACHABLE
+from searchStats import BudgetExceeded, next_budget_check
+
+# The 9 acceleration choices as parallel arrays
+ACCELERATIONS_X = np.array([-1, -1, -1, 0, 0, 0, 1, 1, 1], dtype=np.int64)
+ACCELERATIONS_Y = np.array([-1, 0, 1, -1, 0, 1, -1, 0, 1], dtype=np.int64)
+
+NO_PARENT = -1
+
+# Cost and parent arrays cover every state, so searches needing more than this are refused
+MAX_STATE_BYTES = 1024 * 1024 * 1024
+
+
+def minimum_moves_array(distances, speeds):
+    # Vectorised distanceField.minimum_moves
+    b = 2 * speeds + 1
+    moves = np.maximum(0, (np.floor(np.sqrt((b * b + 8 * distances).astype(np.float64))).astype(np.int64) - b) // 2)
+    for _ in range(2):
+        moves += moves * moves + b * moves < 2 * distances
+    return moves
+
+
+class FrontierSearch:
+    # A* over a dense state numbering, expanding every state in the lowest f bucket at once.
+    # State index = ((lap_index * PHASE_COUNT + phase) * road_cells + cell) * span * span + vx * span + vy
+    # with velocities offset by max_speed, so speeds are limited to the move table's range.
+    def __init__(self, move_table, distance_heuristic):
+        self.table = move_table
+        self.heuristic = distance_heuristic
+        self.span = move_table.speed_span
+        self.max_speed = move_table.max_speed
+        self.road_cells = move_table.road_cells
+
+        cells = np.argwhere(move_table.cell_index >= 0)
+        self.cell_y = cells[:, 0].astype(np.int64)
+        self.cell_x = cells[:, 1].astype(np.int64)
+        self.cell_lookup = move_table.cell_index.astype(np.int64)
+        self.transitions = move_table.transitions.reshape(-1)
+
+        # Remaining lap distance for each phase, by cell
+        columns = move_table.columns
+        positions = self.cell_y * columns + self.cell_x
+        self.lap_remaining = np.array([np.array(remaining, dtype=np.int64)[positions]
+                                       for remaining in distance_heuristic.lap_remaining])
+
+    def estimate(self, cells, vx, vy, phases, laps_done, laps):
+        # Lower bound on moves left, -1 where the finish cannot be reached
+        distance = self.lap_remaining[phases, cells]
+        unreachable = distance == UNREACHABLE
+        distance = distance + (laps - 1 - laps_done) * self.heuristic.lap_distance
+        moves = minimum_moves_array(distance, np.maximum(np.abs(vx), np.abs(vy)))
+        moves[laps_done >= laps] = 0
+        moves[unreachable & (laps_done < laps)] = -1
+        return moves
+
+    def search(self, start_x, start_y, laps, stats=None, budget=None):
+        span = self.span
+        velocity_states = span * span
+        lap_states = PHASE_COUNT * self.road_cells * velocity_states
+        # One extra lap slice holds the finished states
+        if (laps + 1) * lap_states * 12 > MAX_STATE_BYTES:
+            return None
+        best_cost = np.full((laps + 1) * lap_states, -1, dtype=np.int32)
+        parent = np.full((laps + 1) * lap_states, NO_PARENT, dtype=np.int64)
+
+        start_cell = int(self.cell_lookup[start_y, start_x])
+        if start_cell < 0:
+            return None
+        start = (PHASE_NONE * self.road_cells + start_cell) * velocity_states + self.max_speed * span + self.max_speed
+        best_cost[start] = 0
+
+        buckets = {0: [(np.array([start], dtype=np.int64), np.array([0], dtype=np.int32))]}
+        counts = {'nodes_expanded': 0, 'nodes_pushed': 1, 'stale_pops': 0, 'peak_open': 1, 'peak_visited': 1,
+                  'validation_time': 0.0, 'queue_time': 0.0}
+        queued = 1
+        # The budget is checked between batches, so a node limit can be overrun by one batch
+        budget_check = next_budget_check(budget, 0)
+        # Whole batches are timed, so the clock reads cost nothing next to the array work
+        clock = time.perf_counter
+
+        while buckets:
+            queue_start = clock()
+            f = min(buckets)
+            entries = buckets.pop(f)
+            states = np.concatenate([s for s, _ in entries])
+            costs = np.concatenate([c for _, c in entries])
+            queued -= states.size
+
+            # Drop entries a cheaper route has replaced since they were queued, then duplicates
+            current = best_cost[states] == costs
+            popped = states.size
+            states, unique_index = np.unique(states[current], return_index=True)
+            costs = costs[current][unique_index]
+            counts['stale_pops'] += popped - states.size
+            counts['queue_time'] += clock() - queue_start
+            if states.size == 0:
+                continue
+
+            finished = states >= laps * lap_states
+            if finished.any():
+                self.record_stats(stats, counts)
+                return self.reconstruct_path(parent, int(states[finished][0]))
+            if counts['nodes_expanded'] >= budget_check:
+                reason = budget.exceeded(counts['nodes_expanded'])
+                if reason is not None:
+                    self.record_stats(stats, counts)
+                    return BudgetExceeded(reason, counts if stats is None else stats)
+                budget_check = next_budget_check(budget, counts['nodes_expanded'])
+            counts['nodes_expanded'] += states.size
+
+            lap_index, rest = np.divmod(states, lap_states)
+            phase_cell, velocity = np.divmod(rest, velocity_states)
+            phases, cells = np.divmod(phase_cell, self.road_cells)
+            vx_index, vy_index = np.divmod(velocity, span)
+            x = self.cell_x[cells]
+            y = self.cell_y[cells]
+
+            # Every (state, acceleration) pair as one flat batch
+            new_vx_index = (vx_index[:, None] + ACCELERATIONS_X).ravel()
+            new_vy_index = (vy_index[:, None] + ACCELERATIONS_Y).ravel()
+            parents = np.repeat(states, 9)
+            parent_cells = np.repeat(cells, 9)
+            parent_phases = np.repeat(phases, 9)
+
+            validation_start = clock()
+            in_range = (new_vx_index >= 0) & (new_vx_index < span) & (new_vy_index >= 0) & (new_vy_index < span)
+            codes = np.full(parents.size, INVALID_MOVE, dtype=np.uint8)
+            codes[in_range] = self.transitions[((parent_cells[in_range] * span + new_vx_index[in_range]) * span
+                                                + new_vy_index[in_range]) * PHASE_COUNT + parent_phases[in_range]]
+            valid = codes != INVALID_MOVE
+            counts['validation_time'] += clock() - validation_start
+
+            parents = parents[valid]
+            codes = codes[valid].astype(np.int64)
+            new_vx_index = new_vx_index[valid]
+            new_vy_index = new_vy_index[valid]
+            new_x = np.repeat(x, 9)[valid] + new_vx_index - self.max_speed
+            new_y = np.repeat(y, 9)[valid] + new_vy_index - self.max_speed
+            new_cells = self.cell_lookup[new_y, new_x]
+            new_phases = codes & 3
+            new_laps_done = np.minimum(np.repeat(lap_index, 9)[valid] + (codes >> 2), laps)
+            new_states = (((new_laps_done * PHASE_COUNT + new_phases) * self.road_cells + new_cells)
+                          * velocity_states + new_vx_index * span + new_vy_index)
+
+            new_cost = np.repeat(costs, 9)[valid] + 1
+            known = best_cost[new_states]
+            better = (known < 0) | (new_cost < known)
+
+            # Several parents in this batch can reach the same child, and parents in one f bucket can
+            # have different costs, so the candidates are sorted by cost and the cheapest of each kept
+            candidates = np.flatnonzero(better)
+            candidates = candidates[np.lexsort((new_cost[candidates], new_states[candidates]))]
+            new_states, first = np.unique(new_states[candidates], return_index=True)
+            keep = candidates[first]
+            new_cost = new_cost[keep]
+            parents = parents[keep]
+
+            h = self.estimate(new_cells[keep], new_vx_index[keep] - self.max_speed, new_vy_index[keep] - self.max_speed,
+                              new_phases[keep], new_laps_done[keep], laps)
+            reachable = h >= 0
+            new_states = new_states[reachable]
+            new_cost = new_cost[reachable]
+            counts['peak_visited'] += int(np.count_nonzero(best_cost[new_states] < 0))
+            best_cost[new_states] = new_cost
+            parent[new_states] = parents[reachable]
+            counts['nodes_pushed'] += new_states.size
+
+            # Pathmax keeps f from dropping below the bucket being expanded
+            queue_start = clock()
+            new_f = np.maximum(new_cost + h[reachable], f)
+            for bucket_f in np.unique(new_f):
+                in_bucket = new_f == bucket_f
+                buckets.setdefault(int(bucket_f), []).append((new_states[in_bucket], new_cost[in_bucket]))
+            queued += new_states.size
+            counts['peak_open'] = max(counts['peak_open'], queued)
+            counts['queue_time'] += clock() - queue_start
+
+        self.record_stats(stats, counts)
+        return None
+
+    def record_stats(self, stats, counts):
+        if stats is None:
+            return
+        if not stats.get('timing'):
+            del counts['validation_time'], counts['queue_time']
+        stats.update(counts)
+
+    def reconstruct_path(self, parent, state):
+        velocity_states = self.span * self.span
+        lap_states = PHASE_COUNT * self.road_cells * velocity_states
+        path = []
+        while state != NO_PARENT:
+            cell = (state % lap_states) // velocity_states % self.road_cells
+            path.append((int(self.cell_x[cell]), int(self.cell_y[cell])))
+            state = int(parent[state])
+        path.reverse()
+        return path
@@ -1,19 +1,21 @@
 import pygame
 import sys
-import json
-import random
 import heapq
-import time
 import os
-from collections import deque
-
-pygame.init()
-
-WIDTH, HEIGHT = 1280, 720
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Racetrack Pathfinder")
+from packedState import pack_state, unpack_state, state_lap, reconstruct_path
+from distanceField import DistanceHeuristic
+from trackFormat import is_track_file, TrackFormatError
+from trackEngine import open_track
+from benchmark import run_matrix, available_workers
+from searchStats import instrument, record_stats, next_budget_check, budget_exceeded, STAT_FIELDS, STAT_LABELS
+from appContext import get_app_context, WINDOW_WIDTH, WINDOW_HEIGHT
+
+WIDTH, HEIGHT = WINDOW_WIDTH, WINDOW_HEIGHT
+# Set by open_window when the tests are started, importing the module opens nothing
+screen = None
 
 GRID_SIZE = 20
+# Replaced by the loaded track's own size
 GRID_WIDTH = WIDTH // GRID_SIZE
 GRID_HEIGHT = HEIGHT // GRID_SIZE
 
@@ -43,9 +45,11 @@ TILE_COLORS = {
 }
 
 # Initialize track and game state
+track = None
 track_grid = []
 checkpoint1_group = []
 checkpoint2_group = []
+distance_heuristic = None
 car_x, car_y = 0, 0
 car_vx, car_vy = 0, 0
 running = True
@@ -56,45 +60,20 @@ computed_path = []
 moves_made = 0
 required_laps = 1
 
-class State:
-    def __init__(self, x, y, vx, vy, cp1, cp2, lap):
-        self.x = x
-        self.y = y
-        self.vx = vx
-        self.vy = vy
-        self.cp1 = cp1  
-        self.cp2 = cp2  
-        self.lap = lap
-
-    def __lt__(self, other):
-        return False  
-
 def load_track(filename):
     global track_grid, checkpoint1_group, checkpoint2_group, cp1_centroid, cp2_centroid, finish_centroid, start_positions
+    global GRID_WIDTH, GRID_HEIGHT, track
+    global distance_heuristic
     try:
-        with open(filename, 'r') as f:
-            track_grid = json.load(f)
+        track = open_track(filename)
+        track_grid = track.layout
+        GRID_WIDTH, GRID_HEIGHT = track.columns, track.rows
         print(f"Track loaded from {filename}")
         
-        visited = [[False for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-        
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if track_grid[y][x] == TILE_TYPES['checkpoint1'] and not visited[y][x]:
-                    checkpoint1_group = bfs((x, y), TILE_TYPES['checkpoint1'], visited)
-                    break
-            if checkpoint1_group:
-                break
-        
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                if track_grid[y][x] == TILE_TYPES['checkpoint2'] and not visited[y][x]:
-                    checkpoint2_group = bfs((x, y), TILE_TYPES['checkpoint2'], visited)
-                    break
-            if checkpoint2_group:
-                break
-
-        start_positions = find_start_positions()
+        checkpoint1_group = track.checkpoint1_group
+        checkpoint2_group = track.checkpoint2_group
+
+        start_positions = track.start_positions
         
         if not checkpoint1_group or not checkpoint2_group:
             print("Two checkpoint groups required")
@@ -102,115 +81,76 @@ def load_track(filename):
         else:
             print(f"Checkpoint1: {len(checkpoint1_group)} tiles")
             print(f"Checkpoint2: {len(checkpoint2_group)} tiles")
-            cp1_centroid = (sum(x for x, y in checkpoint1_group)/len(checkpoint1_group), 
-                sum(y for x, y in checkpoint1_group)/len(checkpoint1_group))
-            cp2_centroid = (sum(x for x, y in checkpoint2_group)/len(checkpoint2_group), 
-                            sum(y for x, y in checkpoint2_group)/len(checkpoint2_group))
-            finish_centroid = (sum(x for x, y in start_positions) / len(start_positions),
-                                sum(y for x, y in start_positions) / len(start_positions) )
+            cp1_centroid = track.cp1_centroid
+            cp2_centroid = track.cp2_centroid
+            finish_centroid = track.finish_centroid
+            distance_heuristic = DistanceHeuristic(track_grid, checkpoint1_group, checkpoint2_group, start_positions)
 
         
             
     except FileNotFoundError:
         print(f"File {filename} not found.")
         sys.exit()
-
-def bfs(start_pos, tile_type, visited):
-    queue = [start_pos]
-    connected = []
-    while queue:
-        x, y = queue.pop(0)
-        if visited[y][x]:
-            continue
-        visited[y][x] = True
-        if track_grid[y][x] == tile_type:
-            connected.append((x, y))
-            for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]:
-                nx, ny = x+dx, y+dy
-                if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
-                    if not visited[ny][nx] and track_grid[ny][nx] == tile_type:
-                        queue.append((nx, ny))
-    return connected
+    except TrackFormatError as error:
+        print(error)
+        sys.exit()
 
 def find_start_positions():
-    return [(x, y) for y in range(GRID_HEIGHT) for x in range(GRID_WIDTH)
-            if track_grid[y][x] == TILE_TYPES['start_finish']]
-
-def bresenham_line(x0, y0, x1, y1):
-    points = []
-    dx, dy = abs(x1 - x0), abs(y1 - y0)
-    sx = -1 if x0 > x1 else 1
-    sy = -1 if y0 > y1 else 1
-    err = dx - dy
-    
-    while True:
-        points.append((x0, y0))
-        if x0 == x1 and y0 == y1:
-            break
-        e2 = 2 * err
-        if e2 > -dy:
-            err -= dy
-            x0 += sx
-        if e2 < dx:
-            err += dx
-            y0 += sy
-    return points
-
-def is_move_valid(x0, y0, x1, y1):
-    for x, y in bresenham_line(x0, y0, x1, y1):
-        if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT) or \
-           track_grid[y][x] == TILE_TYPES['out_of_bounds']:
-            return False, []
-    
-    crossed = []
-    for x, y in bresenham_line(x0, y0, x1, y1):
-        tile = track_grid[y][x]
-        if tile == TILE_TYPES['checkpoint1']:
-            crossed.append(('cp1', (x,y)))
-        elif tile == TILE_TYPES['checkpoint2']:
-            crossed.append(('cp2', (x,y)))
-        elif tile == TILE_TYPES['start_finish']:
-            crossed.append(('finish', (x,y)))
-    return True, crossed
+    return track.start_positions
 
 # Manhattan Distance to target
-def heuristic1(x, y, target_x, target_y):
+def heuristic1(x, y, target_x, target_y, state=None, laps=1):
     return abs(target_x - x) + abs(target_y - y)
 
 # Manhattan Distance to finish line
-def heuristic2(x, y, target_x, target_y):
+def heuristic2(x, y, target_x, target_y, state=None, laps=1):
     start_finish_x, start_finish_y = start_positions[0]
     return abs(start_finish_x - x) + abs(start_finish_y - y)
 
 # Chebyshev Distance to target
-def heuristic3(x, y, target_x, target_y):
+def heuristic3(x, y, target_x, target_y, state=None, laps=1):
     return max(abs(target_x - x), abs(target_y - y))
 
 # Chebyshev Distance to finish line
-def heuristic4(x, y, target_x, target_y):
+def heuristic4(x, y, target_x, target_y, state=None, laps=1):
     start_finish_x, start_finish_y = start_positions[0]
     return max(abs(start_finish_x - x), abs(start_finish_y - y))
 
 # Euclidean Distance to target
-def heuristic5(x, y, target_x, target_y):
+def heuristic5(x, y, target_x, target_y, state=None, laps=1):
     dx = target_x - x
     dy = target_y - y
     return (dx**2 + dy**2)**0.5
 
 # Euclidean Distance to finish line
-def heuristic6(x, y, target_x, target_y):
+def heuristic6(x, y, target_x, target_y, state=None, laps=1):
     start_finish_x, start_finish_y = start_positions[0]
     dx = start_finish_x - x
     dy = start_finish_y - y
     return (dx**2 + dy**2)**0.5
 
+# Lower bound on remaining moves from BFS distance fields to each checkpoint group and the finish line
+def heuristic7(x, y, target_x, target_y, state=None, laps=1):
+    return distance_heuristic.estimate_state(state, laps)
+
+HEURISTICS = {
+    "Manhattan to Target": heuristic1,
+    "Manhattan to Finish": heuristic2,
+    "Chebyshev to Target": heuristic3,
+    "Chebyshev to Finish": heuristic4,
+    "Euclidean to Target": heuristic5,
+    "Euclidean to Finish": heuristic6,
+    "BFS Distance Field": heuristic7
+}
+
 def get_target(state):
-    if state.lap > required_laps:
+    _, _, _, _, cp1, cp2, lap = unpack_state(state)
+    if lap > required_laps:
         return None
     
-    if not state.cp1:
+    if not cp1:
         return cp1_centroid  
-    elif not state.cp2:
+    elif not cp2:
         return cp2_centroid  
     else:
         return finish_centroid  
@@ -232,7 +172,7 @@ def render_results(screen, all_results):
     total_height += 90
     
     for _ in all_results:
-        total_height += 150
+        total_height += 225 + 25 * len(STAT_FIELDS)
     
     total_height += 100
     
@@ -245,9 +185,9 @@ def render_results(screen, all_results):
     instructions = text_font.render("Press T to sort by Time, M to sort by Moves, ESC to return to menu", True, TEXT_COLOR)
     content_surface.blit(instructions, (WIDTH//2 - instructions.get_width()//2, 50))
     
-    headers = ["Heuristic", "Success Rate", "Avg Time (s)", "Avg Moves"]
+    headers = ["Heuristic", "Success Rate", "Avg Time (s)", "Avg Moves", "Expanded", "Peak Open"]
     header_y = 80
-    x_positions = [50, 300, 500, 700]
+    x_positions = [50, 300, 500, 700, 900, 1080]
     for header, x in zip(headers, x_positions):
         header_text = header_font.render(header, True, HEADER_COLOR)
         content_surface.blit(header_text, (x, header_y))
@@ -284,6 +224,11 @@ def render_results(screen, all_results):
             moves_text = text_font.render(f"{results['avg_moves']:.1f}", True, TEXT_COLOR)
             content_surface.blit(moves_text, (700, y))
             
+            for field, x in (('nodes_expanded', 900), ('peak_open', 1080)):
+                value = results['avg_stats'].get(field)
+                count_text = text_font.render("-" if value is None else f"{value:,.0f}", True, TEXT_COLOR)
+                content_surface.blit(count_text, (x, y))
+            
             y += 40
         
         y += 40
@@ -309,6 +254,27 @@ def render_results(screen, all_results):
                     f"Worst Time: {max(successful_times):.3f} seconds"
                 ])
             
+            summary = results.get('time_summary')
+            if summary and summary['stdev'] is not None:
+                stats.extend([
+                    f"Median Time: {summary['median']:.3f} seconds (95th percentile {summary['p95']:.3f})",
+                    f"Standard Deviation: {summary['stdev']:.3f} seconds, "
+                    f"95% CI {summary['ci95_low']:.3f} - {summary['ci95_high']:.3f}"
+                ])
+            
+            errors = sorted(set(error for error in results.get('errors', []) if error))
+            if errors:
+                stats.append(f"Failed Trials: {', '.join(errors)}")
+            for run in ('timing', 'memory'):
+                if results.get(f'{run}_error'):
+                    stats.append(f"Failed {run.capitalize()} Run: {results[f'{run}_error']}")
+            
+            for field in STAT_FIELDS:
+                if field in results['avg_stats']:
+                    value = results['avg_stats'][field]
+                    stats.append(f"{STAT_LABELS[field]}: {value:.3f}" if field.endswith('_time')
+                                 else f"{STAT_LABELS[field]}: {value:,.0f}")
+            
             for stat in stats:
                 stat_text = text_font.render(stat, True, TEXT_COLOR)
                 content_surface.blit(stat_text, (70, y))
@@ -372,7 +338,7 @@ def show_loading_screen(screen, message):
 def get_available_tracks():
     tracks = []
     for file in os.listdir():
-        if file.endswith('.json'):
+        if is_track_file(file):
             tracks.append(file)
     return tracks
 
@@ -455,24 +421,21 @@ def select_track():
     
     return None
 
-def test_heuristics():
-    heuristics = {
-        "Manhattan to Target": heuristic1,
-        "Manhattan to Finish": heuristic2,
-        "Chebyshev to Target": heuristic3,
-        "Chebyshev to Finish": heuristic4,
-        "Euclidean to Target": heuristic5,
-        "Euclidean to Finish": heuristic6
-    }
-    
-    pathfinder = compute_optimal_path_heap
-    
+def open_window(app=None):
+    global screen
+    screen = (app or get_app_context()).open_window("Racetrack Pathfinder")
+    return screen
+
+def test_heuristics(app=None):
+    open_window(app)
     track_filename = select_track()
     if not track_filename:
         return
     
     laps = 1
     num_trials = 1
+    # Seconds a trial may search before it is recorded as a timeout, so weak heuristics cannot hang the menu
+    time_limit = 60
     
     show_loading_screen(screen, "Loading track and initializing tests...")
     
@@ -482,119 +445,13 @@ def test_heuristics():
         print("No start positions found.")
         return
     
-    start_x, start_y = start_positions[0]
+    # Every trial is a job of its own, spread across the available cores
+    workers = available_workers()
+    show_loading_screen(screen, f"Testing {len(HEURISTICS)} heuristics across {workers} processes...")
     
-    all_results = {}
-    
-    for heuristic_name, heuristic_func in heuristics.items():
-        show_loading_screen(screen, f"Testing {heuristic_name}...")
-        
-        times = []
-        moves = []
-        successes = 0
-        
-        for trial in range(num_trials):
-            def modified_pathfinder(start_x, start_y, laps):
-                heap = []
-                initial_state = State(start_x, start_y, 0, 0, False, False, 1)
-                heapq.heappush(heap, (0, initial_state))
-                
-                visited = {}
-                came_from = {}
-                
-                while heap:
-                    cost, current = heapq.heappop(heap)
-                    
-                    if current.lap > laps:
-                        path = []
-                        while current in came_from:
-                            path.append((current.x, current.y))
-                            current = came_from[current]
-                        path.append((start_x, start_y))
-                        path.reverse()
-                        return path
-                    
-                    state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-                    if state_key in visited and visited[state_key] <= cost:
-                        continue
-                    visited[state_key] = cost
-                    
-                    for dvx in (-1, 0, 1):
-                        for dvy in (-1, 0, 1):
-                            new_vx = current.vx + dvx
-                            new_vy = current.vy + dvy
-                            new_x = current.x + new_vx
-                            new_y = current.y + new_vy
-                            
-                            if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
-                                continue
-                            
-                            valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                            if not valid:
-                                continue
-                            
-                            cp1 = current.cp1
-                            cp2 = current.cp2
-                            lap = current.lap
-                            for c in crossed:
-                                if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                                    cp1 = True
-                                elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                                    cp2 = True
-                                elif c[0] == 'finish':
-                                    if cp1 and cp2:
-                                        lap += 1
-                                        cp1 = False
-                                        cp2 = False
-                                    else:
-                                        cp1 = False
-                                        cp2 = False
-                            
-                            new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
-                            new_cost = cost + 1
-
-                            target = get_target(new_state)
-                            if target is None:
-                                target_x, target_y = finish_centroid  
-                            else:
-                                target_x, target_y = target
-                            
-                            new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                            if new_state_key not in visited or new_cost < visited[new_state_key]:
-                                h_value = heuristic_func(new_x, new_y, target_x, target_y)
-                                priority = new_cost + h_value
-                                heapq.heappush(heap, (priority, new_state))
-                                came_from[new_state] = current
-                return None
-            
-            start_time = time.time()
-            path = modified_pathfinder(start_x, start_y, laps)
-            duration = time.time() - start_time
-            
-            if path:
-                successes += 1
-                times.append(duration)
-                moves.append(len(path) - 1)
-            else:
-                times.append(None)
-                moves.append(None)
-        
-        if successes > 0:
-            avg_time = sum(t for t in times if t is not None) / successes
-            avg_moves = sum(m for m in moves if m is not None) / successes
-            success_rate = (successes / num_trials) * 100
-        else:
-            avg_time = float('inf')
-            avg_moves = float('inf')
-            success_rate = 0
-            
-        all_results[heuristic_name] = {
-            "avg_time": avg_time,
-            "avg_moves": avg_moves,
-            "success_rate": success_rate,
-            "raw_times": times,
-            "raw_moves": moves
-        }
+    matrix = run_matrix([track_filename], list(HEURISTICS.items()), [], laps, num_trials, workers,
+                        measure_timing=True, time_limit=time_limit)
+    all_results = {heuristic_name: results for (_, _, heuristic_name), results in matrix.items()}
     
     show_loading_screen(screen, "Preparing results display...")
     
@@ -610,74 +467,134 @@ def test_heuristics():
                     if event.key == pygame.K_ESCAPE:
                         waiting = False
 
+def compute_optimal_path_with_heuristic(start_x, start_y, laps, heuristic_func, stats=None, budget=None):
+    heap = []
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    heapq.heappush(heap, (0, 0, initial_state))
+    
+    cost_so_far = {initial_state: 0}
+    came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    move_transition, push, pop = instrument(stats, track.transition, heapq.heappush, heapq.heappop)
+    budget_check = next_budget_check(budget, 0)
+    
+    while heap:
+        _, cost, current = pop(heap)
+        
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
+        
+        if cost > cost_so_far[current]:
+            stale += 1
+            continue
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
+        
+        for dvx in (-1, 0, 1):
+            for dvy in (-1, 0, 1):
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
+                
+                if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
+                    continue
+                
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
+                    continue
+                cp1, cp2, lap = transition
+                
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_cost = cost + 1
+
+                target = get_target(new_state)
+                if target is None:
+                    target_x, target_y = finish_centroid  
+                else:
+                    target_x, target_y = target
+                
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
+                    h_value = heuristic_func(new_x, new_y, target_x, target_y, new_state, laps)
+                    priority = new_cost + h_value
+                    push(heap, (priority, new_cost, new_state))
+                    pushed += 1
+                    came_from[new_state] = current
+        if len(heap) > peak_open:
+            peak_open = len(heap)
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+    return None
+
 def calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y, heuristic_func=None, dvx=None, dvy=None):
     if heuristic_func is None:
         heuristic_func = heuristic1
         
-    h_value = heuristic_func(new_x, new_y, target_x, target_y)
+    h_value = heuristic_func(new_x, new_y, target_x, target_y, new_state)
     return new_cost + h_value
 
-def compute_optimal_path_heap(start_x, start_y, laps):
+def compute_optimal_path_heap(start_x, start_y, laps, stats=None, budget=None):
     heap = []
-    initial_state = State(start_x, start_y, 0, 0, False, False, 1)
-    heapq.heappush(heap, (0, initial_state))
+    initial_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+    heapq.heappush(heap, (0, 0, initial_state))
 
     
     
-    visited = {}
+    cost_so_far = {initial_state: 0}
     came_from = {}
+    expanded = 0
+    pushed = 1
+    stale = 0
+    peak_open = 1
+    move_transition, push, pop = instrument(stats, track.transition, heapq.heappush, heapq.heappop)
+    budget_check = next_budget_check(budget, 0)
     
     while heap:
-        cost, current = heapq.heappop(heap)
+        _, cost, current = pop(heap)
         
-        if current.lap > laps:
-            path = []
-            while current in came_from:
-                path.append((current.x, current.y))
-                current = came_from[current]
-            path.append((start_x, start_y))
-            path.reverse()
-            return path
+        if state_lap(current) > laps:
+            record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
+            return reconstruct_path(came_from, current)
         
-        state_key = (current.x, current.y, current.vx, current.vy, current.cp1, current.cp2, current.lap)
-        if state_key in visited and visited[state_key] <= cost:
+        if cost > cost_so_far[current]:
+            stale += 1
             continue
-        visited[state_key] = cost
+        if expanded >= budget_check:
+            reason = budget.exceeded(expanded)
+            if reason is not None:
+                return budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, cost_so_far)
+            budget_check = next_budget_check(budget, expanded)
+        expanded += 1
+        
+        x, y, vx, vy, current_cp1, current_cp2, current_lap = unpack_state(current)
         
 
         for dvx in (-1, 0, 1):
             for dvy in (-1, 0, 1):
-                new_vx = current.vx + dvx
-                new_vy = current.vy + dvy
-                new_x = current.x + new_vx
-                new_y = current.y + new_vy
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
                 
                 if not (0 <= new_x < GRID_WIDTH and 0 <= new_y < GRID_HEIGHT):
                     continue
                 
-                valid, crossed = is_move_valid(current.x, current.y, new_x, new_y)
-                if not valid:
+                transition = move_transition(x, y, new_x, new_y, current_cp1, current_cp2, current_lap)
+                if transition is None:
                     continue
+                cp1, cp2, lap = transition
                 
-                cp1 = current.cp1
-                cp2 = current.cp2
-                lap = current.lap
-                for c in crossed:
-                    if c[0] == 'cp1' and not cp1 and c[1] in checkpoint1_group:
-                        cp1 = True
-                    elif c[0] == 'cp2' and cp1 and not cp2 and c[1] in checkpoint2_group:
-                        cp2 = True
-
-                    elif c[0] == 'finish':
-                        if cp1 and cp2:
-                            lap += 1
-                            cp1 = False
-                            cp2 = False
-                        else:
-                            cp1 = False
-                            cp2 = False
-                
-                new_state = State(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
+                new_state = pack_state(new_x, new_y, new_vx, new_vy, cp1, cp2, lap)
                 new_cost = cost + 1
 
                 target = get_target(new_state)
@@ -686,10 +603,14 @@ def compute_optimal_path_heap(start_x, start_y, laps):
                 else:
                     target_x, target_y = target
                 
-                new_state_key = (new_state.x, new_state.y, new_state.vx, new_state.vy, new_state.cp1, new_state.cp2, new_state.lap)
-                if new_state_key not in visited or new_cost < visited[new_state_key]:
+                if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
                     priority = calculate_priority(new_cost, new_state, new_x, new_y, target_x, target_y, dvx=dvx, dvy=dvy)
-                    heapq.heappush(heap, (priority, new_state))
+                    push(heap, (priority, new_cost, new_state))
+                    pushed += 1
                     came_from[new_state] = current
+        if len(heap) > peak_open:
+            peak_open = len(heap)
+    record_stats(stats, expanded, pushed, stale, peak_open, cost_so_far)
     return None
 
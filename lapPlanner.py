@@ -0,0 +1,258 @@
+import heapq
+
+from moveTable import INVALID_MOVE, PHASE_COUNT
+from searchStats import BudgetExceeded, next_budget_check
+from packedState import (unpack_state, PHASE_FROM_FLAGS, FLAGS_FROM_PHASE, FLAGS_MASK, CP1_SHIFT, LAP_SHIFT,
+                         X_SHIFT, Y_SHIFT, VX_SHIFT, VELOCITY_OFFSET)
+
+# States inside a layer have no lap. A move that finishes the lap comes back with lap 1.
+LAP_ONE = 1 << LAP_SHIFT
+LAP_FREE_MASK = LAP_ONE - 1
+
+
+def normalise(entries):
+    # Entry costs relative to the cheapest entry, as a hashable key, and the cost taken off
+    offset = min(entries.values())
+    return frozenset((state, cost - offset) for state, cost in entries.items()), offset
+
+
+class LapLayer:
+    # One lap searched from a set of entry states. exits maps every state the lap can be finished
+    # in to its cost from the cheapest entry, and the parent maps walk a finish back to its entry.
+    def __init__(self, exits, exit_parents, parents):
+        self.exits = exits
+        self.exit_parents = exit_parents
+        self.parents = parents
+
+    def entry_for(self, exit_state, path):
+        # Appends the lap's states from exit_state back to (not including) its entry and returns the entry
+        path.append(exit_state | LAP_ONE)
+        state = self.exit_parents[exit_state]
+        while state in self.parents:
+            path.append(state)
+            state = self.parents[state]
+        return state
+
+
+class LapPlanner:
+    # Optimal multi-lap plans without the lap in the search state. Laps only ever increase, so
+    # each lap is searched as its own layer, breadth first from the states the previous lap
+    # finished in. A layer maps entry costs to finish costs by min-plus, so entries equal to an
+    # earlier layer's up to a constant give the same finishes shifted by it. Layers are memoised
+    # by their normalised entries and, once the finishing states repeat, further laps are lookups.
+    # The last lap only needs the cheapest finish and is searched with A*.
+    #
+    # Checkpoint phases are searched inside the lap rather than as layers of their own: crossing
+    # the finish line between checkpoints resets the phase, so only the lap is monotone.
+    def __init__(self, track, move_table, distance_heuristic):
+        self.track = track
+        self.table = move_table
+        self.heuristic = distance_heuristic
+        self.layers = {}
+        self.last_laps = {}
+        # Totals over every layer searched, memoised layers are not counted again
+        self.expanded = 0
+        self.pushed = 0
+        self.stale_pops = 0
+        self.peak_open = 0
+        self.peak_visited = 0
+        # Set by plan for the layers it searches
+        self.budget = None
+        self.budget_start = 0
+        self.budget_check = next_budget_check(None, 0)
+        self.budget_reason = None
+
+    def successors(self, state):
+        # Lap free states one move away, with LAP_ONE set on the moves that finish the lap
+        x, y, vx, vy, cp1, cp2, _ = unpack_state(state)
+        phase = PHASE_FROM_FLAGS[(state >> CP1_SHIFT) & FLAGS_MASK]
+        table = self.table
+        max_speed = table.max_speed
+        speed_span = table.speed_span
+        flat = table.flat
+        base = table.cell_base(x, y)
+        columns = self.track.columns
+        rows = self.track.rows
+
+        successors = []
+        for dvx in (-1, 0, 1):
+            for dvy in (-1, 0, 1):
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
+
+                if not (0 <= new_x < columns and 0 <= new_y < rows):
+                    continue
+
+                if base >= 0 and -max_speed <= new_vx <= max_speed and -max_speed <= new_vy <= max_speed:
+                    code = flat[base + ((new_vx + max_speed) * speed_span + new_vy + max_speed) * PHASE_COUNT + phase]
+                    if code == INVALID_MOVE:
+                        continue
+                    new_flags = FLAGS_FROM_PHASE[code & 3]
+                    finished = code >> 2
+                else:
+                    transition = self.track.transition(x, y, new_x, new_y, cp1, cp2, 0)
+                    if transition is None:
+                        continue
+                    new_cp1, new_cp2, finished = transition
+                    new_flags = int(new_cp1) | (int(new_cp2) << 1)
+
+                successors.append((min(finished, 1) << LAP_SHIFT) | (new_flags << CP1_SHIFT) |
+                                  (new_x << X_SHIFT) | (new_y << Y_SHIFT) |
+                                  ((new_vx + VELOCITY_OFFSET) << VX_SHIFT) | (new_vy + VELOCITY_OFFSET))
+        return successors
+
+    def count_expansion(self, progress, cancel):
+        # False when the search has been cancelled or has run out of budget
+        if self.expanded - self.budget_start >= self.budget_check:
+            self.budget_reason = self.budget.exceeded(self.expanded - self.budget_start)
+            if self.budget_reason is not None:
+                return False
+            self.budget_check = next_budget_check(self.budget, self.expanded - self.budget_start)
+        self.expanded += 1
+        if not self.expanded & 1023:
+            if progress is not None:
+                progress['expanded'] = self.expanded
+            if cancel is not None and cancel.is_set():
+                return False
+        return True
+
+    def search_layer(self, entries, progress=None, cancel=None):
+        # Breadth first from every entry at its own cost, until every finish has been costed.
+        # Costs are whole moves, so a list per cost level replaces the priority queue.
+        levels = {}
+        for state, cost in entries:
+            levels.setdefault(cost, []).append(state)
+        cost_so_far = dict(entries)
+        parents = {}
+        exits = {}
+        exit_parents = {}
+        queued = len(cost_so_far)
+        self.pushed += queued
+
+        level = 0
+        last_level = max(levels)
+        while level <= last_level:
+            new_cost = level + 1
+            level_states = levels.pop(level, ())
+            queued -= len(level_states)
+            for state in level_states:
+                if cost_so_far[state] != level:
+                    self.stale_pops += 1
+                    continue
+                if not self.count_expansion(progress, cancel):
+                    return None
+
+                for new_state in self.successors(state):
+                    if new_state & LAP_ONE:
+                        new_state &= LAP_FREE_MASK
+                        if new_cost < exits.get(new_state, new_cost + 1):
+                            exits[new_state] = new_cost
+                            exit_parents[new_state] = state
+                    elif new_cost < cost_so_far.get(new_state, new_cost + 1):
+                        cost_so_far[new_state] = new_cost
+                        parents[new_state] = state
+                        levels.setdefault(new_cost, []).append(new_state)
+                        last_level = max(last_level, new_cost)
+                        queued += 1
+                        self.pushed += 1
+                self.peak_open = max(self.peak_open, queued)
+            level += 1
+        self.peak_visited = max(self.peak_visited, len(cost_so_far) + len(exits))
+        return LapLayer(exits, exit_parents, parents)
+
+    def search_last_lap(self, entries, progress=None, cancel=None):
+        # A* from every entry to the cheapest finish, which becomes the layer's only exit
+        heap = [(cost + self.heuristic.estimate_state(state | LAP_ONE, 1), cost, state) for state, cost in entries]
+        heapq.heapify(heap)
+        cost_so_far = dict(entries)
+        parents = {}
+        exit_parents = {}
+        self.pushed += len(heap)
+
+        while heap:
+            _, cost, state = heapq.heappop(heap)
+            if state & LAP_ONE:
+                finish = state & LAP_FREE_MASK
+                self.peak_visited = max(self.peak_visited, len(cost_so_far))
+                return LapLayer({finish: cost}, {finish: exit_parents[finish]}, parents)
+            if cost > cost_so_far[state]:
+                self.stale_pops += 1
+                continue
+            if not self.count_expansion(progress, cancel):
+                return None
+
+            new_cost = cost + 1
+            for new_state in self.successors(state):
+                if new_state & LAP_ONE:
+                    finish = new_state & LAP_FREE_MASK
+                    if new_cost < cost_so_far.get(new_state, new_cost + 1):
+                        cost_so_far[new_state] = new_cost
+                        exit_parents[finish] = state
+                        heapq.heappush(heap, (new_cost, new_cost, new_state))
+                        self.pushed += 1
+                elif new_cost < cost_so_far.get(new_state, new_cost + 1):
+                    cost_so_far[new_state] = new_cost
+                    parents[new_state] = state
+                    heapq.heappush(heap, (new_cost + self.heuristic.estimate_state(new_state | LAP_ONE, 1),
+                                          new_cost, new_state))
+                    self.pushed += 1
+            self.peak_open = max(self.peak_open, len(heap))
+        self.peak_visited = max(self.peak_visited, len(cost_so_far))
+        return LapLayer({}, {}, parents)
+
+    def layer(self, entries, last_lap, progress=None, cancel=None):
+        # Memoised by normalised entries, returns (layer, cost offset)
+        key, offset = normalise(entries)
+        memo = self.last_laps if last_lap else self.layers
+        layer = memo.get(key)
+        if layer is None:
+            layer = (self.search_last_lap if last_lap else self.search_layer)(key, progress, cancel)
+            if layer is None:
+                return None, offset
+            memo[key] = layer
+        return layer, offset
+
+    def record_stats(self, stats):
+        stats['nodes_expanded'] = self.expanded
+        stats['nodes_pushed'] = self.pushed
+        stats['stale_pops'] = self.stale_pops
+        stats['peak_open'] = self.peak_open
+        stats['peak_visited'] = self.peak_visited
+        return stats
+
+    def plan(self, start_state, laps, progress=None, cancel=None, budget=None):
+        # Same result as a single A* over lap-counting states: the states from start_state until
+        # the lap after `laps` begins, or None if there is no way round or the search is cancelled.
+        # A budget counts the expansions of this call only, and running out returns BudgetExceeded.
+        self.budget = budget
+        self.budget_start = self.expanded
+        self.budget_check = next_budget_check(budget, 0)
+        self.budget_reason = None
+        first_lap = start_state >> LAP_SHIFT
+        entries = {start_state & LAP_FREE_MASK: 0}
+        layers = []
+        for lap in range(first_lap, laps + 1):
+            layer, offset = self.layer(entries, lap == laps, progress, cancel)
+            if layer is None and self.budget_reason is not None:
+                return BudgetExceeded(self.budget_reason, self.record_stats({}))
+            if layer is None or not layer.exits:
+                return None
+            layers.append(layer)
+            entries = {state: cost + offset for state, cost in layer.exits.items()}
+
+        if progress is not None:
+            progress['expanded'] = self.expanded
+
+        # Walk back from the finish, one layer at a time, then give every state its lap
+        finish = min(entries, key=entries.get)
+        plan = []
+        state = finish
+        for lap in range(laps, first_lap - 1, -1):
+            lap_states = []
+            state = layers[lap - first_lap].entry_for(state, lap_states)
+            plan.extend(lap_state + (lap << LAP_SHIFT) for lap_state in lap_states)
+        plan.append(state | (first_lap << LAP_SHIFT))
+        plan.reverse()
+        return plan
@@ -3,19 +3,11 @@ import sys
 import importlib
 import os
 import time  
-from RaceAgainstAIv2 import select_track, Game  
-import trackCreatorCheckpoints  
-import heuristicTesting
-import dataStructureTesting
 import glob  
+from appContext import get_app_context, WINDOW_WIDTH
 
-# Initialize Pygame
-pygame.init()
-
-# Game Window Settings
-WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 720
-game_window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Racetrack Game Menu")
+# One window shared by the menu and every mode, opened when the menu first draws
+app = get_app_context()
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -56,7 +48,7 @@ class Button:
         return self.rect.collidepoint(mouse_pos) and mouse_clicked
 
 def check_for_tracks():
-    track_files = glob.glob("*.json") 
+    track_files = glob.glob("*.json") + glob.glob("*.track")
     return len(track_files) > 0
 
 def draw_warning(surface):
@@ -79,14 +71,16 @@ def draw_title(surface):
     
     draw_warning(surface)
 
+# Each mode is imported the first time it is chosen, so the menu appears without loading the searches
 def run_ai_race():
-    result = select_track()
+    from RaceAgainstAIv2 import select_track, Game
+    result = select_track(app)
     if not result:
         return True  
     
     track_filename, laps, show_ai_path = result
     
-    game = Game()
+    game = Game(app)
     game.required_laps = laps
     game.show_ai_path = show_ai_path
     game.load_track(track_filename)
@@ -109,9 +103,11 @@ def run_ai_race():
         game.draw()
         clock.tick(60)
     
+    game.stop_planning()
     return True
 
 def run_heuristic_test():
+    import heuristicTesting
     original_render_results = heuristicTesting.render_results
     
     def patched_render_results(screen, all_results):
@@ -120,11 +116,12 @@ def run_heuristic_test():
     
     heuristicTesting.render_results = patched_render_results
     
-    heuristicTesting.test_heuristics()
+    heuristicTesting.test_heuristics(app)
     
     return True
 
 def run_data_structure_test():    
+    import dataStructureTesting
     original_render_results = dataStructureTesting.render_results
     
     def patched_render_results(screen, all_results):
@@ -134,17 +131,15 @@ def run_data_structure_test():
 
     dataStructureTesting.render_results = patched_render_results
     
-    dataStructureTesting.test_data_structures()
+    dataStructureTesting.test_data_structures(app)
     
     return True
 
 def run_track_creator():
-    return trackCreatorCheckpoints.main()
+    import trackCreatorCheckpoints
+    return trackCreatorCheckpoints.main(app)
 
-def main_menu():
-    global show_warning
-    clock = pygame.time.Clock()
-    
+def create_menu_buttons():
     button_width = 300  
     button_height = 80
     button_spacing = 40 
@@ -160,6 +155,23 @@ def main_menu():
         Button(right_column_x, grid_start_y + button_height + button_spacing, button_width, button_height, "Data Structure Testing", LIGHT_GRAY, WHITE, BLACK, True),
         Button(WINDOW_WIDTH // 2 - button_width // 2, grid_start_y + 2 * (button_height + button_spacing) + 40, button_width, button_height, "Exit", LIGHT_GRAY, WHITE, BLACK, False)
     ]
+    return buttons
+
+def draw_menu(surface, buttons):
+    surface.fill(WHITE)
+    
+    draw_title(surface)
+    
+    for button in buttons:
+        button.draw(surface)
+    
+    pygame.display.flip()
+
+def main_menu():
+    global show_warning
+    game_window = app.open_window("Racetrack Game Menu")
+    clock = app.clock
+    buttons = create_menu_buttons()
     
     running = True
     while running:
@@ -201,18 +213,13 @@ def main_menu():
                     elif button.text == "Exit":
                         running = False
                     show_warning = False 
+                    # The mode may have retitled the shared window
+                    app.open_window("Racetrack Game Menu")
         
-        game_window.fill(WHITE)
-        
-        draw_title(game_window)
-        
-        for button in buttons:
-            button.draw(game_window)
-        
-        pygame.display.flip()
+        draw_menu(game_window, buttons)
         clock.tick(60)
 
 if __name__ == "__main__":
     main_menu()
-    pygame.quit()
+    app.close()
     sys.exit() 
\ No newline at end of file
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Checkpoint phases a car can be in during a lap
+PHASE_NONE = 0
+PHASE_CP1 = 1
+PHASE_CP2 = 2
+PHASE_COUNT = 3
+
+# Tile events along a traced move
+EVENT_NONE = 0
+EVENT_CP1 = 1
+EVENT_CP2 = 2
+EVENT_FINISH = 3
+
+INVALID_MOVE = 255
+DEFAULT_MAX_SPEED = 10
+
+# Larger tables are not built, and their moves are traced as the search reaches them
+MAX_TABLE_BYTES = 64 * 1024 * 1024
+
+
+def phase_from_flags(cp1, cp2):
+    if cp2:
+        return PHASE_CP2
+    if cp1:
+        return PHASE_CP1
+    return PHASE_NONE
+
+
+def table_bytes(road_cells, max_speed=DEFAULT_MAX_SPEED):
+    return road_cells * (2 * max_speed + 1) ** 2 * PHASE_COUNT
+
+
+def table_fits(road_cells, max_speed=DEFAULT_MAX_SPEED):
+    return table_bytes(road_cells, max_speed) <= MAX_TABLE_BYTES
+
+
+class MoveTable:
+    # For every road cell and every velocity up to max_speed in each axis, stores one byte per
+    # starting checkpoint phase: INVALID_MOVE if the move leaves the road, otherwise the phase
+    # after the move in the low two bits and the number of laps completed above them.
+    def __init__(self, track_layout, checkpoint1_group, checkpoint2_group, finish_tile, line_function,
+                 max_speed=DEFAULT_MAX_SPEED, out_of_bounds_tile=0):
+        grid = np.array(track_layout, dtype=np.uint8)
+        self.rows, self.columns = grid.shape
+        self.max_speed = max_speed
+        self.speed_span = 2 * max_speed + 1
+
+        road = grid != out_of_bounds_tile
+        events = np.zeros(grid.shape, dtype=np.uint8)
+        events[grid == finish_tile] = EVENT_FINISH
+        for x, y in checkpoint1_group:
+            events[y, x] = EVENT_CP1
+        for x, y in checkpoint2_group:
+            events[y, x] = EVENT_CP2
+
+        cell_index = np.full(grid.shape, -1, dtype=np.int32)
+        cell_index[road] = np.arange(int(road.sum()), dtype=np.int32)
+        self.cell_index = cell_index
+        self.cell_lookup = cell_index.ravel().tolist()
+        self.road_cells = int(road.sum())
+
+        # Pad so that every offset up to max_speed stays inside the grid, then read each offset
+        # for the road cells only through flat indices, so large mostly empty tracks stay cheap
+        pad = max_speed
+        padded_columns = self.columns + 2 * pad
+        road_padded = np.pad(road, pad, constant_values=False).ravel()
+        events_padded = np.pad(events, pad, constant_values=EVENT_NONE).ravel()
+        road_y, road_x = np.nonzero(road)
+        road_positions = (road_y + pad) * padded_columns + road_x + pad
+
+        self.transitions = np.full((self.road_cells, self.speed_span, self.speed_span, PHASE_COUNT),
+                                   INVALID_MOVE, dtype=np.uint8)
+
+        for vx in range(-max_speed, max_speed + 1):
+            for vy in range(-max_speed, max_speed + 1):
+                offsets = line_function(0, 0, vx, vy)
+
+                valid = np.ones(self.road_cells, dtype=bool)
+                for ox, oy in offsets:
+                    valid &= road_padded[road_positions + oy * padded_columns + ox]
+                positions = road_positions[valid]
+
+                crossed = [events_padded[positions + oy * padded_columns + ox] for ox, oy in offsets]
+                crossed = [event for event in crossed if event.any()]
+
+                for start_phase in range(PHASE_COUNT):
+                    phase = np.full(positions.size, start_phase, dtype=np.uint8)
+                    laps = np.zeros(positions.size, dtype=np.uint8)
+                    for event in crossed:
+                        phase[(event == EVENT_CP1) & (phase == PHASE_NONE)] = PHASE_CP1
+                        phase[(event == EVENT_CP2) & (phase == PHASE_CP1)] = PHASE_CP2
+                        at_finish = event == EVENT_FINISH
+                        laps += at_finish & (phase == PHASE_CP2)
+                        phase[at_finish] = PHASE_NONE
+
+                    self.transitions[valid, vx + max_speed, vy + max_speed, start_phase] = phase | (laps << 2)
+
+        self.flat = self.transitions.tobytes()
+
+    def cell_base(self, x, y):
+        cell = self.cell_lookup[y * self.columns + x]
+        if cell < 0:
+            return -1
+        return cell * self.speed_span * self.speed_span * PHASE_COUNT
+
+    def lookup(self, x, y, vx, vy, phase):
+        # Returns None when the move is outside the table and has to be traced instead
+        if not (-self.max_speed <= vx <= self.max_speed and -self.max_speed <= vy <= self.max_speed):
+            return None
+        base = self.cell_base(x, y)
+        if base < 0:
+            return INVALID_MOVE
+        return self.flat[base + ((vx + self.max_speed) * self.speed_span + vy + self.max_speed) * PHASE_COUNT + phase]
@@ -0,0 +1,66 @@
+# Search states packed into a single int, low bits first:
+# vy | vx | y | x | cp1 | cp2 | lap
+VELOCITY_BITS = 8
+COORD_BITS = 12
+
+VELOCITY_OFFSET = 1 << (VELOCITY_BITS - 1)
+VELOCITY_MASK = (1 << VELOCITY_BITS) - 1
+COORD_MASK = (1 << COORD_BITS) - 1
+# Largest track width or height a state can hold
+MAX_GRID_SIZE = 1 << COORD_BITS
+
+VY_SHIFT = 0
+VX_SHIFT = VY_SHIFT + VELOCITY_BITS
+Y_SHIFT = VX_SHIFT + VELOCITY_BITS
+X_SHIFT = Y_SHIFT + COORD_BITS
+CP1_SHIFT = X_SHIFT + COORD_BITS
+CP2_SHIFT = CP1_SHIFT + 1
+LAP_SHIFT = CP2_SHIFT + 1
+
+# cp1/cp2 bits as a two bit field, mapped to and from checkpoint phases 0-2
+FLAGS_MASK = 3
+PHASE_FROM_FLAGS = (0, 1, 1, 2)
+FLAGS_FROM_PHASE = (0, 1, 3)
+
+
+def pack_state(x, y, vx, vy, cp1, cp2, lap):
+    return ((lap << LAP_SHIFT) | (int(cp2) << CP2_SHIFT) | (int(cp1) << CP1_SHIFT) |
+            (x << X_SHIFT) | (y << Y_SHIFT) |
+            ((vx + VELOCITY_OFFSET) << VX_SHIFT) | ((vy + VELOCITY_OFFSET) << VY_SHIFT))
+
+
+def unpack_state(state):
+    return (
+        (state >> X_SHIFT) & COORD_MASK,
+        (state >> Y_SHIFT) & COORD_MASK,
+        ((state >> VX_SHIFT) & VELOCITY_MASK) - VELOCITY_OFFSET,
+        ((state >> VY_SHIFT) & VELOCITY_MASK) - VELOCITY_OFFSET,
+        bool((state >> CP1_SHIFT) & 1),
+        bool((state >> CP2_SHIFT) & 1),
+        state >> LAP_SHIFT
+    )
+
+
+def state_position(state):
+    return (state >> X_SHIFT) & COORD_MASK, (state >> Y_SHIFT) & COORD_MASK
+
+
+def state_phase(state):
+    return PHASE_FROM_FLAGS[(state >> CP1_SHIFT) & FLAGS_MASK]
+
+
+def state_lap(state):
+    return state >> LAP_SHIFT
+
+
+def reconstruct_states(came_from, state):
+    states = [state]
+    while state in came_from:
+        state = came_from[state]
+        states.append(state)
+    states.reverse()
+    return states
+
+
+def reconstruct_path(came_from, state):
+    return [state_position(s) for s in reconstruct_states(came_from, state)]
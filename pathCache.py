@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+
+CACHE_DIRECTORY_NAME = '.path_cache'
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+
+def track_hash(track_layout):
+    return hashlib.sha256(json.dumps(track_layout, separators=(',', ':')).encode()).hexdigest()
+
+
+def cache_directory_for(track_filename):
+    # Kept next to the track files so a track folder carries its own cache
+    return os.path.join(os.path.dirname(os.path.abspath(track_filename)), CACHE_DIRECTORY_NAME)
+
+
+class PathCache:
+    # Computed AI plans on disk, one JSON file per (track contents, start state, laps, planner).
+    # Entries are evicted least recently used first once the count or total size is exceeded.
+    def __init__(self, directory, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def make_key(self, layout_hash, start_state, laps, planner):
+        return hashlib.sha256(f"{layout_hash}:{start_state}:{laps}:{planner}".encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'r') as file:
+                entry = json.load(file)
+            # Touch the entry so eviction keeps recently raced tracks
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry.get('plan')
+
+    def put(self, key, plan, track_name, layout_hash):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.remove_stale(track_name, layout_hash)
+            path = self.entry_path(key)
+            temporary_path = path + '.tmp'
+            with open(temporary_path, 'w') as file:
+                json.dump({'track': track_name, 'track_hash': layout_hash, 'plan': plan}, file)
+            os.replace(temporary_path, path)
+            self.evict()
+        except OSError as error:
+            print(f"Could not write path cache: {error}")
+
+    def entries(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def remove_stale(self, track_name, layout_hash):
+        # Plans saved for an earlier version of this track can never be hit again
+        for _, _, path in self.entries():
+            try:
+                with open(path, 'r') as file:
+                    entry = json.load(file)
+                if entry.get('track') == track_name and entry.get('track_hash') != layout_hash:
+                    os.remove(path)
+            except (OSError, ValueError):
+                continue
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
@@ -0,0 +1,60 @@
+# Optimal single lap for the track creator's preview, planned the way the race plans the AI's
+# route: a move table and BFS distance heuristic, then the lap planner's A*. Tracks too large for
+# a move table are searched with exact A* over traced moves instead. Nothing here needs pygame.
+
+from anytimePlanner import AnytimePlanner
+from distanceField import DistanceHeuristic
+from lapPlanner import LapPlanner
+from moveTable import MoveTable, DEFAULT_MAX_SPEED, table_fits
+from packedState import pack_state, unpack_state, state_position, LAP_SHIFT
+from trackEngine import Track, bresenham_line
+
+
+def traced_successors(track):
+    def successors(state):
+        x, y, vx, vy, cp1, cp2, lap = unpack_state(state)
+        for dvx in (-1, 0, 1):
+            for dvy in (-1, 0, 1):
+                new_vx = vx + dvx
+                new_vy = vy + dvy
+                new_x = x + new_vx
+                new_y = y + new_vy
+                if not track.in_bounds(new_x, new_y):
+                    continue
+                transition = track.transition(x, y, new_x, new_y, cp1, cp2, lap)
+                if transition is not None:
+                    yield pack_state(new_x, new_y, new_vx, new_vy, *transition)
+    return successors
+
+
+def solve_racing_line(track_layout, progress=None, cancel=None, max_speed=DEFAULT_MAX_SPEED):
+    # Cells of the shortest lap from the first start tile in row order, or None if there is no
+    # way round or the solve was cancelled. track_layout must not change while this runs.
+    if cancel is not None and cancel.is_set():
+        return None
+    track = Track(track_layout)
+    if not track.start_positions or not track.checkpoint1_group or not track.checkpoint2_group:
+        return None
+    start_x, start_y = track.start_positions[0]
+    start_state = pack_state(start_x, start_y, 0, 0, False, False, 1)
+
+    if progress is not None:
+        progress['stage'] = "Precomputing track moves..."
+    heuristic = DistanceHeuristic(track_layout, track.checkpoint1_group, track.checkpoint2_group,
+                                  track.start_positions)
+    if table_fits(track.road_mask.road_cells, max_speed):
+        table = MoveTable(track_layout, track.checkpoint1_group, track.checkpoint2_group, track.start_finish_tile,
+                          bresenham_line, max_speed)
+        if progress is not None:
+            progress['stage'] = "Finding the racing line..."
+        plan = LapPlanner(track, table, heuristic).plan(start_state, 1, progress, cancel)
+    else:
+        if progress is not None:
+            progress['stage'] = "Finding the racing line..."
+        planner = AnytimePlanner(traced_successors(track), lambda state: heuristic.estimate_state(state, 1),
+                                 lambda state: state >> LAP_SHIFT > 1, (1.0,))
+        plan = next(planner.plans(start_state, progress=progress, cancel=cancel), (None, None))[0]
+
+    if not plan or (cancel is not None and cancel.is_set()):
+        return None
+    return [state_position(state) for state in plan]
@@ -0,0 +1,27 @@
+import numpy as np
+
+
+class RoadMask:
+    # One bit per cell, set where the tile can be driven on. Rows are padded to whole bytes,
+    # so a 1000x1000 track takes 125 KB and a cell is one byte lookup and a shift.
+    def __init__(self, track_layout, blocking_tiles=(0,)):
+        grid = np.asarray(track_layout, dtype=np.uint8)
+        self.rows, self.columns = grid.shape
+        road = ~np.isin(grid, blocking_tiles)
+        self.stride = (self.columns + 7) // 8
+        self.bits = np.packbits(road, axis=1).tobytes()
+        self.road_cells = int(np.count_nonzero(road))
+
+    def is_road(self, x, y):
+        return 0 <= x < self.columns and 0 <= y < self.rows and \
+            (self.bits[y * self.stride + (x >> 3)] >> (7 - (x & 7))) & 1 == 1
+
+    def is_clear(self, points):
+        bits = self.bits
+        stride = self.stride
+        columns = self.columns
+        rows = self.rows
+        for x, y in points:
+            if not (0 <= x < columns and 0 <= y < rows) or not (bits[y * stride + (x >> 3)] >> (7 - (x & 7))) & 1:
+                return False
+        return True
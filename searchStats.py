@@ -0,0 +1,124 @@
+# Instrumentation shared by the pathfinders. A pathfinder given a stats dict fills in the fields
+# below. The counters are plain integer additions, so they are always kept. Timing move
+# validation and open list operations adds two clock reads to every call, so it is only done
+# when the dict asks for it with 'timing': True.
+#
+# A pathfinder given a SearchBudget stops once it passes the budget's deadline or node limit and
+# returns a BudgetExceeded with the statistics so far, in place of a path.
+#
+# A pathfinder that cannot run on a track at all returns None with the reason in stats['skipped'],
+# so benchmarks report it as skipped rather than as a search that found no path.
+
+import math
+import time
+
+STAT_FIELDS = ['nodes_expanded', 'nodes_pushed', 'stale_pops', 'peak_open', 'peak_visited',
+               'validation_time', 'queue_time']
+
+STAT_LABELS = {
+    'nodes_expanded': "Expanded",
+    'nodes_pushed': "Pushed",
+    'stale_pops': "Stale pops",
+    'peak_open': "Peak open",
+    'peak_visited': "Peak visited",
+    'validation_time': "Validation (s)",
+    'queue_time': "Queue ops (s)"
+}
+
+
+def timed(function, stats, field):
+    clock = time.perf_counter
+
+    def timed_function(*args):
+        start = clock()
+        result = function(*args)
+        stats[field] += clock() - start
+        return result
+    return timed_function
+
+
+def instrument(stats, validate, *queue_operations):
+    # The move validation function and open list operations a search should call: the originals,
+    # or wrappers adding their time to stats when it asks for timing
+    if stats is None or not stats.get('timing'):
+        return (validate,) + queue_operations
+    stats['validation_time'] = 0.0
+    stats['queue_time'] = 0.0
+    return (timed(validate, stats, 'validation_time'),) + \
+        tuple(timed(operation, stats, 'queue_time') for operation in queue_operations)
+
+
+def record_stats(stats, expanded, pushed, stale, peak_open, visited):
+    # visited is the search's cost map, which only grows, so its final size is its peak
+    if stats is not None:
+        stats['nodes_expanded'] = expanded
+        stats['nodes_pushed'] = pushed
+        stats['stale_pops'] = stale
+        stats['peak_open'] = peak_open
+        stats['peak_visited'] = len(visited)
+
+
+# Expansions between clock reads when a search has a deadline
+BUDGET_CHECK_INTERVAL = 1024
+
+
+class SearchBudget:
+    # A wall clock deadline, as a time.perf_counter() value, and a limit on the nodes expanded.
+    # Either may be None.
+    def __init__(self, deadline=None, max_nodes=None):
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+
+    def exceeded(self, expanded):
+        # Why a search that has expanded this many nodes must stop, or None
+        if self.max_nodes is not None and expanded >= self.max_nodes:
+            return "node budget"
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return "timeout"
+        return None
+
+
+class BudgetExceeded:
+    # Returned in place of a path. It is false, like the None of a search that found no path,
+    # so callers that only test the result need no changes.
+    def __init__(self, reason, stats):
+        self.reason = reason
+        self.stats = stats
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"BudgetExceeded({self.reason!r}, {self.stats!r})"
+
+
+def search_budget(seconds=None, max_nodes=None):
+    # A budget starting now, or None when there is no limit
+    if seconds is None and max_nodes is None:
+        return None
+    return SearchBudget(None if seconds is None else time.perf_counter() + seconds, max_nodes)
+
+
+def next_budget_check(budget, expanded):
+    # The expansion count at which a search should next ask budget.exceeded(), so the clock is
+    # only read every BUDGET_CHECK_INTERVAL expansions and an unlimited search never asks
+    if budget is None:
+        return math.inf
+    check = expanded + BUDGET_CHECK_INTERVAL if budget.deadline is not None else math.inf
+    if budget.max_nodes is not None:
+        check = min(check, budget.max_nodes)
+    return check
+
+
+def search_skipped(reason, stats):
+    if stats is not None:
+        stats['skipped'] = reason
+    return None
+
+
+def budget_exceeded(reason, stats, expanded, pushed, stale, peak_open, visited):
+    # The statistics so far go in stats, or a new dict, and on the result
+    if stats is None:
+        stats = {}
+    record_stats(stats, expanded, pushed, stale, peak_open, visited)
+    return BudgetExceeded(reason, stats)
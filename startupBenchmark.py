@@ -0,0 +1,116 @@
+# Startup benchmark: how long each module takes to import, whether importing it opens a
+# window, and how long main.py takes from launch to its first menu frame. Every sample runs
+# in a fresh interpreter so nothing is already imported.
+#
+# Usage:
+#   python startupBenchmark.py --runs 5 --output startup_results.json
+#   python startupBenchmark.py --headless      uses SDL's dummy video driver
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = [
+    "trackEngine",
+    "heuristicTesting",
+    "dataStructureTesting",
+    "trackCreatorCheckpoints",
+    "RaceAgainstAIv2",
+    "main"
+]
+
+# Each sample prints its timings as JSON on its last line
+INTERPRETER_SAMPLE = "print('{}')"
+
+IMPORT_SAMPLE = """
+import json, sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+import_time = time.perf_counter() - start
+import pygame
+print(json.dumps({"import": import_time, "window_opened": pygame.display.get_surface() is not None}))
+"""
+
+MENU_SAMPLE = """
+import json, time
+start = time.perf_counter()
+import main
+import_time = time.perf_counter() - start
+import pygame
+window_opened = pygame.display.get_surface() is not None
+window = main.app.open_window("Racetrack Game Menu")
+main.draw_menu(window, main.create_menu_buttons())
+first_frame = time.perf_counter() - start
+main.app.close()
+print(json.dumps({"import": import_time, "first_frame": first_frame, "window_opened": window_opened}))
+"""
+
+
+def run_sample(code, args, env):
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', code] + args, env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall_time = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise SystemExit(f"Sample failed:\n{completed.stderr}")
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    sample["process"] = wall_time
+    return sample
+
+
+def summarise(samples, key):
+    values = [sample[key] for sample in samples]
+    return {
+        "median_ms": statistics.median(values) * 1000,
+        "min_ms": min(values) * 1000,
+        "max_ms": max(values) * 1000
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import cost and time to the first menu frame.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--modules', nargs='*', default=MODULES)
+    parser.add_argument('--headless', action='store_true', help="Use SDL's dummy video driver")
+    parser.add_argument('--output', default=None, help="Also write the results to this .json file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    if args.headless:
+        env['SDL_VIDEODRIVER'] = 'dummy'
+
+    results = {"runs": args.runs, "interpreter": summarise(
+        [run_sample(INTERPRETER_SAMPLE, [], env) for run in range(args.runs)], "process")}
+    print(f"{'interpreter':<26}{results['interpreter']['median_ms']:>10.1f} ms process")
+
+    results["imports"] = {}
+    for module in args.modules:
+        samples = [run_sample(IMPORT_SAMPLE, [module], env) for run in range(args.runs)]
+        results["imports"][module] = dict(summarise(samples, "import"),
+                                          window_opened=any(sample["window_opened"] for sample in samples))
+        print(f"{module:<26}{results['imports'][module]['median_ms']:>10.1f} ms import"
+              f"{'   opens a window' if results['imports'][module]['window_opened'] else ''}")
+
+    samples = [run_sample(MENU_SAMPLE, [], env) for run in range(args.runs)]
+    results["menu"] = {
+        "import": summarise(samples, "import"),
+        "first_frame": summarise(samples, "first_frame"),
+        "process": summarise(samples, "process"),
+        "window_opened_on_import": any(sample["window_opened"] for sample in samples)
+    }
+    print(f"{'menu first frame':<26}{results['menu']['first_frame']['median_ms']:>10.1f} ms "
+          f"({results['menu']['process']['median_ms']:.1f} ms process)")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bucketQueue import BucketQueue
+
+
+def test_pops_lowest_bucket_then_largest_g():
+    queue = BucketQueue()
+    for priority, g, item in ((5, 2, 'a'), (3, 1, 'b'), (3, 3, 'c'), (4, 0, 'd'), (3, 2, 'e')):
+        queue.push(priority, g, item)
+    assert len(queue) == 5
+    assert [queue.pop()[2] for _ in range(5)] == ['c', 'e', 'b', 'd', 'a']
+    assert len(queue) == 0
+    with pytest.raises(IndexError):
+        queue.pop()
+
+
+def test_push_below_the_minimum_is_popped_next():
+    queue = BucketQueue()
+    queue.push(6, 0, 'late')
+    assert queue.pop() == (6, 0, 'late')
+    queue.push(8, 1, 'later')
+    queue.push(2, 1, 'early')
+    assert queue.pop()[2] == 'early'
+    assert queue.pop()[2] == 'later'
+
+
+def test_float_priorities_are_bucketed_down():
+    queue = BucketQueue(4)
+    queue.push(1.6, 1, 'a')
+    queue.push(1.55, 0, 'b')
+    queue.push(1.2, 0, 'c')
+    # 1.6 and 1.55 share the bucket [1.5, 1.75), so the larger g goes first
+    assert [queue.pop() for _ in range(3)] == [(4, 0, 'c'), (6, 1, 'a'), (6, 0, 'b')]
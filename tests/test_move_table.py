@@ -0,0 +1,39 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from moveTable import MoveTable, INVALID_MOVE, PHASE_NONE, PHASE_CP1, PHASE_CP2, phase_from_flags
+from trackEngine import Track, bresenham_line
+
+PHASE_FLAGS = {PHASE_NONE: (False, False), PHASE_CP1: (True, False), PHASE_CP2: (True, True)}
+
+
+@pytest.mark.parametrize('name', ['loop.json', 'thinloop.json'])
+def test_move_table_matches_traced_moves(name):
+    with open(os.path.join(ROOT, name)) as file:
+        layout = json.load(file)
+    track = Track(layout)
+    max_speed = 4
+    table = MoveTable(layout, track.checkpoint1_group, track.checkpoint2_group, track.start_finish_tile,
+                      bresenham_line, max_speed)
+    for y in range(track.rows):
+        for x in range(track.columns):
+            if table.cell_base(x, y) < 0:
+                continue
+            for vx in range(-max_speed, max_speed + 1):
+                for vy in range(-max_speed, max_speed + 1):
+                    for phase, (cp1, cp2) in PHASE_FLAGS.items():
+                        code = table.lookup(x, y, vx, vy, phase)
+                        transition = track.transition(x, y, x + vx, y + vy, cp1, cp2, 1)
+                        if transition is None:
+                            assert code == INVALID_MOVE
+                        else:
+                            new_cp1, new_cp2, lap = transition
+                            assert code & 3 == phase_from_flags(new_cp1, new_cp2)
+                            assert code >> 2 == lap - 1
+    assert table.lookup(0, 0, max_speed + 1, 0, PHASE_NONE) is None
@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from trackEngine import open_track
+from trackFormat import TrackFormatError, json_to_track, read_track, write_track
+
+TRACKS = ['loop.json', 'long.json', 'wideloop.json', 'thinloop.json']
+
+
+@pytest.mark.parametrize('name', TRACKS)
+def test_track_file_round_trip(tmp_path, name):
+    with open(os.path.join(ROOT, name)) as file:
+        layout = json.load(file)
+    filename = str(tmp_path / "track.track")
+    write_track(filename, layout)
+    track = read_track(filename)
+    assert track.layout() == layout
+
+    # A track loaded from the binary file behaves like one loaded from the .json
+    expected = open_track(os.path.join(ROOT, name))
+    loaded = open_track(json_to_track(os.path.join(ROOT, name), filename))
+    assert loaded.layout == expected.layout
+    for attr in ('checkpoint1_group', 'checkpoint2_group', 'start_positions', 'cp1_centroid', 'cp2_centroid',
+                 'finish_centroid'):
+        assert getattr(loaded, attr) == getattr(expected, attr)
+    for y in range(expected.rows):
+        for x in range(expected.columns):
+            assert loaded.in_group((x, y), loaded.checkpoint1_label) == \
+                expected.in_group((x, y), expected.checkpoint1_label)
+            assert loaded.in_group((x, y), loaded.checkpoint2_label) == \
+                expected.in_group((x, y), expected.checkpoint2_label)
+
+
+@pytest.mark.parametrize('size', [10, 70, 200, -1])
+def test_truncated_track_file_is_rejected(tmp_path, size):
+    filename = str(tmp_path / "loop.track")
+    json_to_track(os.path.join(ROOT, 'loop.json'), filename)
+    with open(filename, 'rb') as file:
+        data = file.read()
+    with open(filename, 'wb') as file:
+        file.write(data[:size])
+    with pytest.raises(TrackFormatError):
+        read_track(filename)
+
+
+def test_track_file_keeps_missing_checkpoints_empty(tmp_path):
+    layout = np.ones((6, 8), dtype=np.uint8)
+    layout[2, 1:3] = 2
+    filename = str(tmp_path / "open.track")
+    write_track(filename, layout)
+    track = read_track(filename)
+    assert track.checkpoint1_group == [] and track.checkpoint2_group == []
+    assert track.cp1_centroid is None and track.finish_centroid == (1.5, 2.0)
+    assert open_track(filename).checkpoint1_label == -1
@@ -0,0 +1,45 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trackGroups import TrackGroups
+
+
+def summary(groups):
+    return (groups.group_counts, groups.large_counts, {tile: groups.largest(tile) for tile in groups.tiles},
+            groups.checkpoints_touch(), groups.problem())
+
+
+def test_paint_joins_and_splits_groups():
+    layout = [[1] * 9 for _ in range(3)]
+    groups = TrackGroups(layout)
+    groups.paint([10, 11], 3)
+    groups.paint([14, 15], 3)
+    assert groups.group_counts[3] == 2 and groups.largest(3) == 2
+
+    # Filling the gap joins them into one group of 6
+    assert groups.paint([12, 13, 13], 3) == [12, 13]
+    assert groups.group_counts[3] == 1 and groups.large_counts[3] == 1 and groups.largest(3) == 6
+
+    # Painting over the middle splits it again
+    groups.paint([12], 1)
+    assert groups.group_counts[3] == 2 and groups.large_counts[3] == 0 and groups.largest(3) == 3
+    assert groups.paint([12], 1) == []
+
+
+def test_paint_matches_groups_built_from_scratch():
+    # Random brush strokes, checked against groups found from the whole layout after each one
+    rng = random.Random(7)
+    columns, rows = 14, 10
+    layout = [[1] * columns for _ in range(rows)]
+    groups = TrackGroups(layout)
+    for _ in range(300):
+        x = rng.randrange(columns)
+        y = rng.randrange(rows)
+        size = rng.choice((1, 1, 2, 3))
+        cells = [row * columns + column for row in range(y, min(rows, y + size))
+                 for column in range(x, min(columns, x + size))]
+        groups.paint(cells, rng.choice((0, 1, 2, 3, 3, 4, 4)))
+        assert summary(groups) == summary(TrackGroups([row[:] for row in layout]))
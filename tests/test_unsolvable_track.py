@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from packedState import pack_state
+from RaceAgainstAIv2 import Game
+
+
+def split_track(path):
+    # A column of out of bounds tiles keeps the start from both checkpoints
+    layout = [[1] * 12 for _ in range(8)]
+    for y in range(8):
+        layout[y][6] = 0
+    for y in range(2, 6):
+        layout[y][1] = 2
+        layout[y][8] = 3
+        layout[y][10] = 4
+    with open(path, 'w') as file:
+        json.dump(layout, file)
+
+
+def test_unsolvable_track_has_no_plan(tmp_path):
+    filename = str(tmp_path / "split.json")
+    split_track(filename)
+    game = Game()
+    game.use_path_cache = False
+    game.use_anytime_planner = False
+    game.load_track(filename)
+    try:
+        game.plan_future.exception()
+        assert game.compute_optimal_plan(pack_state(3, 3, 0, 0, False, False, 1)) is None
+    finally:
+        game.stop_planning()
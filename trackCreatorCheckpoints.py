@@ -5,19 +5,33 @@ import pygame
 import sys
 import json
 import os
-
-# Initialize Pygame
-pygame.init()
-
-# Window Configuration
-WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 720
-game_window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Racetrack Circuit Creator")
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from trackFormat import is_track_file, label_groups, TrackFormatError
+from trackEngine import open_track
+from trackGroups import TrackGroups
+from racingLine import solve_racing_line
+from appContext import get_app_context, WINDOW_WIDTH, WINDOW_HEIGHT
+
+# Window, clock and fonts are set up by main(), importing the module opens nothing
+game_window = None
+game_clock = None
+info_font = None
+header_font = None
 
 # Grid Settings
 GRID_CELL_SIZE = 20
+# Cells that fit in the window, and the size of a new track. Loaded tracks keep their own size.
 GRID_COLUMNS = WINDOW_WIDTH // GRID_CELL_SIZE
 GRID_ROWS = WINDOW_HEIGHT // GRID_CELL_SIZE
+# Cells the view moves per arrow key press
+CAMERA_STEP = 8
+
+# Pause after the last edit before the AI preview solves the track again
+PREVIEW_DELAY_MS = 400
+# Shorter GIL switch interval while a preview solve runs, so the editor keeps 60 FPS
+PREVIEW_SWITCH_INTERVAL = 0.001
 
 # Color Definitions
 WHITE = (255, 255, 255)
@@ -26,6 +40,7 @@ GRAY = (160, 160, 160)
 RED = (255, 0, 0)
 BLUE = (0, 0, 255)
 GREEN = (0, 200, 0)
+ORANGE = (255, 165, 0)
 YELLOW = (255, 255, 0)
 PURPLE = (128, 0, 128)  
 LIGHT_GRAY = (220, 220, 220)
@@ -50,6 +65,10 @@ TILE_COLOR_MAPPING = {
 
 # Editor State
 track_layout = [[TRACK_TILE_TYPES['road'] for column in range(GRID_COLUMNS)] for row in range(GRID_ROWS)]
+grid_columns = GRID_COLUMNS
+grid_rows = GRID_ROWS
+camera_column = 0
+camera_row = 0
 selected_tile_type = TRACK_TILE_TYPES['road']
 is_editing_mode = True
 brush_size = 1
@@ -64,10 +83,31 @@ status_message = ""
 status_message_duration = 0
 should_show_instructions = True
 
+# Pre-rendered tiles in view, repainted a cell at a time as the brush edits them
+track_surface = None
+
+# Finish and checkpoint groups, updated as the brush paints, why the layout cannot be saved yet
+# (checked once per edit) and their rendered summary
+track_groups = None
+track_problem = None
+group_status_surface = None
+
+# AI racing line preview, solved on a background thread after each pause in editing. An edit
+# cancels the solve in flight, so at most one solve is ever running.
+is_preview_enabled = False
+preview_executor = None
+preview_future = None
+preview_cancel = threading.Event()
+preview_progress = {}
+preview_line = None
+preview_edit_time = 0
+preview_needs_solve = False
+default_switch_interval = sys.getswitchinterval()
+
 def get_available_tracks():
     tracks = []
     for file in os.listdir():
-        if file.endswith('.json'):
+        if is_track_file(file):
             tracks.append(file)
     return tracks
 
@@ -111,11 +151,16 @@ def handle_save_confirmation():
     save_overwrite_confirm = False
 
 def handle_track_selection(track_name):
-    global track_layout, status_message, status_message_duration, is_load_dialog_active
+    global track_layout, status_message, status_message_duration, is_load_dialog_active, track_surface
+    global grid_columns, grid_rows, camera_column, camera_row
     
     try:
-        with open(track_name, 'r') as file:
-            track_layout = json.load(file)
+        track = open_track(track_name)
+        track_layout = track.layout
+        grid_columns, grid_rows = track.columns, track.rows
+        camera_column = camera_row = 0
+        track_surface = None
+        reset_track_groups()
         status_message = f"Track loaded from {track_name}"
         status_message_duration = 180
         print(status_message)
@@ -123,17 +168,169 @@ def handle_track_selection(track_name):
         status_message = f"File {track_name} not found."
         status_message_duration = 180
         print(status_message)
+    except TrackFormatError as error:
+        status_message = str(error)
+        status_message_duration = 180
+        print(status_message)
     
     is_load_dialog_active = False
 
+def draw_tile(row, column):
+    tile_value = track_layout[row][column]
+    tile_color = TILE_COLOR_MAPPING.get(tile_value, WHITE)
+    tile_rect = pygame.Rect((column - camera_column) * GRID_CELL_SIZE, (row - camera_row) * GRID_CELL_SIZE,
+                            GRID_CELL_SIZE, GRID_CELL_SIZE)
+    pygame.draw.rect(track_surface, tile_color, tile_rect)
+    pygame.draw.rect(track_surface, BLACK, tile_rect, 1)
+
 def draw_track_grid():
-    for row in range(GRID_ROWS):
-        for column in range(GRID_COLUMNS):
-            tile_value = track_layout[row][column]
-            tile_color = TILE_COLOR_MAPPING.get(tile_value, WHITE)
-            tile_rect = pygame.Rect(column * GRID_CELL_SIZE, row * GRID_CELL_SIZE, GRID_CELL_SIZE, GRID_CELL_SIZE)
-            pygame.draw.rect(game_window, tile_color, tile_rect)
-            pygame.draw.rect(game_window, BLACK, tile_rect, 1)
+    global track_surface
+    if track_surface is None:
+        track_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
+        track_surface.fill(DARK_GRAY)
+        for row in range(camera_row, min(grid_rows, camera_row + GRID_ROWS)):
+            for column in range(camera_column, min(grid_columns, camera_column + GRID_COLUMNS)):
+                draw_tile(row, column)
+    game_window.blit(track_surface, (0, 0))
+
+def move_camera(column_step, row_step):
+    global camera_column, camera_row, track_surface
+    new_column = max(0, min(camera_column + column_step, grid_columns - GRID_COLUMNS))
+    new_row = max(0, min(camera_row + row_step, grid_rows - GRID_ROWS))
+    if (new_column, new_row) != (camera_column, camera_row):
+        camera_column, camera_row = new_column, new_row
+        track_surface = None
+
+def paint_brush(mouse_position):
+    global track_problem, group_status_surface
+    grid_column = mouse_position[0] // GRID_CELL_SIZE + camera_column
+    grid_row = mouse_position[1] // GRID_CELL_SIZE + camera_row
+    brush_radius = brush_size // 2
+    brush_cells = []
+    for row_offset in range(-brush_radius, brush_radius + 1):
+        for column_offset in range(-brush_radius, brush_radius + 1):
+            modified_column = grid_column + column_offset
+            modified_row = grid_row + row_offset
+            if 0 <= modified_column < grid_columns and 0 <= modified_row < grid_rows:
+                brush_cells.append(modified_row * grid_columns + modified_column)
+    
+    changed_cells = track_groups.paint(brush_cells, selected_tile_type)
+    if changed_cells:
+        track_problem = track_groups.problem()
+        group_status_surface = None
+        mark_preview_stale()
+    if track_surface is not None:
+        for cell in changed_cells:
+            draw_tile(cell // grid_columns, cell % grid_columns)
+
+def reset_track_groups():
+    global track_groups, track_problem, group_status_surface
+    track_groups = TrackGroups(track_layout, TRACK_TILE_TYPES['start_finish_line'], TRACK_TILE_TYPES['checkpoint1'],
+                               TRACK_TILE_TYPES['checkpoint2'])
+    track_problem = track_groups.problem()
+    group_status_surface = None
+    mark_preview_stale()
+
+def mark_preview_stale():
+    # Drops the current line and cancels the solve in flight, a new one starts after the next pause
+    global preview_line, preview_edit_time, preview_needs_solve
+    cancel_preview()
+    preview_line = None
+    preview_edit_time = pygame.time.get_ticks()
+    preview_needs_solve = True
+
+def cancel_preview():
+    global preview_future
+    if preview_future is not None:
+        preview_cancel.set()
+        preview_future.cancel()
+        preview_future = None
+        sys.setswitchinterval(default_switch_interval)
+
+def update_preview():
+    # Collects a finished solve, or starts one once editing has paused on a layout that can be saved
+    global preview_future, preview_cancel, preview_progress, preview_line, preview_needs_solve
+    if preview_future is not None and preview_future.done():
+        future = preview_future
+        preview_future = None
+        sys.setswitchinterval(default_switch_interval)
+        preview_line = future.result() or []
+    
+    if not is_preview_enabled or not preview_needs_solve or preview_future is not None or \
+       pygame.time.get_ticks() - preview_edit_time < PREVIEW_DELAY_MS:
+        return
+    preview_needs_solve = False
+    if track_problem is not None:
+        return
+    
+    # The solve gets its own copy, so painting can carry on while it runs
+    preview_cancel = threading.Event()
+    preview_progress = {}
+    sys.setswitchinterval(PREVIEW_SWITCH_INTERVAL)
+    preview_future = preview_executor.submit(solve_racing_line, [row[:] for row in track_layout],
+                                             preview_progress, preview_cancel)
+
+def toggle_preview():
+    global is_preview_enabled, preview_needs_solve
+    is_preview_enabled = not is_preview_enabled
+    if is_preview_enabled:
+        preview_needs_solve = preview_line is None
+    else:
+        cancel_preview()
+
+def draw_preview_line():
+    if not is_preview_enabled or not preview_line:
+        return
+    points = [((column - camera_column) * GRID_CELL_SIZE + GRID_CELL_SIZE // 2,
+               (row - camera_row) * GRID_CELL_SIZE + GRID_CELL_SIZE // 2) for column, row in preview_line]
+    pygame.draw.lines(game_window, ORANGE, False, points, 2)
+    for point in points[1:]:
+        pygame.draw.circle(game_window, ORANGE, point, 3)
+
+def draw_preview_status():
+    if not is_preview_enabled:
+        return
+    if preview_future is not None:
+        text = f"{preview_progress.get('stage', 'Finding the racing line...')} " \
+               f"{preview_progress.get('expanded', 0)} states searched"
+    elif preview_line:
+        text = f"AI lap: {len(preview_line) - 1} moves"
+    elif preview_line is not None:
+        text = "AI preview: no way round the track"
+    elif track_problem is not None:
+        text = "AI preview: waiting for a valid track"
+    else:
+        text = "AI preview: waiting for editing to pause"
+    message_surface = info_font.render(text, True, ORANGE)
+    background = pygame.Surface((message_surface.get_width() + 20, message_surface.get_height() + 10), pygame.SRCALPHA)
+    background.fill((0, 0, 0, 180))
+    background.blit(message_surface, (10, 5))
+    game_window.blit(background, (15, 15 + group_status_surface.get_height() + 5))
+
+def draw_group_status():
+    # Rendered again only after an edit, so showing it every frame costs a blit
+    global group_status_surface
+    if group_status_surface is None:
+        lines = []
+        for name, tile_type in (("Start/Finish", 'start_finish_line'), ("Checkpoint 1", 'checkpoint1'),
+                                ("Checkpoint 2", 'checkpoint2')):
+            tile = TRACK_TILE_TYPES[tile_type]
+            lines.append((f"{name}: {track_groups.group_counts[tile]} groups, "
+                          f"{track_groups.large_counts[tile]} with 4+, largest {track_groups.largest(tile)}", WHITE))
+        lines.append(("Ready to save" if track_problem is None else track_problem,
+                      GREEN if track_problem is None else YELLOW))
+        
+        padding = 10
+        rendered = [info_font.render(text, True, color) for text, color in lines]
+        group_status_surface = pygame.Surface((max(line.get_width() for line in rendered) + padding * 2,
+                                               sum(line.get_height() + 4 for line in rendered) + padding * 2),
+                                              pygame.SRCALPHA)
+        group_status_surface.fill((0, 0, 0, 180))
+        vertical_offset = padding
+        for line in rendered:
+            group_status_surface.blit(line, (padding, vertical_offset))
+            vertical_offset += line.get_height() + 4
+    game_window.blit(group_status_surface, (15, 15))
 
 def draw_save_dialog():
     overlay = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
@@ -270,68 +467,32 @@ def draw_load_dialog():
     return button_rects, cancel_button_rect
 
 def validate_track_layout():
-    start_finish_groups = find_all_connected_groups(TRACK_TILE_TYPES['start_finish_line'])
-    if not any(len(group) >= 4 for group in start_finish_groups):
+    # One labelling pass finds every finish and checkpoint group, then groups of 4+ tiles are
+    # counted and adjacent cells compared by label
+    finish_tile = TRACK_TILE_TYPES['start_finish_line']
+    checkpoint1_tile = TRACK_TILE_TYPES['checkpoint1']
+    checkpoint2_tile = TRACK_TILE_TYPES['checkpoint2']
+    labels, group_tiles = label_groups(np.asarray(track_layout, dtype=np.uint8),
+                                       (finish_tile, checkpoint1_tile, checkpoint2_tile))
+    large = np.bincount(labels.ravel(), minlength=len(group_tiles)) >= 4
+    large[0] = False
+    if not (large & (group_tiles == finish_tile)).any():
         return False
     
-    checkpoint1_groups = find_all_connected_groups(TRACK_TILE_TYPES['checkpoint1'])
-    checkpoint2_groups = find_all_connected_groups(TRACK_TILE_TYPES['checkpoint2'])
-    
-    valid_checkpoint1_groups = [group for group in checkpoint1_groups if len(group) >= 4]
-    valid_checkpoint2_groups = [group for group in checkpoint2_groups if len(group) >= 4]
-    
-    if not valid_checkpoint1_groups or not valid_checkpoint2_groups:
+    # 1 for a large checkpoint 1 group's label, 2 for a large checkpoint 2 group's
+    kinds = np.zeros(len(group_tiles), dtype=np.uint8)
+    kinds[large & (group_tiles == checkpoint1_tile)] = 1
+    kinds[large & (group_tiles == checkpoint2_tile)] = 2
+    if not (kinds == 1).any() or not (kinds == 2).any():
         return False
     
-    for checkpoint1_group in valid_checkpoint1_groups:
-        for checkpoint2_group in valid_checkpoint2_groups:
-            if are_groups_adjacent(checkpoint1_group, checkpoint2_group):
-                return False
+    # Neighbouring cells from a large checkpoint 1 and a large checkpoint 2 group multiply to 2
+    cell_kinds = kinds[labels]
+    if (cell_kinds[:, :-1] * cell_kinds[:, 1:] == 2).any() or (cell_kinds[:-1, :] * cell_kinds[1:, :] == 2).any():
+        return False
     
     return True
 
-def find_all_connected_groups(target_tile_type):
-    visited_tiles = [[False for column in range(GRID_COLUMNS)] for row in range(GRID_ROWS)]
-    connected_groups = []
-    for row in range(GRID_ROWS):
-        for column in range(GRID_COLUMNS):
-            if track_layout[row][column] == target_tile_type and not visited_tiles[row][column]:
-                group = find_connected_tiles((column, row), target_tile_type, visited_tiles)
-                connected_groups.append(group)
-    return connected_groups
-
-def find_connected_tiles(start_position, target_tile_type, visited_flags):
-    search_queue = [start_position]
-    connected_tiles = []
-    while search_queue:
-        current_column, current_row = search_queue.pop(0)
-        if visited_flags[current_row][current_column]:
-            continue
-        visited_flags[current_row][current_column] = True
-        if track_layout[current_row][current_column] == target_tile_type:
-            connected_tiles.append((current_column, current_row))
-            for column_offset, row_offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                neighbor_column = current_column + column_offset
-                neighbor_row = current_row + row_offset
-                if 0 <= neighbor_column < GRID_COLUMNS and 0 <= neighbor_row < GRID_ROWS:
-                    if not visited_flags[neighbor_row][neighbor_column] and track_layout[neighbor_row][neighbor_column] == target_tile_type:
-                        search_queue.append((neighbor_column, neighbor_row))
-    return connected_tiles
-
-def are_groups_adjacent(first_group, second_group):
-    for (column, row) in first_group:
-        for column_offset, row_offset in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-            adjacent_column = column + column_offset
-            adjacent_row = row + row_offset
-            if (adjacent_column, adjacent_row) in second_group:
-                return True
-    return False
-
-game_clock = pygame.time.Clock()
-
-info_font = pygame.font.SysFont(None, 24)
-header_font = pygame.font.SysFont(None, 36)
-
 instruction_lines = [
     "Instructions:",
     "",
@@ -340,6 +501,8 @@ instruction_lines = [
     "Load Track: Press 'L'",
     "Increase Brush Size: Press '+'",
     "Decrease Brush Size: Press '-'",
+    "Scroll Large Tracks: Arrow Keys",
+    "Toggle AI Racing Line Preview: Press 'P'",
     "Select Tile Type:",
     "  1: Out of Bounds",
     "  2: Road",
@@ -409,10 +572,12 @@ def draw_status_message():
         # Draw the message on top
         game_window.blit(message_surface, (padding, WINDOW_HEIGHT - 35 - padding))
 
-def main():
+def main(app=None):
+    global game_window, game_clock, info_font, header_font
     global editor_running, is_save_dialog_active, save_overwrite_confirm, is_load_dialog_active, status_message
     global status_message_duration, should_show_instructions, is_editing_mode, is_drawing_active
-    global brush_size, selected_tile_type, input_text, track_layout
+    global brush_size, selected_tile_type, input_text, track_layout, track_surface
+    global grid_columns, grid_rows, camera_column, camera_row, is_preview_enabled, preview_executor
 
     editor_running = True
     is_save_dialog_active = False
@@ -426,7 +591,19 @@ def main():
     brush_size = 1
     is_drawing_active = False
     selected_tile_type = TRACK_TILE_TYPES['road']
-    track_layout = [[TRACK_TILE_TYPES['road'] for column in range(GRID_COLUMNS)] for row in range(GRID_ROWS)]
+    grid_columns, grid_rows = GRID_COLUMNS, GRID_ROWS
+    camera_column = camera_row = 0
+    track_layout = [[TRACK_TILE_TYPES['road'] for column in range(grid_columns)] for row in range(grid_rows)]
+    track_surface = None
+    is_preview_enabled = False
+    preview_executor = ThreadPoolExecutor(max_workers=1)
+    reset_track_groups()
+
+    app = app or get_app_context()
+    game_window = app.open_window("Racetrack Circuit Creator")
+    game_clock = app.clock
+    info_font = pygame.font.SysFont(None, 24)
+    header_font = pygame.font.SysFont(None, 36)
 
     while editor_running:
         game_clock.tick(60)
@@ -461,6 +638,8 @@ def main():
                         save_racetrack()
                     elif event.key == pygame.K_l:
                         load_racetrack()
+                    elif event.key == pygame.K_p:
+                        toggle_preview()
                     elif event.key == pygame.K_1:
                         selected_tile_type = TRACK_TILE_TYPES['out_of_bounds']
                     elif event.key == pygame.K_2:
@@ -475,6 +654,14 @@ def main():
                         brush_size = min(10, brush_size + 1)
                     elif event.key in (pygame.K_MINUS, pygame.K_UNDERSCORE):
                         brush_size = max(1, brush_size - 1)
+                    elif event.key == pygame.K_LEFT:
+                        move_camera(-CAMERA_STEP, 0)
+                    elif event.key == pygame.K_RIGHT:
+                        move_camera(CAMERA_STEP, 0)
+                    elif event.key == pygame.K_UP:
+                        move_camera(0, -CAMERA_STEP)
+                    elif event.key == pygame.K_DOWN:
+                        move_camera(0, CAMERA_STEP)
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:  
                 if is_save_dialog_active:
                     save_button, cancel_button = draw_save_dialog()
@@ -494,42 +681,29 @@ def main():
                                 break
                 elif is_editing_mode and not should_show_instructions:
                     is_drawing_active = True
-                    mouse_x, mouse_y = pygame.mouse.get_pos()
-                    grid_column = mouse_x // GRID_CELL_SIZE
-                    grid_row = mouse_y // GRID_CELL_SIZE
-                    brush_radius = brush_size // 2
-                    for row_offset in range(-brush_radius, brush_radius + 1):
-                        for column_offset in range(-brush_radius, brush_radius + 1):
-                            modified_column = grid_column + column_offset
-                            modified_row = grid_row + row_offset
-                            if 0 <= modified_column < GRID_COLUMNS and 0 <= modified_row < GRID_ROWS:
-                                track_layout[modified_row][modified_column] = selected_tile_type
+                    paint_brush(pygame.mouse.get_pos())
             elif event.type == pygame.MOUSEBUTTONUP and is_editing_mode:
                 is_drawing_active = False
             elif event.type == pygame.MOUSEMOTION and is_editing_mode and is_drawing_active and not should_show_instructions:
-                mouse_x, mouse_y = pygame.mouse.get_pos()
-                grid_column = mouse_x // GRID_CELL_SIZE
-                grid_row = mouse_y // GRID_CELL_SIZE
-                brush_radius = brush_size // 2
-                for row_offset in range(-brush_radius, brush_radius + 1):
-                    for column_offset in range(-brush_radius, brush_radius + 1):
-                        modified_column = grid_column + column_offset
-                        modified_row = grid_row + row_offset
-                        if 0 <= modified_column < GRID_COLUMNS and 0 <= modified_row < GRID_ROWS:
-                            track_layout[modified_row][modified_column] = selected_tile_type
+                paint_brush(pygame.mouse.get_pos())
 
         if status_message_duration > 0:
             status_message_duration -= 1
         else:
             status_message = ""
+        
+        update_preview()
 
         game_window.fill(WHITE)
         draw_track_grid()
+        draw_preview_line()
 
         if should_show_instructions:
             draw_instruction_panel()
         else:
             draw_help_hint()
+            draw_group_status()
+            draw_preview_status()
 
         if is_save_dialog_active:
             draw_save_dialog()
@@ -540,6 +714,8 @@ def main():
 
         pygame.display.update()
     
+    cancel_preview()
+    preview_executor.shutdown(wait=False)
     return True  
 
 if __name__ == "__main__":
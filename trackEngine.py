@@ -0,0 +1,245 @@
+# Track rules shared by the race, the track creator, the testing modules and the benchmarks:
+# loading, line tracing, move validation and checkpoint transitions. Nothing here needs pygame.
+
+from functools import lru_cache
+
+import numpy as np
+
+from packedState import MAX_GRID_SIZE
+from roadMask import RoadMask
+from trackFormat import (load_track_data, label_groups, first_group_label, group_cells, centroid,
+                         OUT_OF_BOUNDS_TILE, ROAD_TILE, START_FINISH_TILE, CHECKPOINT1_TILE, CHECKPOINT2_TILE)
+
+TILE_TYPES = {
+    'out_of_bounds': OUT_OF_BOUNDS_TILE,
+    'road': ROAD_TILE,
+    'start_finish': START_FINISH_TILE,
+    'checkpoint1': CHECKPOINT1_TILE,
+    'checkpoint2': CHECKPOINT2_TILE
+}
+
+
+@lru_cache(maxsize=4096)
+def line_offsets(dx, dy):
+    # The traced cells only depend on the move's offset, so each offset is traced once.
+    # Integer form of an error term starting at half the long axis.
+    ax = abs(dx)
+    ay = abs(dy)
+    sx = -1 if dx < 0 else 1
+    sy = -1 if dy < 0 else 1
+    x = y = 0
+    points = []
+    if ax > ay:
+        err = ax
+        while x != dx:
+            points.append((x, y))
+            err -= 2 * ay
+            if err < 0:
+                y += sy
+                err += 2 * ax
+            x += sx
+    else:
+        err = ay
+        while y != dy:
+            points.append((x, y))
+            err -= 2 * ax
+            if err < 0:
+                x += sx
+                err += 2 * ay
+            y += sy
+    points.append((dx, dy))
+    return tuple(points)
+
+
+def bresenham_line(x0, y0, x1, y1):
+    return [(x0 + ox, y0 + oy) for ox, oy in line_offsets(x1 - x0, y1 - y0)]
+
+
+class ObstacleLayer:
+    # Cells blocked by cars, consulted alongside the static road mask, so the layout and the
+    # tables built from it stay valid while the cars move. cars maps any key, such as 'player',
+    # to the cell that car is on. Moves outside the obstacles' bounding box are passed without
+    # tracing, so each extra car costs little.
+    def __init__(self, cars=None):
+        self.cars = {}
+        self.cells = set()
+        self.bounds = None
+        for car, cell in (cars or {}).items():
+            self.place(car, cell)
+
+    def __bool__(self):
+        return bool(self.cells)
+
+    def __contains__(self, cell):
+        return cell in self.cells
+
+    def place(self, car, cell):
+        self.cars[car] = cell
+        self.update_cells()
+
+    def remove(self, car):
+        self.cars.pop(car, None)
+        self.update_cells()
+
+    def update_cells(self):
+        self.cells = set(self.cars.values())
+        if not self.cells:
+            self.bounds = None
+            return
+        xs = [x for x, _ in self.cells]
+        ys = [y for _, y in self.cells]
+        self.bounds = (min(xs), min(ys), max(xs), max(ys))
+
+    def blocks(self, x0, y0, x1, y1):
+        # True if the move's traced line passes through a car, including its end cell
+        if self.bounds is None:
+            return False
+        min_x, min_y, max_x, max_y = self.bounds
+        if max(x0, x1) < min_x or min(x0, x1) > max_x or max(y0, y1) < min_y or min(y0, y1) > max_y:
+            return False
+        cells = self.cells
+        for ox, oy in line_offsets(x1 - x0, y1 - y0):
+            if (x0 + ox, y0 + oy) in cells:
+                return True
+        return False
+
+
+class Track:
+    # A track's tiles and checkpoint groups, with the rules for moving over it. tile_types maps
+    # 'road', 'start_finish', 'checkpoint1' and 'checkpoint2' to tile codes, and every other
+    # code in it blocks a move. track_layout is a list of rows or a 2D uint8 array, which is used
+    # as it is. group_labels is label_groups' result for the finish and checkpoint tiles and
+    # centroids the (checkpoint 1, checkpoint 2, finish) centroids, if the caller already has them.
+    def __init__(self, track_layout, checkpoint1_group=None, checkpoint2_group=None, tile_types=TILE_TYPES,
+                 group_labels=None, centroids=None):
+        self.grid = np.asarray(track_layout, dtype=np.uint8)
+        # The move checks index the rows as lists, which is far quicker than indexing an array
+        self.layout = self.grid.tolist() if isinstance(track_layout, np.ndarray) else track_layout
+        self.rows, self.columns = self.grid.shape
+        self.tile_types = tile_types
+        self.road_tile = tile_types['road']
+        self.start_finish_tile = tile_types['start_finish']
+        self.checkpoint1_tile = tile_types['checkpoint1']
+        self.checkpoint2_tile = tile_types['checkpoint2']
+        drivable = (self.road_tile, self.start_finish_tile, self.checkpoint1_tile, self.checkpoint2_tile)
+        self.blocking_tiles = frozenset(tile for tile in tile_types.values() if tile not in drivable)
+        self.road_mask = RoadMask(self.grid, tuple(self.blocking_tiles))
+
+        # Every finish and checkpoint cell is labelled with its group, so whether a crossed tile
+        # is in the counted group is one lookup. Only the first group of each checkpoint found
+        # in row order counts. Groups read from a track file are enough on their own, as only the
+        # counted checkpoint groups' labels are ever looked up.
+        if group_labels is None and checkpoint1_group is not None and checkpoint2_group is not None:
+            group_labels = self.checkpoint_labels(checkpoint1_group, checkpoint2_group)
+        elif group_labels is None:
+            group_labels = label_groups(self.grid, (self.start_finish_tile, self.checkpoint1_tile,
+                                                    self.checkpoint2_tile))
+        self.label_grid, self.group_tiles = group_labels
+        self.labels = self.label_grid.tolist()
+        if checkpoint1_group is None or checkpoint2_group is None:
+            checkpoint1_group = group_cells(self.label_grid, first_group_label(self.group_tiles, self.checkpoint1_tile))
+            checkpoint2_group = group_cells(self.label_grid, first_group_label(self.group_tiles, self.checkpoint2_tile))
+        self.checkpoint1_group = checkpoint1_group
+        self.checkpoint2_group = checkpoint2_group
+        self.checkpoint1_label = self.group_label(checkpoint1_group)
+        self.checkpoint2_label = self.group_label(checkpoint2_group)
+
+        self.start_positions = [(int(x), int(y)) for y, x in np.argwhere(self.grid == self.start_finish_tile)]
+        if centroids is None:
+            centroids = (centroid(checkpoint1_group), centroid(checkpoint2_group), centroid(self.start_positions))
+        self.cp1_centroid, self.cp2_centroid, self.finish_centroid = centroids
+
+    def checkpoint_labels(self, checkpoint1_group, checkpoint2_group):
+        # Labels 1 and 2 for the given groups' cells, in label_groups' form
+        label_grid = np.zeros((self.rows, self.columns), dtype=np.int32)
+        for label, group in ((1, checkpoint1_group), (2, checkpoint2_group)):
+            if group:
+                xs, ys = zip(*group)
+                label_grid[list(ys), list(xs)] = label
+        return label_grid, np.array([0, self.checkpoint1_tile, self.checkpoint2_tile], dtype=np.uint8)
+
+    def group_label(self, group):
+        # A stored group's label, or -1, which no cell has, for an empty group
+        if not group:
+            return -1
+        x, y = group[0]
+        return self.labels[y][x]
+
+    def in_group(self, position, label):
+        x, y = position
+        return self.labels[y][x] == label
+
+    def in_bounds(self, x, y):
+        return 0 <= x < self.columns and 0 <= y < self.rows
+
+    def is_move_valid(self, x0, y0, x1, y1):
+        # (False, []) if the move leaves the road, otherwise (True, checkpoint and finish tiles crossed)
+        points = bresenham_line(x0, y0, x1, y1)
+        if not self.road_mask.is_clear(points):
+            return False, []
+
+        crossed = []
+        layout = self.layout
+        for x, y in points:
+            tile = layout[y][x]
+            if tile == self.checkpoint1_tile:
+                crossed.append(('cp1', (x, y)))
+            elif tile == self.checkpoint2_tile:
+                crossed.append(('cp2', (x, y)))
+            elif tile == self.start_finish_tile:
+                crossed.append(('finish', (x, y)))
+        return True, crossed
+
+    def apply_crossings(self, crossed, cp1, cp2, lap):
+        # Checkpoints count in order, and the finish line completes a lap only after both
+        for kind, position in crossed:
+            if kind == 'cp1':
+                if not cp1 and self.labels[position[1]][position[0]] == self.checkpoint1_label:
+                    cp1 = True
+            elif kind == 'cp2':
+                if cp1 and not cp2 and self.labels[position[1]][position[0]] == self.checkpoint2_label:
+                    cp2 = True
+            else:
+                if cp1 and cp2:
+                    lap += 1
+                cp1 = False
+                cp2 = False
+        return cp1, cp2, lap
+
+    def transition(self, x0, y0, x1, y1, cp1, cp2, lap):
+        # None if the move leaves the road, otherwise (cp1, cp2, lap) after it. The searches call
+        # this for every move they generate, so the road check and the tile scan share one pass.
+        layout = self.layout
+        columns = self.columns
+        rows = self.rows
+        road_tile = self.road_tile
+        blocking_tiles = self.blocking_tiles
+        crossed = None
+        for ox, oy in line_offsets(x1 - x0, y1 - y0):
+            x = x0 + ox
+            y = y0 + oy
+            if not (0 <= x < columns and 0 <= y < rows):
+                return None
+            tile = layout[y][x]
+            if tile == road_tile:
+                continue
+            if tile in blocking_tiles:
+                return None
+            if crossed is None:
+                crossed = []
+            if tile == self.checkpoint1_tile:
+                crossed.append(('cp1', (x, y)))
+            elif tile == self.checkpoint2_tile:
+                crossed.append(('cp2', (x, y)))
+            elif tile == self.start_finish_tile:
+                crossed.append(('finish', (x, y)))
+        if crossed is None:
+            return cp1, cp2, lap
+        return self.apply_crossings(crossed, cp1, cp2, lap)
+
+
+def open_track(filename, max_size=MAX_GRID_SIZE):
+    # Raises FileNotFoundError or trackFormat.TrackFormatError
+    track = load_track_data(filename, max_size)
+    return Track(track.grid, track.checkpoint1_group, track.checkpoint2_group, group_labels=track.group_labels,
+                 centroids=(track.cp1_centroid, track.cp2_centroid, track.finish_centroid))
@@ -0,0 +1,257 @@
+# Binary track files (.track)
+#
+# Header, little endian:
+#   magic 'RTRK', format version, tile type version, columns, rows,
+#   checkpoint 1 tile count, checkpoint 2 tile count, grid offset
+# then the checkpoint groups as uint16 (x, y) pairs, the cp1/cp2/finish centroids as
+# float64 (x, y) pairs, and at grid offset the uint8 grid, one row after another.
+#
+# Usage:
+#   python trackFormat.py loop.json long.json     converts to loop.track, long.track
+#   python trackFormat.py loop.track              converts back to loop.json
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'RTRK'
+FORMAT_VERSION = 1
+# Tile codes 0 out of bounds, 1 road, 2 start/finish, 3 checkpoint 1, 4 checkpoint 2
+TILE_TYPE_VERSION = 1
+HEADER = struct.Struct('<4sHHIIIII')
+GRID_ALIGNMENT = 64
+
+TRACK_EXTENSION = '.track'
+TRACK_EXTENSIONS = ('.json', TRACK_EXTENSION)
+
+OUT_OF_BOUNDS_TILE = 0
+ROAD_TILE = 1
+START_FINISH_TILE = 2
+CHECKPOINT1_TILE = 3
+CHECKPOINT2_TILE = 4
+
+
+class TrackFormatError(Exception):
+    pass
+
+
+class TrackData:
+    # group_labels is label_groups' result for the finish and checkpoint tiles when the groups were
+    # found from the grid, so Track can reuse it, or None when they were read from a file
+    def __init__(self, grid, checkpoint1_group, checkpoint2_group, cp1_centroid, cp2_centroid, finish_centroid,
+                 group_labels=None):
+        self.grid = grid
+        self.rows, self.columns = grid.shape
+        self.checkpoint1_group = checkpoint1_group
+        self.checkpoint2_group = checkpoint2_group
+        self.cp1_centroid = cp1_centroid
+        self.cp2_centroid = cp2_centroid
+        self.finish_centroid = finish_centroid
+        self.group_labels = group_labels
+
+    def layout(self):
+        return self.grid.tolist()
+
+    def start_positions(self):
+        return [(int(x), int(y)) for y, x in np.argwhere(self.grid == START_FINISH_TILE)]
+
+
+def is_track_file(filename):
+    return filename.endswith(TRACK_EXTENSIONS)
+
+
+def label_groups(grid, tile_types):
+    # Connected component labelling of the 4-connected groups of each tile in tile_types. Returns
+    # a grid of labels, 0 for cells in no group, and an array of each label's tile, 0 for label 0.
+    # Labels are numbered in the row order of each group's first cell, so the first group of a
+    # tile, the one the game counts, has its lowest label.
+    #
+    # Each row's stretches of one tile are found with numpy, and only the runs touching a run of
+    # the same tile in the row above are joined in Python, so large groups stay cheap.
+    rows, columns = grid.shape
+    tiles = np.ascontiguousarray(grid).ravel()
+    labels = np.zeros(rows * columns, dtype=np.int32)
+    cells = np.flatnonzero(np.isin(tiles, tile_types))
+    if not len(cells):
+        return labels.reshape(rows, columns), np.zeros(1, dtype=tiles.dtype)
+
+    # Runs in row order, and the run each cell belongs to
+    new_run = np.ones(len(cells), dtype=bool)
+    new_run[1:] = (cells[1:] != cells[:-1] + 1) | (cells[1:] % columns == 0) | (tiles[cells[1:]] != tiles[cells[:-1]])
+    run_of_cell = np.cumsum(new_run) - 1
+    run_count = int(run_of_cell[-1]) + 1
+
+    # Pairs of runs joined by a cell and the same tile above it
+    run_at = np.full(rows * columns, -1, dtype=np.int64)
+    run_at[cells] = run_of_cell
+    below = cells[cells >= columns]
+    above = below - columns
+    joined = (run_at[above] >= 0) & (tiles[above] == tiles[below])
+    pairs = np.unique(np.stack((run_at[above[joined]], run_at[below[joined]]), axis=1), axis=0)
+
+    parent = list(range(run_count))
+
+    def find(run):
+        while parent[run] != run:
+            parent[run] = parent[parent[run]]
+            run = parent[run]
+        return run
+
+    for first, second in pairs.tolist():
+        first = find(first)
+        second = find(second)
+        if first != second:
+            parent[max(first, second)] = min(first, second)
+
+    # Pointer jumping until every run points at its root, the group's earliest run, so numbering
+    # the roots in run order is row order
+    roots = np.array(parent, dtype=np.int64)
+    while True:
+        jumped = roots[roots]
+        if np.array_equal(jumped, roots):
+            break
+        roots = jumped
+    is_root = roots == np.arange(run_count)
+    root_label = np.zeros(run_count, dtype=np.int32)
+    root_label[is_root] = np.arange(1, int(is_root.sum()) + 1, dtype=np.int32)
+    labels[cells] = root_label[roots[run_of_cell]]
+
+    group_tiles = np.zeros(int(is_root.sum()) + 1, dtype=tiles.dtype)
+    group_tiles[1:] = tiles[cells[new_run]][is_root]
+    return labels.reshape(rows, columns), group_tiles
+
+
+def first_group_label(group_tiles, tile_type):
+    # Label of the first group of tile_type in row order, or 0 if there is none
+    found = np.flatnonzero(group_tiles[1:] == tile_type)
+    return int(found[0]) + 1 if len(found) else 0
+
+
+def group_cells(labels, label):
+    # The group's cells as (x, y) in row order, none for label 0
+    if not label:
+        return []
+    ys, xs = np.nonzero(labels == label)
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def centroid(positions):
+    if not positions:
+        return None
+    return (sum(x for x, y in positions) / len(positions), sum(y for x, y in positions) / len(positions))
+
+
+def analyse_grid(grid):
+    labels, group_tiles = label_groups(grid, (START_FINISH_TILE, CHECKPOINT1_TILE, CHECKPOINT2_TILE))
+    checkpoint1_group = group_cells(labels, first_group_label(group_tiles, CHECKPOINT1_TILE))
+    checkpoint2_group = group_cells(labels, first_group_label(group_tiles, CHECKPOINT2_TILE))
+    finish_tiles = [(int(x), int(y)) for y, x in np.argwhere(grid == START_FINISH_TILE)]
+    return TrackData(grid, checkpoint1_group, checkpoint2_group,
+                     centroid(checkpoint1_group), centroid(checkpoint2_group), centroid(finish_tiles),
+                     (labels, group_tiles))
+
+
+def write_track(filename, track_layout):
+    grid = np.ascontiguousarray(track_layout, dtype=np.uint8)
+    if grid.ndim != 2:
+        raise TrackFormatError("Track layout must be a 2D grid")
+    rows, columns = grid.shape
+    track = analyse_grid(grid)
+
+    body = bytearray()
+    for x, y in track.checkpoint1_group + track.checkpoint2_group:
+        body += struct.pack('<HH', x, y)
+    for point in (track.cp1_centroid, track.cp2_centroid, track.finish_centroid):
+        body += struct.pack('<dd', *(point if point is not None else (float('nan'), float('nan'))))
+
+    grid_offset = HEADER.size + len(body)
+    grid_offset += -grid_offset % GRID_ALIGNMENT
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, TILE_TYPE_VERSION, columns, rows,
+                         len(track.checkpoint1_group), len(track.checkpoint2_group), grid_offset)
+
+    with open(filename, 'wb') as file:
+        file.write(header)
+        file.write(body)
+        file.write(b'\0' * (grid_offset - HEADER.size - len(body)))
+        file.write(grid.tobytes())
+
+
+def read_track(filename):
+    with open(filename, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise TrackFormatError(f"{filename} is too short to be a track file")
+        magic, format_version, tile_version, columns, rows, cp1_count, cp2_count, grid_offset = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise TrackFormatError(f"{filename} is not a track file")
+        if format_version != FORMAT_VERSION or tile_version != TILE_TYPE_VERSION:
+            raise TrackFormatError(f"{filename} uses format {format_version}/tiles {tile_version}, "
+                                   f"expected {FORMAT_VERSION}/{TILE_TYPE_VERSION}")
+
+        # The groups, centroids and grid must all fit in the file before any of them is read
+        file_size = os.fstat(file.fileno()).st_size
+        groups_end = HEADER.size + 4 * (cp1_count + cp2_count) + 48
+        if grid_offset < groups_end or grid_offset + rows * columns > file_size:
+            raise TrackFormatError(f"{filename} is truncated or corrupt: a {columns}x{rows} grid at offset "
+                                   f"{grid_offset} does not fit in {file_size} bytes")
+
+        pairs = struct.unpack(f'<{2 * (cp1_count + cp2_count)}H', file.read(4 * (cp1_count + cp2_count)))
+        points = list(zip(pairs[0::2], pairs[1::2]))
+        centroids = struct.unpack('<6d', file.read(48))
+
+    def point(x, y):
+        return None if x != x else (x, y)
+
+    grid = np.memmap(filename, dtype=np.uint8, mode='r', offset=grid_offset, shape=(rows, columns))
+    return TrackData(grid, points[:cp1_count], points[cp1_count:],
+                     point(*centroids[0:2]), point(*centroids[2:4]), point(*centroids[4:6]))
+
+
+def load_track_data(filename, max_size=None):
+    if filename.endswith(TRACK_EXTENSION):
+        track = read_track(filename)
+    else:
+        with open(filename, 'r') as file:
+            grid = np.array(json.load(file), dtype=np.uint8)
+        if grid.ndim != 2:
+            raise TrackFormatError(f"{filename} is not a rectangular grid")
+        track = analyse_grid(grid)
+    if max_size is not None and (track.columns > max_size or track.rows > max_size):
+        raise TrackFormatError(f"{filename} is {track.columns}x{track.rows}, "
+                               f"tracks can be at most {max_size}x{max_size}")
+    return track
+
+
+def json_to_track(json_filename, track_filename=None):
+    if track_filename is None:
+        track_filename = os.path.splitext(json_filename)[0] + TRACK_EXTENSION
+    with open(json_filename, 'r') as file:
+        write_track(track_filename, json.load(file))
+    return track_filename
+
+
+def track_to_json(track_filename, json_filename=None):
+    if json_filename is None:
+        json_filename = os.path.splitext(track_filename)[0] + '.json'
+    with open(json_filename, 'w') as file:
+        json.dump(read_track(track_filename).layout(), file)
+    return json_filename
+
+
+def main(filenames):
+    if not filenames:
+        print("Usage: python trackFormat.py TRACK.json|TRACK.track ...")
+        return 1
+    for filename in filenames:
+        if filename.endswith(TRACK_EXTENSION):
+            print(f"{filename} -> {track_to_json(filename)}")
+        else:
+            print(f"{filename} -> {json_to_track(filename)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,192 @@
+from collections import deque
+
+import numpy as np
+
+from trackFormat import label_groups, START_FINISH_TILE, CHECKPOINT1_TILE, CHECKPOINT2_TILE
+
+# Tiles a group needs before it counts towards a valid track
+GROUP_MIN_SIZE = 4
+
+
+class TrackGroups:
+    # The finish and checkpoint groups of a layout being edited, kept up to date as cells are
+    # painted so the creator can show them every frame. Cells are flat indices y * columns + x.
+    # A painted group tile joins its neighbours' groups by union-find. Painting over a group can
+    # split it, so only the groups that lost cells are relabelled, from the cells they have left.
+    # Checkpoint 1 and checkpoint 2 cells that touch are kept as pairs, so the check that no two
+    # large checkpoint groups touch only looks at those.
+    def __init__(self, track_layout, finish_tile=START_FINISH_TILE, checkpoint1_tile=CHECKPOINT1_TILE,
+                 checkpoint2_tile=CHECKPOINT2_TILE):
+        self.layout = track_layout
+        self.rows = len(track_layout)
+        self.columns = len(track_layout[0])
+        self.finish_tile = finish_tile
+        self.checkpoint1_tile = checkpoint1_tile
+        self.checkpoint2_tile = checkpoint2_tile
+        self.tiles = (finish_tile, checkpoint1_tile, checkpoint2_tile)
+        self.group_counts = dict.fromkeys(self.tiles, 0)
+        self.large_counts = dict.fromkeys(self.tiles, 0)
+
+        # Every group cell points towards its group's root, which holds the size
+        grid = np.asarray(track_layout, dtype=np.uint8)
+        labels, group_tiles = label_groups(grid, self.tiles)
+        labels = labels.ravel()
+        cells = np.flatnonzero(labels)
+        roots = np.zeros(len(group_tiles), dtype=np.int64)
+        roots[labels[cells]] = cells
+        self.size = {}
+        self.parent = dict(zip(cells.tolist(), roots[labels[cells]].tolist()))
+        for label, (root, size) in enumerate(zip(roots.tolist(), np.bincount(labels[cells]).tolist())):
+            if label:
+                self.count_group(int(group_tiles[label]), size, 1)
+                self.size[root] = size
+
+        self.contacts = set()
+        index = np.arange(self.rows * self.columns).reshape(self.rows, self.columns)
+        for step, first, second in ((1, grid[:, :-1], grid[:, 1:]), (self.columns, grid[:-1], grid[1:])):
+            starts = index[:first.shape[0], :first.shape[1]]
+            touching = starts[(first == checkpoint1_tile) & (second == checkpoint2_tile)]
+            self.contacts.update(zip(touching.tolist(), (touching + step).tolist()))
+            touching = starts[(first == checkpoint2_tile) & (second == checkpoint1_tile)]
+            self.contacts.update(zip((touching + step).tolist(), touching.tolist()))
+
+    def neighbours(self, cell):
+        y, x = divmod(cell, self.columns)
+        if x > 0:
+            yield cell - 1
+        if x < self.columns - 1:
+            yield cell + 1
+        if y > 0:
+            yield cell - self.columns
+        if y < self.rows - 1:
+            yield cell + self.columns
+
+    def tile(self, cell):
+        return self.layout[cell // self.columns][cell % self.columns]
+
+    def find(self, cell):
+        parent = self.parent
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+
+    def count_group(self, tile, size, change):
+        self.group_counts[tile] += change
+        if size >= GROUP_MIN_SIZE:
+            self.large_counts[tile] += change
+
+    def union(self, first, second, tile):
+        first = self.find(first)
+        second = self.find(second)
+        if first == second:
+            return
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.count_group(tile, self.size[first], -1)
+        self.count_group(tile, self.size[second], -1)
+        self.parent[second] = first
+        self.size[first] += self.size.pop(second)
+        self.count_group(tile, self.size[first], 1)
+
+    def paint(self, cells, tile):
+        # Sets the cells to tile in the layout and updates the groups. Returns the cells that changed.
+        layout = self.layout
+        columns = self.columns
+        # A cell given twice is painted once, or its group would count it twice
+        changed = [(cell, layout[cell // columns][cell % columns]) for cell in dict.fromkeys(cells)
+                   if layout[cell // columns][cell % columns] != tile]
+        if not changed:
+            return []
+
+        # Groups that lose cells are dropped, then what is left of them is labelled again
+        dead_roots = set()
+        for cell, old_tile in changed:
+            if old_tile in self.tiles:
+                root = self.find(cell)
+                if root not in dead_roots:
+                    dead_roots.add(root)
+                    self.count_group(old_tile, self.size[root], -1)
+        for root in dead_roots:
+            del self.size[root]
+        for cell, _ in changed:
+            layout[cell // columns][cell % columns] = tile
+        self.relabel(changed, dead_roots)
+        for cell, old_tile in changed:
+            if old_tile in self.tiles:
+                del self.parent[cell]
+
+        if tile in self.tiles:
+            for cell, _ in changed:
+                self.parent[cell] = cell
+                self.size[cell] = 1
+                self.count_group(tile, 1, 1)
+                for neighbour in self.neighbours(cell):
+                    if neighbour in self.parent and self.tile(neighbour) == tile:
+                        self.union(cell, neighbour, tile)
+
+        for cell, _ in changed:
+            self.update_contacts(cell)
+        return [cell for cell, _ in changed]
+
+    def relabel(self, changed, dead_roots):
+        # Floods the cells the dead groups have left from their neighbours of the removed cells.
+        # Roots are found before any parent changes, as the old pointers lead through removed cells.
+        components = []
+        seen = set()
+        for cell, old_tile in changed:
+            if old_tile not in self.tiles:
+                continue
+            for seed in self.neighbours(cell):
+                if seed in seen or seed not in self.parent or self.tile(seed) != old_tile or \
+                        self.find(seed) not in dead_roots:
+                    continue
+                seen.add(seed)
+                component = [seed]
+                queue = deque([seed])
+                while queue:
+                    current = queue.popleft()
+                    for neighbour in self.neighbours(current):
+                        if neighbour not in seen and neighbour in self.parent and self.tile(neighbour) == old_tile:
+                            seen.add(neighbour)
+                            component.append(neighbour)
+                            queue.append(neighbour)
+                components.append((component, old_tile))
+
+        for component, tile in components:
+            root = component[0]
+            for cell in component:
+                self.parent[cell] = root
+            self.size[root] = len(component)
+            self.count_group(tile, len(component), 1)
+
+    def update_contacts(self, cell):
+        # Checkpoint 1 and checkpoint 2 cells that touch, as (checkpoint 1 cell, checkpoint 2 cell)
+        tile = self.tile(cell)
+        for neighbour in self.neighbours(cell):
+            self.contacts.discard((cell, neighbour))
+            self.contacts.discard((neighbour, cell))
+            neighbour_tile = self.tile(neighbour)
+            if tile == self.checkpoint1_tile and neighbour_tile == self.checkpoint2_tile:
+                self.contacts.add((cell, neighbour))
+            elif tile == self.checkpoint2_tile and neighbour_tile == self.checkpoint1_tile:
+                self.contacts.add((neighbour, cell))
+
+    def largest(self, tile):
+        return max((size for root, size in self.size.items() if self.tile(root) == tile), default=0)
+
+    def checkpoints_touch(self):
+        return any(self.size[self.find(first)] >= GROUP_MIN_SIZE and self.size[self.find(second)] >= GROUP_MIN_SIZE
+                   for first, second in self.contacts)
+
+    def problem(self):
+        # Why the layout cannot be saved, or None, with the same rules as validate_track_layout
+        if not self.large_counts[self.finish_tile]:
+            return "Need 4+ connected start/finish tiles"
+        if not self.large_counts[self.checkpoint1_tile]:
+            return "Need a checkpoint 1 group of 4+ tiles"
+        if not self.large_counts[self.checkpoint2_tile]:
+            return "Need a checkpoint 2 group of 4+ tiles"
+        if self.checkpoints_touch():
+            return "Checkpoint 1 and checkpoint 2 groups touch"
+        return None